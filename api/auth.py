@@ -1,21 +1,23 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.responses import JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from sqlalchemy.orm import Session
 from datetime import datetime, timedelta, timezone
+import ipaddress
 from jose import JWTError, jwt
-from passlib.context import CryptContext
+from starlette.concurrency import run_in_threadpool
 
 from scopes import wallet_scopes
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 
 from db.session import SessionLocal
 import models
-from scopes.transaction_scopes import user_has_paid_today
+from services import entitlement_service, principal_service, password_service, session_service
 from services.wallet_service import get_wallet
 import schemas
 from config import settings
-from utils.create_b_wallet import create_b_wallet
+from services.wallet_key_pool import wallet_key_pool
+from utils.rate_limit import limiter
 
 
 
@@ -27,14 +29,15 @@ SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-# Password context: argon2 for new users, bcrypt for old users
-pwd_context = CryptContext(
-    schemes=["argon2", "bcrypt"],
-    deprecated="auto"
-)
-
 security = HTTPBearer()
 
+#per-IP and per-email budgets for login/signup attempts
+login_ip_limiter = limiter("login-ip", settings.LOGIN_LIMIT_PER_IP, settings.LOGIN_LIMIT_WINDOW_SECONDS, settings.RATE_LIMIT_REDIS_URL)
+login_email_limiter = limiter("login-email", settings.LOGIN_LIMIT_PER_EMAIL, settings.LOGIN_LIMIT_WINDOW_SECONDS, settings.RATE_LIMIT_REDIS_URL)
+signup_ip_limiter = limiter("signup-ip", settings.SIGNUP_LIMIT_PER_IP, settings.SIGNUP_LIMIT_WINDOW_SECONDS, settings.RATE_LIMIT_REDIS_URL)
+
+TRUSTED_PROXIES = [ipaddress.ip_network(net.strip(), strict=False) for net in settings.TRUSTED_PROXIES.split(",") if net.strip()]
+
 
 # -------------------- Utilities -------------------- #
 
@@ -46,12 +49,55 @@ def get_db():
         db.close()
 
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
-
-
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+async def throttled(request: Request, limiters: list) -> JSONResponse | None:
+    """
+    A 429 if any (limiter, key) pair is over budget, else None.
+    Runs before the handler touches the db or the password pool,
+    so a rejected attempt costs a dict lookup (or one async Redis round trip).
+    """
+    for rate_limiter, key in limiters:
+        allowed, retry_after = await rate_limiter.hit(key)
+        if not allowed:
+            return JSONResponse(
+                status_code=429,
+                content={"success": False, "message": "Too many attempts, please try again later"},
+                headers={"Retry-After": str(retry_after)},
+            )
+    return None
+
+def _trusted_proxy(host: str) -> bool:
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    return any(address in net for net in TRUSTED_PROXIES)
+
+def client_ip(request: Request) -> str:
+    """
+    The address to rate limit on. Behind a reverse proxy request.client is the
+    proxy, so every user would share one budget: when the peer is in
+    TRUSTED_PROXIES, walk X-Forwarded-For from the right (the end our own
+    proxies append to) and take the first hop that isn't one of them.
+    Anything left of that is client-supplied and could be forged.
+    """
+    host = request.client.host if request.client else "unknown"
+    if not _trusted_proxy(host):
+        return host
+    hops = [hop.strip() for hop in request.headers.get("x-forwarded-for", "").split(",") if hop.strip()]
+    for hop in reversed(hops):
+        if not _trusted_proxy(hop):
+            return hop
+        host = hop
+    return host
+
+
+def busy_response() -> JSONResponse:
+    #password hashing is saturated: fail fast rather than queue behind a login flood
+    return JSONResponse(
+        status_code=429,
+        content={"success": False, "message": "Too many sign-in attempts right now, please try again shortly"},
+        headers={"Retry-After": "1"},
+    )
 
 
 def create_access_token(data: dict, expires_delta: timedelta | None = None) -> str:
@@ -61,23 +107,46 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None) -> s
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
 
+def issue_tokens(db: Session, user_id: int) -> dict:
+    """A new session: its refresh token, plus a short access token that names it."""
+    session_id, refresh_token = session_service.create_session(db, user_id)
+    return {
+        "access_token": create_access_token({"sub": str(user_id), "sid": session_id}),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
 
-def get_current_user(db: Session = Depends(get_db), token:  str = Depends(oauth2_scheme)):
-    print("AUTH HEADER:", token)
+def token_claims(token: str) -> tuple[int, int | None]:
+    """(user_id, session_id) from a valid access token, 401 otherwise."""
     if not token:
         raise HTTPException(status_code=401, detail="Missing token")
-    
-    # token = authorization.split(" ")[1] if " " in authorization else authorization
+
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        user_id: int = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-    except JWTError as e:
+        user_id = int(payload["sub"])
+        #tokens issued before sessions existed have no sid; they're honoured until they expire
+        session_id = int(payload["sid"]) if payload.get("sid") is not None else None
+    except (JWTError, KeyError, TypeError, ValueError) as e:
         print(f"JWTError: {str(e)}")
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    if session_id is not None and session_service.revocations.is_revoked(session_id):
+        raise HTTPException(status_code=401, detail="Session has been revoked")
+    return user_id, session_id
+
+
+def get_current_user(token:  str = Depends(oauth2_scheme)) -> principal_service.Principal:
+    """
+    The caller as a Principal (id, email, names, role, wallet address).
+    The JWT names the user and the session, revocation is a set lookup and
+    the record comes from an in-memory cache, so most requests resolve with
+    no database round trip.
+    """
+    user_id, _ = token_claims(token)
+
+    user = principal_service.get_principal(user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -87,44 +156,52 @@ def get_current_user(db: Session = Depends(get_db), token:  str = Depends(oauth2
 # -------------------- Routes -------------------- #
 
 @router.post("/signup", response_model=dict)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    existing = db.query(models.User).filter(models.User.email == user.email).first()
+async def signup(user: schemas.UserCreate, request: Request, db: Session = Depends(get_db)):
+    rejected = await throttled(request, [(signup_ip_limiter, client_ip(request))])
+    if rejected:
+        return rejected
+
+    #async so the argon2 wait doesn't hold a threadpool thread, db work still goes to the threadpool
+    existing = await run_in_threadpool(lambda: db.query(models.User).filter(models.User.email == user.email).first())
     if existing:
         return JSONResponse(
             status_code=409,
             content={"success": False, "message": "Email already registered"}
         )
     
-    #get a new blockchain wallet for the user
-    wallet_address, private_key = create_b_wallet()
-    print("New wallet created:", wallet_address)
+    try:
+        password_hash = await password_service.hash_password(user.password)
+    except password_service.PasswordPoolBusy:
+        return busy_response()
 
     db_user = models.User(
         first_name=user.first_name,
         last_name=user.last_name,
-        b_wallet_address=wallet_address,
-        private_key=private_key,
         email=user.email,
-        password_hash=hash_password(user.password),  # hashed with argon2
+        password_hash=password_hash,  # hashed with argon2
         role=user.role,
     )
-    db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
-
-    db_wallet = models.Wallet(
-        user_id=db_user.id, 
-        balance=0.00,
-        currency="NGN"
-    )
-    db.add(db_wallet)
-    db.commit()
-    db.refresh(db_wallet)
 
-    token = create_access_token({"sub": str(db_user.id)})
+    def save():
+        #user, claimed blockchain wallet and balance wallet all land in one commit
+        db.add(db_user)
+        db.flush()
+        db_user.b_wallet_address, db_user.private_key = wallet_key_pool.claim(db, db_user.id)
+        db.add(models.Wallet(
+            user_id=db_user.id, 
+            balance_kobo=0,
+            currency="NGN"
+        ))
+        db.commit()
+        db.refresh(db_user)
+    await run_in_threadpool(save)
+
+    tokens = await run_in_threadpool(issue_tokens, db, db_user.id)
     return {
         "success": True,
-        "token": token,
+        "token": tokens["access_token"],
+        "refresh_token": tokens["refresh_token"],
+        "expires_in": tokens["expires_in"],
         "user": {
             "id": db_user.id,
             "first_name": db_user.first_name,
@@ -136,8 +213,12 @@ def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
 
 
 @router.post("/login", response_model=dict)
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def login(user: schemas.UserLogin, request: Request, db: Session = Depends(get_db)):
+    rejected = await throttled(request, [(login_ip_limiter, client_ip(request)), (login_email_limiter, user.email.strip().lower())])
+    if rejected:
+        return rejected
+
+    db_user = await run_in_threadpool(lambda: db.query(models.User).filter(models.User.email == user.email).first())
     
     if not db_user:
         return JSONResponse(
@@ -146,12 +227,9 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
         )
     
     try:
-        password_valid = verify_password(user.password, db_user.password_hash)
-    except Exception:
-        return JSONResponse(
-            status_code=401,
-            content={"success": False, "message": "Invalid email or password"}
-        )
+        password_valid, new_hash = await password_service.verify_and_update(user.password, db_user.password_hash)
+    except password_service.PasswordPoolBusy:
+        return busy_response()
     
     if not password_valid:
         return JSONResponse(
@@ -182,13 +260,12 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 
 
 
-    # Auto-upgrade old bcrypt hashes to argon2
-    if pwd_context.needs_update(db_user.password_hash):
-        db_user.password_hash = hash_password(user.password)
-        db.commit()
+    # Auto-upgrade old bcrypt hashes (and argon2 hashes with old costs), computed in the same pool call
+    if new_hash:
+        db_user.password_hash = new_hash
+        await run_in_threadpool(db.commit)
     
-    token = create_access_token({"sub": str(db_user.id)})
-    return {"access_token": token, "token_type": "bearer"}
+    return await run_in_threadpool(issue_tokens, db, db_user.id)
     # return {
     #     "success": True,
     #     "token": token,
@@ -207,11 +284,8 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 @router.get("/me", response_model=dict)
 def read_users_me(
     db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)
+    current_user: principal_service.Principal = Depends(get_current_user)
 ):
-    wallet_id = wallet_scopes.get_wallet_by_user_id(db, current_user.id)
-    paid = user_has_paid_today(db, wallet_id)
-
     return {
         "success": True,
         "user": {
@@ -220,7 +294,39 @@ def read_users_me(
             "last_name":current_user.last_name,
             "email":current_user.email,
             "role":current_user.role,
-            "has_paid":user_has_paid_today(db, wallet_id)
+            "has_paid":entitlement_service.has_daily_pass(db, current_user.id)
         },
     }
 
+
+@router.post("/refresh", response_model=dict)
+def refresh(body: schemas.RefreshRequest, db: Session = Depends(get_db)):
+    try:
+        user_id, session_id, refresh_token = session_service.rotate(db, body.refresh_token)
+    except session_service.SessionError as e:
+        return JSONResponse(status_code=401, content={"success": False, "message": str(e)})
+
+    return {
+        "access_token": create_access_token({"sub": str(user_id), "sid": session_id}),
+        "refresh_token": refresh_token,
+        "token_type": "bearer",
+        "expires_in": ACCESS_TOKEN_EXPIRE_MINUTES * 60,
+    }
+
+
+@router.post("/logout", response_model=dict)
+def logout(everywhere: bool = False, token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+    """Revoke this session, or with ?everywhere=true every session the user has."""
+    user_id, session_id = token_claims(token)
+    if everywhere:
+        revoked = session_service.revoke_all(db, user_id)
+    elif session_id is not None:
+        revoked = int(session_service.revoke(db, session_id, user_id))
+    else:
+        revoked = 0
+    return {"success": True, "revoked": revoked}
+
+
+@router.get("/sessions/stats", response_model=dict)
+def session_stats(current_user: principal_service.Principal = Depends(get_current_user)):
+    return {"success": True, "revocations": session_service.revocations.stats()}
@@ -0,0 +1,86 @@
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, joinedload
+
+from db.session import get_db
+from models import Movie, User
+from api.auth import get_current_user
+from api.movie_list import movie_to_dict
+from scopes import wallet_scopes
+from services.principal_service import Principal
+from utils.money import from_kobo
+from utils.query_counter import count_queries
+
+router = APIRouter(prefix="/bootstrap", tags=["bootstrap"])
+
+RECOMMENDED_COUNT = 5
+SUGGESTIONS_PER_GENRE = 3
+
+
+def home_feed(db: Session, user: Principal, genres: list[str]) -> dict:
+    """
+    The same recommended + per-genre suggestions as /movies/list, in one query:
+    number the movies inside each preferred genre and keep the first few of each.
+    """
+    if not genres:
+        movies = db.query(Movie).limit(RECOMMENDED_COUNT).all()
+        return {"recommended": [movie_to_dict(m, user) for m in movies], "suggestions": {}}
+
+    per_genre = max(RECOMMENDED_COUNT, SUGGESTIONS_PER_GENRE)
+    ranked = select(
+        Movie.id,
+        func.row_number().over(partition_by=Movie.genre, order_by=Movie.id).label("rank"),
+    ).where(Movie.genre.in_(genres)).subquery()
+    rows = db.query(Movie, ranked.c.rank).join(ranked, ranked.c.id == Movie.id).filter(
+        ranked.c.rank <= per_genre
+    ).order_by(ranked.c.rank, Movie.genre).all()
+
+    suggestions = {genre: [] for genre in genres}
+    for movie, rank in rows:
+        if rank <= SUGGESTIONS_PER_GENRE:
+            suggestions[movie.genre].append(movie_to_dict(movie, user))
+    recommended = [movie_to_dict(movie, user) for movie, _ in rows[:RECOMMENDED_COUNT]]
+    return {"recommended": recommended, "suggestions": suggestions}
+
+
+@router.get("")
+def bootstrap(response: Response, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
+    """
+    Everything the home screen needs in one request: profile, wallet and pass,
+    preferences and the feed. Two queries (user with wallet and preferences
+    joined in, then the feed); X-Query-Count reports the real number so a
+    regression shows up in the client's network log.
+    """
+    with count_queries() as queries:
+        row = db.query(User).options(joinedload(User.wallet), joinedload(User.preferences)).filter(User.id == user.id).first()
+        if not row:
+            raise HTTPException(status_code=404, detail="User not found")
+
+        prefs = row.preferences
+        genres = prefs.genres.split(",") if prefs and prefs.genres else []
+        types = prefs.types.split(",") if prefs and prefs.types else []
+        wallet = row.wallet
+        paid_until = wallet.paid_until if wallet else None
+
+        feed = home_feed(db, user, genres)
+
+    response.headers["X-Query-Count"] = str(queries[0])
+    return {
+        "success": True,
+        "user": {
+            "id": row.id,
+            "first_name": row.first_name,
+            "last_name": row.last_name,
+            "email": row.email,
+            "role": row.role,
+            "has_paid": wallet_scopes.pass_is_active(paid_until),
+        },
+        "wallet": {
+            "balance": from_kobo(wallet.balance_kobo) if wallet else "0.00",
+            "currency": wallet.currency if wallet else None,
+            "havePaidToday": wallet_scopes.pass_is_active(paid_until),
+            "paid_until": paid_until,
+        },
+        "preferences": {"genres": genres, "types": types},
+        **feed,
+    }
@@ -0,0 +1,153 @@
+import os
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import Response, FileResponse
+from sqlalchemy.orm import Session
+
+from db.session import get_db
+import models
+from api.auth import get_current_user
+from services import hls_service, jit_packager, entitlement_service
+from config import settings
+from utils import stream_token
+from utils.lru_cache import StatLRUCache
+
+router = APIRouter(prefix="/hls", tags=["hls"])
+
+#movie id -> directory holding its playlists and segments. Fixed once the transcode
+#is done, so after the first request a segment never costs a db query; a directory
+#that changed or disappeared (re-transcode, title removed) sends us back to the db.
+_movie_dirs = StatLRUCache(settings.HLS_INDEX_CACHE_ENTRIES)
+#movie id -> original upload, same idea, for the jit playlist and the signed range stream
+_movie_sources = StatLRUCache(settings.HLS_INDEX_CACHE_ENTRIES)
+
+
+def movie_hls_dir(db: Session, movie_id: str) -> str:
+    directory = _movie_dirs.get(movie_id)
+    if directory:
+        return directory
+    movie = db.get(models.Movie, movie_id)
+    if not movie:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    if not movie.renditions or not movie.url.endswith("_master.m3u8"):
+        raise HTTPException(status_code=404, detail="This title has not been transcoded yet")
+    directory = os.path.dirname(movie.url)
+    _movie_dirs.put(movie_id, directory, directory)
+    return directory
+
+
+def require_access(db: Session, user, movie_id: str):
+    #a memory lookup once the user's entitlements are cached
+    if entitlement_service.access_until(db, user.id, movie_id) is None:
+        raise HTTPException(status_code=403, detail="Pay for today or redeem a share code to watch this movie")
+
+
+def movie_source(db: Session, movie_id: str) -> str:
+    path = _movie_sources.get(movie_id)
+    if path:
+        return path
+    movie = db.get(models.Movie, movie_id)
+    if not movie:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    path = movie.source_path or movie.url
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Video file not found")
+    _movie_sources.put(movie_id, path, path)
+    return path
+
+
+def verified(token: str) -> dict:
+    try:
+        return stream_token.verify(token)
+    except stream_token.StreamTokenError:
+        raise HTTPException(status_code=403, detail="Invalid or expired stream URL")
+
+def _hls_response(directory: str, name: str) -> Response:
+    try:
+        body = hls_service.read_file(directory, name)
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Not found")
+
+    hls_service.prefetch_after(directory, name)
+
+    #segments never change once written, playlists are only rewritten by a re-transcode
+    cache_control = "private, max-age=31536000, immutable" if name.endswith(".ts") else "private, max-age=60"
+    return Response(content=body, media_type=hls_service.media_type(name), headers={"Cache-Control": cache_control})
+
+def _jit_segment_response(source: str, seq: int) -> FileResponse:
+    try:
+        path = jit_packager.segment(source, seq)
+    except IndexError:
+        raise HTTPException(status_code=404, detail="Not found")
+    return FileResponse(path, media_type=hls_service.MEDIA_TYPES["ts"], headers={"Cache-Control": "private, max-age=31536000, immutable"})
+
+
+# -------------------- Signed URLs (no auth header, db only on a cold path lookup) -------------------- #
+
+@router.get("/s/{token}/jit/index.m3u8")
+def signed_jit_playlist(token: str, db: Session = Depends(get_db)):
+    payload = verified(token)
+    playlist = jit_packager.playlist(movie_source(db, payload["m"]))
+    return Response(content=playlist, media_type=hls_service.MEDIA_TYPES["m3u8"], headers={"Cache-Control": "private, max-age=60"})
+
+
+@router.get("/s/{token}/jit/{seq}.ts")
+def signed_jit_segment(token: str, seq: int, db: Session = Depends(get_db)):
+    return _jit_segment_response(movie_source(db, verified(token)["m"]), seq)
+
+
+@router.get("/s/{token}/{name}")
+def signed_hls_file(token: str, name: str, db: Session = Depends(get_db)):
+    """
+    Same files as /hls/{movie_id}/{name}, authorised by the signed token in
+    the path instead of a bearer token, so fetching a segment costs an HMAC
+    check and (usually) a memory lookup.
+    """
+    payload = verified(token)
+    if not hls_service.HLS_NAME.match(name) or not stream_token.allows_rendition(payload, name):
+        raise HTTPException(status_code=404, detail="Not found")
+    return _hls_response(movie_hls_dir(db, payload["m"]), name)
+
+
+# -------------------- Bearer-token routes -------------------- #
+
+@router.get("/stats")
+def hls_cache_stats(current_user=Depends(get_current_user)):
+    """Segment cache size, hit ratio and evictions, for sizing HLS_CACHE_MAX_BYTES / JIT_CACHE_MAX_BYTES."""
+    return {"success": True, "cache": hls_service.cache_stats(), "jit_cache": jit_packager.jit_cache.stats()}
+
+
+@router.get("/{movie_id}/jit/index.m3u8")
+def jit_playlist(movie_id: str, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """
+    HLS playlist for the original upload, cut on its keyframes. Works for
+    any title straight away, transcoded or not.
+    """
+    require_access(db, current_user, movie_id)
+    playlist = jit_packager.playlist(movie_source(db, movie_id))
+    return Response(content=playlist, media_type=hls_service.MEDIA_TYPES["m3u8"], headers={"Cache-Control": "private, max-age=60"})
+
+
+@router.get("/{movie_id}/jit/{seq}.ts")
+def jit_segment(movie_id: str, seq: int, db: Session = Depends(get_db), current_user=Depends(get_current_user)):
+    """One segment of the jit playlist, remuxed from the mp4 on first request and served from disk after that."""
+    require_access(db, current_user, movie_id)
+    return _jit_segment_response(movie_source(db, movie_id), seq)
+
+
+@router.get("/{movie_id}/{name}")
+def hls_file(
+    movie_id: str,
+    name: str,
+    db: Session = Depends(get_db),
+    current_user=Depends(get_current_user)
+):
+    """
+    Master playlist, variant playlists and segments of a transcoded title.
+    Playlists reference each other by bare file name, so a player pointed at
+    /hls/{movie_id}/{file_id}_master.m3u8 resolves everything else here.
+    """
+    if not hls_service.HLS_NAME.match(name):
+        raise HTTPException(status_code=404, detail="Not found")
+    require_access(db, current_user, movie_id)
+
+    return _hls_response(movie_hls_dir(db, movie_id), name)
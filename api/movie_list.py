@@ -1,8 +1,9 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from db.session import get_db
-from models import Movie, UserPreference, User
+from models import Movie, UserPreference
 from api.auth import get_current_user
+from services.principal_service import Principal
 
 router = APIRouter(prefix="/movies", tags=["content"])
 
@@ -10,7 +11,7 @@ router = APIRouter(prefix="/movies", tags=["content"])
 def parse_tags(tags: str | None):
     return [t.strip() for t in tags.split(",")] if tags else []
 
-def movie_to_dict(movie: Movie, user: User):
+def movie_to_dict(movie: Movie, user: Principal):
     user_list = getattr(user, "my_list", [])
     if isinstance(user_list, str):
         user_list = [int(x) for x in user_list.split(",") if x]
@@ -28,7 +29,7 @@ def movie_to_dict(movie: Movie, user: User):
 
 # -------------------- Routes -------------------- #
 @router.get("/list")
-def get_list(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_list(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     # Get user preferences
     prefs = db.query(UserPreference).filter_by(user_id=user.id).first()
     preferred_genres = prefs.genres.split(",") if prefs and prefs.genres else []
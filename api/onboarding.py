@@ -1,14 +1,15 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
 from db.session import get_db
-from models import UserPreference, User
+from models import UserPreference
 from api.auth import get_current_user
+from services.principal_service import Principal
 
 router = APIRouter(prefix="/user", tags=["user"])
 
 # Save or update preferences (from onboarding)
 @router.post("/savepreferences")
-def save_preferences(preferences: dict, db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def save_preferences(preferences: dict, db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     existing = db.query(UserPreference).filter_by(user_id=user.id).first()
 
     genres = ",".join(preferences.get("genres", []))
@@ -27,7 +28,7 @@ def save_preferences(preferences: dict, db: Session = Depends(get_db), user: Use
 
 # Fetch preferences
 @router.get("/fetchpreferences")
-def get_preferences(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+def get_preferences(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     prefs = db.query(UserPreference).filter_by(user_id=user.id).first()
 
     if not prefs:
@@ -7,6 +7,7 @@ from db.session import SessionLocal
 from services import payment_service
 from utils import security
 from scopes import user_scopes
+from utils.money import to_kobo
 from .auth import get_current_user
 
 router = APIRouter(prefix="/payments", tags=["payments"])
@@ -30,12 +31,18 @@ def get_db():
 #     return user
 
 @router.post("/fund")
-def fund_wallet(amount: float, db: Session = Depends(get_db), user = Depends(get_current_user)):
+def fund_wallet(amount: Decimal, db: Session = Depends(get_db), user = Depends(get_current_user)):
     #get user email from user dependency
     email = user.email
     
-    #amount is in NGN as decimal float so convert to Decimal in service
-    return payment_service.initialize_paystack_payment(db, email, Decimal(str(amount)))
+    #amount comes in as NGN, everything past here is integer kobo
+    try:
+        amount_kobo = to_kobo(amount)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if amount_kobo <= 0:
+        raise HTTPException(status_code=400, detail="Amount must be positive")
+    return payment_service.initialize_paystack_payment(db, email, amount_kobo)
 
 @router.post("/webhook")
 async def webhook(request: Request, x_paystack_signature: str | None = Header(None), db: Session = Depends(get_db)):
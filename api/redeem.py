@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from db.session import get_db
 from models import ShareCode
 from .auth import get_current_user
+from services import entitlement_service
 import datetime
 
 router = APIRouter(prefix="/redeem", tags=["redeem"])
@@ -22,9 +23,10 @@ def redeem_share(code: str, db: Session = Depends(get_db), current_user: dict =
 
     # Mark as redeemed
     share.redeemed = True
-    share.shared_with = current_user["id"]
+    share.shared_with = current_user.id
     db.commit()
     db.refresh(share)
+    entitlement_service.invalidate(current_user.id)
 
     return {
         "success": True,
@@ -1,9 +1,15 @@
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import FileResponse
+import os
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.orm import Session
 from db.session import SessionLocal
 from models import Movie
 from api.auth import get_current_user  # <-- your JWT dependency
+from services.transcode_service import movie_renditions, rendition_playlist
+from services.thumbnail_service import movie_thumbnails
+from utils.range_response import RangeFileResponse
+from utils import mp4_index, stream_token
+from services import entitlement_service
+from api.hls import movie_source
 
 router = APIRouter(prefix="/movies", tags=["movies"])
 
@@ -16,26 +22,38 @@ def get_db():
         db.close()
 
 
-@router.get("/{movie_id}/stream")
-def stream_movie(
-    movie_id: int,
-    resolution: str = "720p",  #default resolution
+@router.get("/{movie_id}/playback")
+def playback_info(
+    movie_id: str,
+    resolution: str | None = None,  #defaults to 720p, or the best we have below it
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
     """
-    Fetch the compressed video file URL for streaming.
-    Resolutions: 480p, 720p, 1080p
+    Everything a player needs to start: the HLS playlists when the title has
+    been transcoded, and the byte-range stream URL for the original file.
+    Only renditions that were actually encoded for this title are offered.
     """
     movie = db.query(Movie).filter(Movie.id == movie_id).first()
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found")
+    access_until = require_access(db, current_user, movie.id)
 
-    #construct video path based on resolution
-    if resolution not in ["480p", "720p", "1080p"]:
-        raise HTTPException(status_code=400, detail="Invalid resolution")
+    available = [r["name"] for r in movie_renditions(movie)]
 
-    video_url = f"{movie.url.replace('.mp4', '')}_{resolution}.mp4"
+    #not transcoded (yet), all we have is the original upload
+    if not available:
+        if resolution not in (None, "source"):
+            raise HTTPException(status_code=400, detail="This title has no renditions yet, only 'source' is available")
+        resolution = "source"
+        video_url = movie.source_path or movie.url
+    else:
+        if resolution is None:
+            #ladder is ordered best first
+            resolution = next((r["name"] for r in movie_renditions(movie) if r["height"] <= 720), available[-1])
+        if resolution not in available:
+            raise HTTPException(status_code=400, detail=f"Invalid resolution, available: {', '.join(available)}")
+        video_url = rendition_playlist(movie.url, resolution)
 
     return {
         "success": True,
@@ -44,5 +62,89 @@ def stream_movie(
         "description": movie.description,
         "genre": movie.genre,
         "requested_resolution": resolution,
-        "video_url": FileResponse(video_url, media_type="video/mp4"),
+        "available_resolutions": available or ["source"],
+        "master_playlist": movie.url if available else None,
+        "hls_url": f"/hls/{movie.id}/{os.path.basename(movie.url)}" if available else None,
+        "video_url": video_url,
+        "stream_url": f"/movies/{movie.id}/stream",
+        #HLS straight from the original file, for titles that haven't been transcoded
+        "jit_hls_url": f"/hls/{movie.id}/jit/index.m3u8",
+        "scrub_thumbnails": movie_thumbnails(movie).get("sprite_vtt"),
+        "access_until": access_until,
+        "signed": signed_urls(movie, current_user, resolution if available else None, access_until),
     }
+
+
+def require_access(db: Session, user, movie_id: str) -> float:
+    access_until = entitlement_service.access_until(db, user.id, movie_id)
+    if access_until is None:
+        raise HTTPException(status_code=403, detail="Pay for today or redeem a share code to watch this movie")
+    return access_until
+
+
+def signed_urls(movie: Movie, user, resolution: str | None, access_until: float) -> dict:
+    """
+    The same URLs, signed for this viewer, so the player's segment and range
+    requests never touch auth or the database. `rendition_url` is locked to
+    the chosen resolution, the rest allow any.
+    """
+    token, expires_at = stream_token.issue(movie.id, user.id, expires_at=access_until)
+    urls = {
+        "expires_at": expires_at,
+        "stream_url": f"/movies/s/{token}/stream",
+        "jit_hls_url": f"/hls/s/{token}/jit/index.m3u8",
+        "hls_url": None,
+        "rendition_url": None,
+    }
+    if resolution:
+        urls["hls_url"] = f"/hls/s/{token}/{os.path.basename(movie.url)}"
+        locked, _ = stream_token.issue(movie.id, user.id, rendition=resolution, expires_at=expires_at)
+        urls["rendition_url"] = f"/hls/s/{locked}/{os.path.basename(rendition_playlist(movie.url, resolution))}"
+    return urls
+
+
+def range_response(path: str, request: Request, t: float | None):
+    if not path or not os.path.isfile(path):
+        raise HTTPException(status_code=404, detail="Video file not found")
+    if t is None:
+        return RangeFileResponse(path, request.headers, media_type="video/mp4")
+
+    index = mp4_index.try_load(path)
+    if index is None or not len(index):
+        raise HTTPException(status_code=400, detail="Seeking by time isn't supported for this file")
+    keyframe_time, offset = index.keyframe_before(max(t, 0.0))
+    return RangeFileResponse(path, request.headers, media_type="video/mp4", start_at=offset,
+                             headers={"x-seek-time": f"{keyframe_time:.3f}", "x-seek-offset": str(offset)})
+
+
+@router.api_route("/s/{token}/stream", methods=["GET", "HEAD"])
+def signed_stream(token: str, request: Request, t: float | None = None, db: Session = Depends(get_db)):
+    """/stream authorised by a signed token from /playback: an HMAC check, and the db only the first time a title's file is looked up."""
+    try:
+        payload = stream_token.verify(token)
+    except stream_token.StreamTokenError:
+        raise HTTPException(status_code=403, detail="Invalid or expired stream URL")
+    return range_response(movie_source(db, payload["m"]), request, t)
+
+
+@router.api_route("/{movie_id}/stream", methods=["GET", "HEAD"])
+def stream_movie(
+    movie_id: str,
+    request: Request,
+    t: float | None = None,  #seek: start at the keyframe at or before t seconds
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """
+    The original upload as real bytes. Honours Range/If-Range so players can
+    seek, and the file itself is sent without being copied through Python
+    where the server supports it.
+    ?t= resolves a time to a byte offset through the file's keyframe index
+    and answers as if the client had sent that Range.
+    """
+    movie = db.query(Movie).filter(Movie.id == movie_id).first()
+    if not movie:
+        raise HTTPException(status_code=404, detail="Movie not found")
+    require_access(db, current_user, movie.id)
+
+    return range_response(movie.source_path or movie.url, request, t)
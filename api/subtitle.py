@@ -1,16 +1,21 @@
 from fastapi import APIRouter, UploadFile, File, Form
 from fastapi.responses import FileResponse
-import whisper
+import importlib
 import srt
 import tempfile
 import os
 import datetime
-import argostranslate.translate
+from utils import resources
 
 router = APIRouter(prefix="/subtitles", tags=["subtitles"])
 
-# Load Whisper once
-whisper_model = whisper.load_model("tiny")  # options: tiny, base, small, medium, large
+# Load Whisper once, on first use (or at warm-up) rather than at import
+def _load_whisper():
+    import whisper
+    return whisper.load_model("tiny")  # options: tiny, base, small, medium, large
+
+resources.register("whisper_model", _load_whisper)
+resources.register("argos_translate", lambda: importlib.import_module("argostranslate.translate"))
 
 @router.post("/generate")
 def generate_and_translate_subtitles(
@@ -28,6 +33,7 @@ def generate_and_translate_subtitles(
         tmp_path = tmp.name
 
     # --- Step 1: Transcribe with Whisper ---
+    whisper_model = resources.get("whisper_model")
     result = whisper_model.transcribe(tmp_path)
     os.remove(tmp_path)  # cleanup
 
@@ -47,7 +53,8 @@ def generate_and_translate_subtitles(
         f.write(srt_text)
 
     # --- Step 2: Translate with Argos Translate ---
-    installed_languages = argostranslate.translate.get_installed_languages()
+    argos_translate = resources.get("argos_translate")
+    installed_languages = argos_translate.get_installed_languages()
     from_lang = next((lang for lang in installed_languages if lang.code == "en"), None)
     to_lang = next((lang for lang in installed_languages if lang.code == target_lang), None)
 
@@ -0,0 +1,132 @@
+from fastapi import APIRouter, Depends, Form, HTTPException, Request
+from fastapi.responses import JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import subprocess
+import os
+
+from db.session import get_db
+import models
+from services import upload_session_service
+from services.upload_session_service import UploadSessionError, UploadSessionBusy
+from .auth import get_current_user
+from .creator_upload import UPLOAD_DIR, publish_movie
+
+router = APIRouter(prefix="/content/upload/sessions", tags=["Content"])
+
+
+def get_owned_session(session_id: str, user) -> dict:
+    try:
+        meta = upload_session_service.load_session(session_id)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    if meta["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Upload session not found")
+    return meta
+
+
+@router.post("")
+def create_upload_session(
+    title: str = Form(...),
+    description: str = Form(...),
+    genre: str = Form(...),
+    filename: str = Form(...),
+    total_size: int = Form(...),
+    chunk_size: int = Form(upload_session_service.DEFAULT_CHUNK_SIZE),
+    user = Depends(get_current_user),
+):
+    """
+    Start a resumable upload. The client then PUTs every chunk
+    (any order, in parallel) and calls /finalize.
+    """
+    try:
+        meta = upload_session_service.create_session(user.id, title, description, genre, filename, total_size, chunk_size)
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {
+        "success": True,
+        "session_id": meta["session_id"],
+        "chunk_size": meta["chunk_size"],
+        "chunk_count": meta["chunk_count"],
+    }
+
+
+@router.put("/{session_id}/chunks/{index}")
+async def upload_chunk(session_id: str, index: int, request: Request, user = Depends(get_current_user)):
+    meta = get_owned_session(session_id, user)
+    try:
+        expected = upload_session_service.expected_chunk_length(meta, index)
+        declared = request.headers.get("content-length")
+        if declared is not None and (not declared.isdigit() or int(declared) != expected):
+            raise UploadSessionError(f"Chunk {index} must be exactly {expected} bytes, got {declared}")
+        #count as it arrives: a chunked request has no Content-Length to check up front
+        data = bytearray()
+        async for part in request.stream():
+            if len(data) + len(part) > expected:
+                raise HTTPException(status_code=413, detail=f"Chunk {index} must be exactly {expected} bytes")
+            data += part
+        await run_in_threadpool(upload_session_service.write_chunk, meta, index, bytes(data))
+    except UploadSessionBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except UploadSessionError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"success": True, "index": index}
+
+
+@router.get("/{session_id}")
+def get_upload_session(session_id: str, user = Depends(get_current_user)):
+    meta = get_owned_session(session_id, user)
+    return {"success": True, **upload_session_service.session_status(meta)}
+
+
+@router.delete("/{session_id}")
+def abort_upload_session(session_id: str, user = Depends(get_current_user)):
+    get_owned_session(session_id, user)
+    upload_session_service.delete_session(session_id)
+    return {"success": True}
+
+
+@router.post("/{session_id}/finalize")
+async def finalize_upload_session(session_id: str, user = Depends(get_current_user), db: Session = Depends(get_db)):
+    meta = get_owned_session(session_id, user)
+    file_id = meta["session_id"]
+    file_path = os.path.join(UPLOAD_DIR, f"{file_id}{meta['file_ext']}")
+
+    #a second finalize racing this one (double click, retry on another worker) gets a 409, not a 500
+    try:
+        upload_session_service.claim(session_id)
+    except UploadSessionError as e:
+        return JSONResponse({"success": False, "message": str(e)}, status_code=409)
+
+    try:
+        file_hash = await run_in_threadpool(upload_session_service.assemble, meta, file_path)
+    except UploadSessionError as e:
+        upload_session_service.release(meta)
+        status = upload_session_service.session_status(meta)
+        return JSONResponse({"success": False, "message": str(e), "missing": status["missing"]}, status_code=409)
+
+    try:
+        existing = db.query(models.Movie).filter(models.Movie.hash == file_hash).first()
+        if existing:
+            os.remove(file_path)
+            upload_session_service.delete_session(session_id)
+            return JSONResponse({"success": False, "message": "This content has already been uploaded"}, status_code=400)
+
+        result = publish_movie(db, user, meta["title"], meta["description"], meta["genre"], file_id, file_path, file_hash)
+
+    except subprocess.CalledProcessError as e:
+        db.rollback()
+        upload_session_service.release(meta, file_path)
+        return JSONResponse(
+            {"success": False, "message": f"FFmpeg failed: {e}"},
+            status_code=500
+        )
+    except Exception as e:
+        #keep the upload: the file goes back into the session and finalize can be retried
+        db.rollback()
+        upload_session_service.release(meta, file_path)
+        return JSONResponse({"success": False, "message": str(e)}, status_code=500)
+
+    #only once the movie is published is the session (and its data) no longer needed
+    upload_session_service.delete_session(session_id)
+    return result
@@ -0,0 +1,48 @@
+from fastapi import APIRouter, Depends
+from sqlalchemy.orm import Session
+
+from db.session import get_db
+import models
+from services import chain_indexer, anchor_service
+
+router = APIRouter(prefix="/verify", tags=["verify"])
+
+
+def registration_to_dict(registration: models.ContentRegistration):
+    return {
+        "hash": registration.hash,
+        "creator": registration.creator,
+        "registered_at": registration.registered_at,
+        "block_number": registration.block_number,
+        "tx_hash": registration.tx_hash,
+    }
+
+
+@router.get("/{file_hash}")
+def verify_content(file_hash: str, db: Session = Depends(get_db)):
+    """
+    Is this file hash registered on-chain? Answered from the local event
+    index, never from the RPC. Covers both hashes registered on their own
+    and hashes anchored inside a Merkle batch.
+    """
+    file_hash = file_hash.lower()
+
+    registration = chain_indexer.lookup(db, file_hash)
+    if registration:
+        return {"success": True, "registered": True, "method": "direct", "registration": registration_to_dict(registration)}
+
+    movie = db.query(models.Movie).filter(models.Movie.hash == file_hash).first()
+    if movie and movie.anchor_batch:
+        registration = chain_indexer.lookup(db, movie.anchor_batch.root)
+        if registration:
+            proof = anchor_service.movie_proof(movie)
+            return {
+                "success": True,
+                "registered": proof["valid"],
+                "method": "merkle",
+                "registration": registration_to_dict(registration),
+                "proof": proof,
+            }
+
+    #a clean "no" is an answer, not an error
+    return {"success": True, "registered": False}
@@ -3,8 +3,11 @@ from sqlalchemy.orm import Session
 from decimal import Decimal
 
 from db.session import SessionLocal
-from services import wallet_service
+from config import settings
+from services import wallet_service, entitlement_service
+from services.wallet_key_pool import wallet_key_pool
 from utils import security
+from utils.money import to_kobo, from_kobo
 from scopes import user_scopes, wallet_scopes, transaction_scopes
 import models
 from .auth import get_current_user
@@ -37,50 +40,48 @@ def get_my_wallet(user = Depends(get_current_user), db: Session = Depends(get_db
         # raise HTTPException(status_code=404, detail="Wallet not found")
     
     #check if user has made a 'pay' transaction withing the last 24 hours
-    have_paid_today = transaction_scopes.user_has_paid_today(db, wallet.id)
+    have_paid_today = entitlement_service.has_daily_pass(db, user.id)
 
     if have_paid_today:
-        return {"success": True, "balance": str(wallet.balance), "currency": wallet.currency, "havePaidToday": True}
+        return {"success": True, "balance": from_kobo(wallet.balance_kobo), "currency": wallet.currency, "havePaidToday": True}
 
     else:
-        return {"success": True, "balance": str(wallet.balance), "currency": wallet.currency, "havePaidToday": False}
+        return {"success": True, "balance": from_kobo(wallet.balance_kobo), "currency": wallet.currency, "havePaidToday": False}
 
 @router.post("/transfer")
 def transfer(destination_email: str, amount: Decimal, user = Depends(get_current_user), db: Session = Depends(get_db)):
     try:
-        wallet_service.transfer(db, from_user_id=user.id, to_email=destination_email, amount=amount)
+        wallet_service.transfer(db, from_user_id=user.id, to_email=destination_email, amount_kobo=to_kobo(amount))
         return {"ok": True}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.post("/pay-for-today")
-def transfer(amount: Decimal, user = Depends(get_current_user), db: Session = Depends(get_db)):
-    #check if user has paid today
+def transfer(user = Depends(get_current_user), db: Session = Depends(get_db)):
     wallet = wallet_service.get_wallet(db, user.id)
     if not wallet:
         return {"success": False, "message": "No wallet found", "havePaidToday": False}
         # raise HTTPException(status_code=404, detail="Wallet not found")
-    have_paid_today = transaction_scopes.user_has_paid_today(db, wallet.id)
-    if have_paid_today:
-        return {"success": False, "message": "You have already paid for today", "havePaidToday": True}
-
-    try:
-        #check if the available balance is sufficient
-        if wallet.balance < amount:
-            return {"success": False, "message": "Insufficient funds", "havePaidToday": False}
-        else:
-            #decrement 200 from balance an create tx record
-            wallet = wallet_service.get_wallet(db, user.id).with_for_update()
-            wallet.balance = wallet.balance - amount
-            db.add(wallet)
+    #the server sets the price, an `amount` sent by the client is ignored
+    amount_kobo = settings.DAILY_PASS_PRICE_KOBO
 
-            #create tx record
-            transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="pay", amount=amount, status="success")
-            db.commit()
-            return {"success": True, "message": "Payment successful", "havePaidToday": True}
+    #debit and pass start in one conditional UPDATE, the tx record in the same commit
+    if wallet_scopes.buy_pass(db, wallet.id, amount_kobo):
+        transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="pay", amount_kobo=amount_kobo, status="success")
+        db.commit()
+        entitlement_service.invalidate(user.id)
+        return {"success": True, "message": "Payment successful", "havePaidToday": True}
 
-    except ValueError as e:
-        return {"success": False, "message": "Oh no, something went wrong...", "havePaidToday": False}
+    #nothing was written: either a pass is already running or the balance is short
+    db.rollback()
+    if transaction_scopes.user_has_paid_today(db, wallet.id):
+        return {"success": False, "message": "You have already paid for today", "havePaidToday": True}
+    return {"success": False, "message": "Insufficient funds", "havePaidToday": False, "price": from_kobo(amount_kobo)}
     
 
+
+@router.get("/pool/stats")
+def wallet_pool_stats(user = Depends(get_current_user), db: Session = Depends(get_db)):
+    #pre-generated blockchain wallets: how many are ready, how fast they're made, how often signup ran dry
+    return {"success": True, "pool": wallet_key_pool.stats(db)}
@@ -0,0 +1,86 @@
+"""
+Latency of GET /movies/list with the old get_current_user (JWT decode plus
+a full users row per request) against the cached principal.
+
+    python -m benchmarks.auth_bench [--requests 2000]
+
+Runs against whatever DATABASE_URL points at, with a throwaway user that is
+removed again afterwards.
+"""
+import argparse
+import statistics
+import time
+import uuid
+
+from fastapi import Depends, FastAPI, HTTPException
+from fastapi.testclient import TestClient
+from jose import jwt
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal, get_db
+from api import movie_list
+from api.auth import create_access_token, get_current_user, oauth2_scheme
+
+
+def legacy_get_current_user(db: Session = Depends(get_db), token: str = Depends(oauth2_scheme)):
+    #what get_current_user did before the principal cache
+    payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+    user = db.query(models.User).filter(models.User.id == payload.get("sub")).first()
+    if not user:
+        raise HTTPException(status_code=404, detail="User not found")
+    return user
+
+
+def measure(client: TestClient, headers: dict, requests: int) -> list[float]:
+    client.get("/movies/list", headers=headers)  #warm up
+    timings = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get("/movies/list", headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"/movies/list -> {response.status_code} {response.text[:200]}")
+    return timings
+
+
+def report(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[int(len(timings) * 0.99) - 1]
+    print(f"{name:<18} {statistics.mean(timings):>9.2f} {statistics.median(timings):>9.2f} {p99:>9.2f} {1000 * len(timings) / sum(timings):>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = FastAPI()
+    app.include_router(movie_list.router)
+    client = TestClient(app)
+
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.User(email=f"bench-{suffix}@example.com", password_hash="x", first_name="bench", last_name="bench")
+    db.add(user)
+    db.commit()
+    try:
+        headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+
+        app.dependency_overrides[get_current_user] = legacy_get_current_user
+        before = measure(client, headers, args.requests)
+        app.dependency_overrides.clear()
+        after = measure(client, headers, args.requests)
+    finally:
+        db.delete(user)
+        db.commit()
+        db.close()
+
+    print(f"{'get_current_user':<18} {'mean ms':>9} {'p50 ms':>9} {'p99 ms':>9} {'req/s':>9}")
+    report("db per request", before)
+    report("cached principal", after)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+p50/p99 latency of ordinary endpoints (/wallet/ and /movies/list) while a
+flood of logins hammers /auth/login, compared with the same endpoints at rest.
+
+    python -m benchmarks.login_flood_bench [--flood 200] [--samples 300] [--port 8765]
+
+Starts the auth, wallet and movie_list routers under uvicorn in this process,
+against whatever DATABASE_URL points at, with a throwaway user that is removed
+afterwards. The flood uses a wrong password so every attempt pays for a full
+argon2 verify (or a 429 once the password pool is saturated).
+"""
+import argparse
+import asyncio
+import statistics
+import threading
+import time
+import uuid
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+import models
+from db.session import SessionLocal
+from api import auth, wallet, movie_list
+from services import password_service
+
+
+async def sample(client: httpx.AsyncClient, headers: dict, samples: int) -> list[float]:
+    timings = []
+    for i in range(samples):
+        path = "/wallet/" if i % 2 else "/movies/list"
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        timings.append((time.perf_counter() - started) * 1000)
+        if response.status_code != 200:
+            raise SystemExit(f"{path} -> {response.status_code} {response.text[:200]}")
+    return timings
+
+
+async def flood(client: httpx.AsyncClient, email: str, count: int, stop: asyncio.Event) -> dict:
+    statuses = {}
+    async def attempt():
+        while not stop.is_set():
+            response = await client.post("/auth/login", json={"email": email, "password": "wrong password"})
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+    await asyncio.gather(*(attempt() for _ in range(count)))
+    return statuses
+
+
+def report(name: str, timings: list[float]):
+    timings = sorted(timings)
+    p99 = timings[max(int(len(timings) * 0.99) - 1, 0)]
+    print(f"{name:<12} {statistics.median(timings):>9.2f} {p99:>9.2f}")
+
+
+async def run(args, email: str, headers: dict):
+    limits = httpx.Limits(max_connections=args.flood + 10)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{args.port}", limits=limits, timeout=60) as client:
+        await sample(client, headers, 10)  #warm up
+        at_rest = await sample(client, headers, args.samples)
+
+        stop = asyncio.Event()
+        flooding = asyncio.create_task(flood(client, email, args.flood, stop))
+        await asyncio.sleep(1)  #let the flood fill the pool
+        under_flood = await sample(client, headers, args.samples)
+        stop.set()
+        statuses = await flooding
+
+    print(f"{'':<12} {'p50 ms':>9} {'p99 ms':>9}")
+    report("at rest", at_rest)
+    report("login flood", under_flood)
+    print(f"login responses during the flood: {statuses}, password pool: {password_service.password_pool.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--flood", type=int, default=200, help="concurrent login attempts")
+    parser.add_argument("--samples", type=int, default=300)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    app = FastAPI()
+    for module in (auth, wallet, movie_list):
+        app.include_router(module.router)
+    server = uvicorn.Server(uvicorn.Config(app, port=args.port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.User(email=f"bench-{suffix}@example.com", password_hash=password_service.build_context().hash("bench"),
+                       first_name="bench", last_name="bench")
+    db.add(user)
+    db.commit()
+    db.add(models.Wallet(user_id=user.id, balance_kobo=0, currency="NGN"))
+    db.commit()
+    try:
+        headers = {"Authorization": f"Bearer {auth.create_access_token({'sub': str(user.id)})}"}
+        asyncio.run(run(args, user.email, headers))
+    finally:
+        db.query(models.Wallet).filter(models.Wallet.user_id == user.id).delete()
+        db.delete(user)
+        db.commit()
+        db.close()
+        server.should_exit = True
+        password_service.password_pool.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Import time and memory of each router, measured in a fresh interpreter per router.
+
+    python -m benchmarks.startup_report [router ...] [--warm]
+
+`rss MB` is the child's peak resident set size after importing just that
+router (plus whatever it pulls in). The `bridge` row is the full app.
+--warm also loads every lazy resource the module registered, to show what
+warm-up costs on top.
+"""
+import argparse
+import json
+import subprocess
+import sys
+
+from bridge import ROUTERS
+
+PROBE = """
+import json, resource, sys, time, importlib
+started = time.perf_counter()
+module = importlib.import_module(sys.argv[1])
+imported = time.perf_counter() - started
+warm = None
+if sys.argv[2] == "1":
+    from utils import resources
+    started = time.perf_counter()
+    for name in resources.status():
+        resources.get(name)
+    warm = time.perf_counter() - started
+rss_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({"import_s": imported, "warm_s": warm, "rss_mb": rss_kb / 1024}))
+"""
+
+def measure(module: str, warm: bool) -> dict:
+    result = subprocess.run([sys.executable, "-c", PROBE, module, "1" if warm else "0"], capture_output=True, text=True)
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1] if result.stderr.strip() else f"exit {result.returncode}"}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("routers", nargs="*", default=ROUTERS)
+    parser.add_argument("--warm", action="store_true")
+    args = parser.parse_args()
+
+    baseline = measure("config", False)
+    print(f"{'module':<22} {'import s':>9} {'warm s':>8} {'rss MB':>8}")
+    print(f"{'(interpreter+config)':<22} {baseline['import_s']:>9.2f} {'':>8} {baseline['rss_mb']:>8.0f}")
+    for name in [f"api.{r}" for r in args.routers] + ["bridge"]:
+        row = measure(name, args.warm)
+        if "error" in row:
+            print(f"{name:<22} failed: {row['error']}")
+            continue
+        warm = f"{row['warm_s']:.2f}" if row["warm_s"] is not None else ""
+        print(f"{name:<22} {row['import_s']:>9.2f} {warm:>8} {row['rss_mb']:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
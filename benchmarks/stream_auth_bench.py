@@ -0,0 +1,81 @@
+"""
+Requests per second for a 1-byte range request on the original file,
+authorised the old way (bearer JWT + user lookup + movie lookup) versus
+through a signed stream URL (HMAC plus a cached path lookup).
+
+    python -m benchmarks.stream_auth_bench uploads/<some file>.mp4 [--requests 2000]
+
+Runs against whatever DATABASE_URL points at, with a throwaway user and
+movie that are removed again afterwards. Both paths go through the same
+in-process TestClient, so the difference is the auth and the db work.
+"""
+import argparse
+import time
+import uuid
+import datetime
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import models
+from db.session import SessionLocal
+from api import stream_movie
+from api.auth import create_access_token
+from utils import stream_token
+
+
+def run(client: TestClient, url: str, headers: dict, requests: int) -> float:
+    headers = {**headers, "Range": "bytes=0-0"}
+    started = time.perf_counter()
+    for _ in range(requests):
+        response = client.get(url, headers=headers)
+        if response.status_code != 206:
+            raise SystemExit(f"{url} -> {response.status_code} {response.text[:200]}")
+    return requests / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source")
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    app = FastAPI()
+    app.include_router(stream_movie.router)
+    client = TestClient(app)
+
+    db = SessionLocal()
+    suffix = uuid.uuid4().hex[:8]
+    user = models.User(email=f"bench-{suffix}@example.com", password_hash="x", first_name="bench", last_name="bench")
+    movie = models.Movie(title=f"bench {suffix}", genre="bench", url=args.source, source_path=args.source)
+    db.add_all([user, movie])
+    db.commit()
+    #a redeemed code so the bench user is entitled to watch
+    grant = models.ShareCode(code=suffix, movie_id=movie.id, shared_by=user.id, shared_with=user.id, redeemed=True,
+                             expires_at=datetime.datetime.utcnow() + datetime.timedelta(days=1))
+    db.add(grant)
+    db.commit()
+    try:
+        jwt_headers = {"Authorization": f"Bearer {create_access_token({'sub': str(user.id)})}"}
+        token, _ = stream_token.issue(movie.id, user.id)
+
+        #one warm-up request each so imports and the first connection aren't measured
+        run(client, f"/movies/{movie.id}/stream", jwt_headers, 1)
+        run(client, f"/movies/s/{token}/stream", {}, 1)
+
+        jwt_rps = run(client, f"/movies/{movie.id}/stream", jwt_headers, args.requests)
+        signed_rps = run(client, f"/movies/s/{token}/stream", {}, args.requests)
+    finally:
+        db.delete(grant)
+        db.delete(movie)
+        db.delete(user)
+        db.commit()
+        db.close()
+
+    print(f"{'path':<14} {'req/s':>10}")
+    print(f"{'jwt + db':<14} {jwt_rps:>10.0f}")
+    print(f"{'signed url':<14} {signed_rps:>10.0f}  ({signed_rps / jwt_rps:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
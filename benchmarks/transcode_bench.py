@@ -0,0 +1,44 @@
+"""
+Wall-clock cost of each transcode mode, per minute of source.
+
+    python -m benchmarks.transcode_bench uploads/<some file>.mp4 [--modes single rendition segment] [--cores 32]
+
+Every mode encodes the same per-title ladder into its own temp folder.
+"""
+import argparse
+import tempfile
+import time
+
+from services import transcode_service
+from utils import media
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("source")
+    parser.add_argument("--modes", nargs="+", default=list(transcode_service.ENCODE_MODES), choices=transcode_service.ENCODE_MODES)
+    parser.add_argument("--cores", type=int, default=None, help="core budget for the parallel modes (default: worker share)")
+    args = parser.parse_args()
+
+    info = media.probe(args.source)
+    ladder = transcode_service.build_ladder(info)
+    minutes = (info.get("duration") or 0) / 60
+    if not minutes:
+        raise SystemExit("could not read the source duration")
+
+    print(f"source: {info['width']}x{info['height']} @ {info['fps']} fps, {minutes:.2f} min")
+    print(f"ladder: {', '.join(r['name'] for r in ladder)}")
+    print(f"{'mode':<10} {'wall s':>10} {'s / source min':>16} {'speedup':>9}")
+
+    baseline = None
+    for mode in args.modes:
+        with tempfile.TemporaryDirectory() as out:
+            started = time.perf_counter()
+            transcode_service.compress_video_multires(args.source, out, "bench", ladder=ladder, info=info, mode=mode, cores=args.cores)
+            elapsed = time.perf_counter() - started
+        baseline = baseline or elapsed
+        print(f"{mode:<10} {elapsed:>10.1f} {elapsed / minutes:>16.1f} {baseline / elapsed:>8.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Wallet debits under contention: hundreds of concurrent payers going through
+the conditional-UPDATE engine in scopes/wallet_scopes.py, with the invariants
+checked afterwards.
+
+    python -m benchmarks.wallet_contention_bench [--payers 300] [--workers 64]
+
+Three rounds, each against whatever DATABASE_URL points at, with throwaway
+users and wallets that are removed afterwards:
+
+  pass     every payer taps "pay for today" twice at once; exactly one
+           charge each, nobody short
+  hot      every payer debits the same wallet, which can only cover half of
+           them; the other half must be refused and the balance never dips
+           below zero. Also run the old read-check-write way for comparison
+  ring     payers transfer to each other in both directions at once; no
+           deadlocks, money is conserved
+"""
+import argparse
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import create_engine, func
+from sqlalchemy.orm import sessionmaker
+
+import models
+from config import settings
+from scopes import wallet_scopes
+
+PRICE = settings.DAILY_PASS_PRICE_KOBO
+
+
+def timed(workers: int, jobs: list) -> tuple[list, float]:
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(lambda job: job(), jobs))
+    return results, time.perf_counter() - started
+
+
+def in_session(Session, fn):
+    def job():
+        db = Session()
+        try:
+            ok = fn(db)
+            if ok:
+                db.commit()
+            else:
+                db.rollback()
+            return ok
+        except Exception as e:
+            db.rollback()
+            return e
+        finally:
+            db.close()
+    return job
+
+
+def naive_debit(db, wallet_id: int, amount_kobo: int) -> bool:
+    #what pay-for-today used to do: read, check in Python, write the computed balance back
+    wallet = db.get(models.Wallet, wallet_id)
+    if wallet.balance_kobo < amount_kobo:
+        return False
+    wallet.balance_kobo = wallet.balance_kobo - amount_kobo
+    return True
+
+
+def balances(Session, wallet_ids: list[int]) -> dict:
+    db = Session()
+    try:
+        return dict(db.query(models.Wallet.id, models.Wallet.balance_kobo).filter(models.Wallet.id.in_(wallet_ids)).all())
+    finally:
+        db.close()
+
+
+def report(name: str, results: list, seconds: float, checks: dict):
+    errors = [r for r in results if isinstance(r, Exception)]
+    ok = sum(1 for r in results if r is True)
+    print(f"{name:<10} {len(results):>6} ops {seconds:>8.3f}s {len(results) / seconds:>9.0f} ops/s  ok={ok} refused={len(results) - ok - len(errors)} errors={len(errors)}")
+    for label, passed in checks.items():
+        print(f"{'':<10} {'PASS' if passed else 'FAIL'}  {label}")
+    if errors:
+        print(f"{'':<10} first error: {errors[0]!r}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--payers", type=int, default=300)
+    parser.add_argument("--workers", type=int, default=64)
+    args = parser.parse_args()
+
+    #a pool as wide as the thread pool, so threads wait on rows and not on connections
+    engine = create_engine(settings.DATABASE_URL, pool_size=args.workers, max_overflow=0, pool_pre_ping=True)
+    Session = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+
+    db = Session()
+    suffix = uuid.uuid4().hex[:8]
+    users = [models.User(email=f"bench-{suffix}-{i}@example.com", password_hash="x", first_name="bench", last_name=str(i))
+             for i in range(args.payers + 1)]
+    db.add_all(users)
+    db.flush()
+    wallets = [models.Wallet(user_id=user.id, balance_kobo=PRICE, currency="NGN") for user in users]
+    db.add_all(wallets)
+    db.commit()
+    payer_ids = [wallet.id for wallet in wallets[:-1]]
+    hot_id = wallets[-1].id
+    try:
+        #pass: two taps per payer, interleaved
+        jobs = [in_session(Session, lambda db, w=w: wallet_scopes.buy_pass(db, w, PRICE)) for w in payer_ids for _ in range(2)]
+        results, seconds = timed(args.workers, jobs)
+        after = balances(Session, payer_ids)
+        report("pass", results, seconds, {
+            "one charge per payer": sum(1 for r in results if r is True) == len(payer_ids),
+            "every balance is exactly zero": all(b == 0 for b in after.values()),
+        })
+
+        #hot: one wallet that covers half the payers, conditional update vs read-check-write
+        for name, debit in (("hot", wallet_scopes.debit), ("hot-naive", naive_debit)):
+            funded = args.payers // 2
+            db.query(models.Wallet).filter(models.Wallet.id == hot_id).update({"balance_kobo": funded})
+            db.commit()
+            jobs = [in_session(Session, lambda db, debit=debit: debit(db, hot_id, 1)) for _ in range(args.payers)]
+            results, seconds = timed(args.workers, jobs)
+            final = balances(Session, [hot_id])[hot_id]
+            paid = sum(1 for r in results if r is True)
+            report(name, results, seconds, {
+                f"{paid} debits accepted, {funded} affordable": paid == funded,
+                f"balance {final} == funded - accepted": final == funded - paid,
+            })
+
+        #ring: i -> i+1 and i+1 -> i at the same time
+        db.query(models.Wallet).filter(models.Wallet.id.in_(payer_ids)).update({"balance_kobo": PRICE}, synchronize_session=False)
+        db.commit()
+        jobs = []
+        for a, b in zip(payer_ids, payer_ids[1:] + payer_ids[:1]):
+            jobs.append(in_session(Session, lambda db, a=a, b=b: wallet_scopes.transfer_between(db, a, b, 1)))
+            jobs.append(in_session(Session, lambda db, a=a, b=b: wallet_scopes.transfer_between(db, b, a, 1)))
+        results, seconds = timed(args.workers, jobs)
+        total = db.query(func.sum(models.Wallet.balance_kobo)).filter(models.Wallet.id.in_(payer_ids)).scalar()
+        report("ring", results, seconds, {
+            "no errors (deadlocks would show up here)": not any(isinstance(r, Exception) for r in results),
+            "money conserved": total == PRICE * len(payer_ids),
+        })
+    finally:
+        db.rollback()
+        for wallet in wallets:
+            db.delete(wallet)
+        for user in users:
+            db.delete(user)
+        db.commit()
+        db.close()
+        engine.dispose()
+
+
+if __name__ == "__main__":
+    main()
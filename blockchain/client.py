@@ -0,0 +1,45 @@
+import json
+from config import settings
+from utils import resources
+
+RPC_URL = settings.RPC_URL
+CHAIN_ID = settings.CHAIN_ID
+CONTRACT_DATA_PATH = "contract_data.json"
+
+#web3 is slow to import and nothing here is needed until the first chain call,
+#so the provider, contract and pipeline are all built on first use
+
+
+def _make_w3():
+    import requests
+    from requests.adapters import HTTPAdapter
+    from web3 import Web3
+
+    #one keep-alive connection pool for every JSON-RPC call this process makes
+    rpc_session = requests.Session()
+    rpc_session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=settings.RPC_POOL_SIZE))
+    rpc_session.mount("https://", HTTPAdapter(pool_connections=1, pool_maxsize=settings.RPC_POOL_SIZE))
+    return Web3(Web3.HTTPProvider(RPC_URL, session=rpc_session, request_kwargs={"timeout": settings.RPC_TIMEOUT_SECONDS}))
+
+def _load_upload_contract():
+    with open(CONTRACT_DATA_PATH) as f:
+        contract_data = json.load(f)
+    return get_w3().eth.contract(address=contract_data["address"], abi=contract_data["abi"])
+
+def _make_tx_pipeline():
+    from blockchain.tx_pipeline import TxPipeline
+    return TxPipeline(get_w3(), CHAIN_ID)
+
+
+resources.register("web3", _make_w3)
+resources.register("upload_contract", _load_upload_contract)
+resources.register("tx_pipeline", _make_tx_pipeline)
+
+def get_w3():
+    return resources.get("web3")
+
+def get_upload_contract():
+    return resources.get("upload_contract")
+
+def get_tx_pipeline():
+    return resources.get("tx_pipeline")
@@ -0,0 +1,123 @@
+import threading
+from dataclasses import dataclass
+
+
+class NonceManager:
+    """
+    Hands out nonces per sender address from a local counter, so
+    concurrent sends from the same key never race on get_transaction_count.
+    The counter is (re)synced from the chain's pending count on first use
+    and after a failed send.
+    """
+    def __init__(self, w3):
+        self.w3 = w3
+        self._next = {}
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock(self, address: str) -> threading.Lock:
+        with self._guard:
+            return self._locks.setdefault(address, threading.Lock())
+
+    def reserve(self, address: str) -> int:
+        with self._lock(address):
+            if address not in self._next:
+                self._next[address] = self.w3.eth.get_transaction_count(address, "pending")
+            nonce = self._next[address]
+            self._next[address] = nonce + 1
+            return nonce
+
+    def reset(self, address: str):
+        with self._lock(address):
+            self._next.pop(address, None)
+
+
+@dataclass(frozen=True)
+class SignedTx:
+    tx_hash: str
+    raw: bytes
+    sender: str
+    nonce: int
+    gas_price: int  #wei
+
+
+class TxPipeline:
+    """
+    Fire-and-forget transaction submission plus batched receipt lookups.
+    send() returns as soon as the node accepts the raw transaction;
+    confirmation is someone else's job (see anchor_service's receipt poller).
+    """
+    def __init__(self, w3, chain_id: int, gas_price_gwei: int = 35):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.gas_price_gwei = gas_price_gwei
+        self.nonces = NonceManager(w3)
+
+    def sign(self, contract_call, private_key: str, gas: int = 200000, nonce: int | None = None, gas_price: int | None = None) -> SignedTx:
+        """
+        Build and sign without sending, so the caller can record the hash first.
+        A new nonce is reserved unless one is given (replacing a stuck transaction).
+        """
+        account = self.w3.eth.account.from_key(private_key)
+        if nonce is None:
+            nonce = self.nonces.reserve(account.address)
+        gas_price = gas_price or self.w3.to_wei(self.gas_price_gwei, "gwei")
+        tx = contract_call.build_transaction({
+            "from": account.address,
+            "nonce": nonce,
+            "gas": gas,
+            "gasPrice": gas_price,
+            "chainId": self.chain_id,
+        })
+        signed_tx = self.w3.eth.account.sign_transaction(tx, private_key)
+        return SignedTx(self.w3.to_hex(signed_tx.hash), bytes(signed_tx.raw_transaction), account.address, nonce, gas_price)
+
+    def broadcast(self, signed: SignedTx) -> str:
+        try:
+            return self.w3.to_hex(self.w3.eth.send_raw_transaction(signed.raw))
+        except Exception:
+            #our counter may be off (another process used the key, or a tx was dropped): resync next time
+            self.nonces.reset(signed.sender)
+            raise
+
+    def send(self, contract_call, private_key: str, gas: int = 200000) -> str:
+        for attempt in range(2):
+            try:
+                return self.broadcast(self.sign(contract_call, private_key, gas))
+            except Exception:
+                if attempt:
+                    raise
+
+    def get_receipts(self, tx_hashes: list[str]) -> dict:
+        """
+        {tx_hash: receipt or None} for every hash, in one JSON-RPC batch when
+        the provider supports it (eth-tester doesn't, so fall back to one call each).
+        """
+        if not tx_hashes:
+            return {}
+
+        make_batch_request = getattr(self.w3.provider, "make_batch_request", None)
+        if make_batch_request:
+            try:
+                responses = make_batch_request([("eth_getTransactionReceipt", [h]) for h in tx_hashes])
+                receipts = {}
+                for tx_hash, response in zip(tx_hashes, responses):
+                    result = response.get("result")
+                    receipts[tx_hash] = {
+                        "status": int(result["status"], 16),
+                        "blockNumber": int(result["blockNumber"], 16),
+                        "transactionHash": result["transactionHash"],
+                    } if result else None
+                return receipts
+            except NotImplementedError:
+                pass
+
+        from web3.exceptions import TransactionNotFound
+
+        receipts = {}
+        for tx_hash in tx_hashes:
+            try:
+                receipts[tx_hash] = self.w3.eth.get_transaction_receipt(tx_hash)
+            except TransactionNotFound:
+                receipts[tx_hash] = None
+        return receipts
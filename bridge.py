@@ -1,15 +1,41 @@
 from fastapi import FastAPI
 from contextlib import asynccontextmanager
-from api import auth, wallet, payments, share_movie, redeem, creator_upload,subtitle, movie_list, onboarding, stream_movie, search, ai_rec
+import importlib
 from db.session import engine, Base, get_db
+from db.migrations import run_migrations
 import models
 from models import create_and_populate_fts_table
+from config import settings
+from services.media_job_service import media_job_queue
+from services.anchor_service import anchor_service
+from services.chain_indexer import chain_indexer
+from services.password_service import password_pool
+from services.wallet_key_pool import wallet_key_pool
+from services.session_service import revocations
+from utils import resources
+
+# Every router module under api/, in include order. ENABLED_ROUTERS picks a subset
+# so slim workers (say just auth,movie_list) never import the heavy ones.
+ROUTERS = [
+    "auth", "wallet", "payments", "creator_upload", "upload_session", "verify",
+    "movie_list", "onboarding", "stream_movie", "hls", "search", "ai_rec",
+    "share_movie", "redeem", "subtitle", "bootstrap",
+]
+
+def enabled_routers() -> list[str]:
+    wanted = [name.strip() for name in settings.ENABLED_ROUTERS.split(",") if name.strip()]
+    unknown = set(wanted) - set(ROUTERS)
+    if unknown:
+        raise ValueError(f"Unknown routers in ENABLED_ROUTERS: {', '.join(sorted(unknown))}")
+    return [name for name in ROUTERS if not wanted or name in wanted]
 
 # The lifespan context manager should contain all startup logic.
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Step 1: Create all standard database tables for your models.
-    Base.metadata.create_all(bind=engine)
+    # (the models live on models.Base, not the one in db.session)
+    models.Base.metadata.create_all(bind=engine)
+    run_migrations(engine)
     print("Database tables created")
 
     # Step 2: Get a database session and create the special FTS table.
@@ -18,26 +44,36 @@ async def lifespan(app: FastAPI):
         create_and_populate_fts_table(db)
     finally:
         db.close()
+
+    # Step 3: Start loading heavy resources in the background, then the background workers.
+    warm_up = [name.strip() for name in settings.WARM_UP_RESOURCES.split(",") if name.strip()]
+    if warm_up:
+        resources.warm_up(warm_up)
+    if settings.MEDIA_JOBS_ENABLED:
+        media_job_queue.start()
+    if settings.ANCHOR_ENABLED:
+        anchor_service.start()
+    if settings.INDEXER_ENABLED:
+        chain_indexer.start()
+    if settings.WALLET_POOL_ENABLED:
+        wallet_key_pool.start()
+    revocations.start()
     
     # The 'yield' signals that the startup process is complete.
     yield
 
     # This part runs when the application is shutting down.
     print("Terminating backend...")
+    media_job_queue.stop()
+    anchor_service.stop()
+    chain_indexer.stop()
+    password_pool.shutdown()
+    wallet_key_pool.stop()
+    revocations.stop()
 
 
 app = FastAPI(title="Riva-Backend", lifespan=lifespan)
 
 # Routers should be included after the main app is defined.
-app.include_router(auth.router)
-app.include_router(wallet.router)
-app.include_router(payments.router)
-app.include_router(creator_upload.router)
-app.include_router(movie_list.router)
-app.include_router(onboarding.router)
-app.include_router(stream_movie.router)
-app.include_router(search.router)
-app.include_router(ai_rec.router)
-app.include_router(share_movie.router)
-app.include_router(redeem.router)
-app.include_router(subtitle.router)
\ No newline at end of file
+for name in enabled_routers():
+    app.include_router(importlib.import_module(f"api.{name}").router)
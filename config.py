@@ -4,7 +4,8 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     SECRET_KEY: str
     ALGORITHM: str = "HS256"
-    ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24
+    ACCESS_TOKEN_EXPIRE_MINUTES: int = 15  #short on purpose, clients renew with the refresh token
+    SESSION_REVOCATION_POLL_SECONDS: float = 5  #how long a logout can take to reach the other workers
     PAYSTACK_SECRET: str | None = None
     PAYSTACK_WEBHOOK_SECRET: str | None = None
     PAYSTACK_CALLBACK_URL: str | None = None
@@ -14,8 +15,81 @@ class Settings(BaseSettings):
     CHAIN_ID: int = 80002
     DEPLOYER_PRIVATE_KEY: str
     DEPLOYER_ADDRESS: str | None = None
+    RPC_POOL_SIZE: int = 10
+    RPC_TIMEOUT_SECONDS: float = 10
+    #the anchor key's nonces are managed in-process: every worker may enable this, but a
+    #file lock in LOCK_DIR lets only one of them per host run it. With several hosts enable it on one.
+    ANCHOR_ENABLED: bool = True
+    ANCHOR_INTERVAL_SECONDS: float = 300
+    ANCHOR_MAX_BATCH: int = 1024
+    RECEIPT_POLL_SECONDS: float = 5
+    RECEIPT_TIMEOUT_SECONDS: float = 900  #after this an unmined root is re-sent at the same nonce with a higher fee
+    ANCHOR_GAS_BUMP_PERCENT: int = 25  #nodes want at least +10% to accept a replacement
+    ANCHOR_MAX_GAS_PRICE_GWEI: int = 500  #replacements stop climbing here and just wait
+    INDEXER_ENABLED: bool = True  #leader-locked like anchoring, one worker per host actually syncs
+    INDEXER_START_BLOCK: int = 0  #the block ContentRegistry was deployed in
+    INDEXER_POLL_SECONDS: float = 15
+    INDEXER_CONFIRMATIONS: int = 2
+    INDEXER_CHUNK_SIZE: int = 2000
+    INDEXER_REORG_DEPTH: int = 64
+    LOCK_DIR: str = "uploads/locks"  #leader locks for the background loops above
 
-    refresh_token_expire_days: int = 7
+    #background media jobs (transcoding etc.)
+    MEDIA_JOBS_ENABLED: bool = True  #turn off on API-only workers when a dedicated worker runs the queue
+    MEDIA_JOB_CONCURRENCY: int = 1  #across every worker polling the same database, not per worker
+    MEDIA_JOB_POLL_SECONDS: float = 2.0
+    MEDIA_JOB_MAX_ATTEMPTS: int = 3  #handler errors and interrupted runs both count
+    MEDIA_JOB_STALE_SECONDS: float = 300  #a running job with no heartbeat for this long is taken back
+    TRANSCODE_MODE: str = "single"  #single | rendition | segment, see transcode_service.compress_video_multires
+    TRANSCODE_CPU_CORES: int = 0  #0 = every core this process may run on
+    TRANSCODE_SEGMENT_SECONDS: int = 120
+
+    #HLS serving
+    HLS_CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+    HLS_PREFETCH_SEGMENTS: int = 3  #segments loaded ahead of the one a player just asked for
+    HLS_INDEX_CACHE_ENTRIES: int = 10_000  #movie directories / parsed playlists kept in memory
+    PRINCIPAL_CACHE_SECONDS: float = 300  #user records behind get_current_user, dropped on update
+    PRINCIPAL_CACHE_MAX_ENTRIES: int = 50_000
+    ENTITLEMENT_CACHE_SECONDS: float = 60  #only bounds staleness from other workers, local changes invalidate
+    ENTITLEMENT_NEGATIVE_CACHE_SECONDS: float = 2  #"may not watch" answers, so a payment on another worker shows up quickly
+    STREAM_URL_TTL_SECONDS: int = 3 * 3600  #signed stream urls, long enough to finish a feature
+    #just-in-time packaging for titles that are still a single mp4
+    JIT_CACHE_DIR: str = "uploads/jit_cache"
+    JIT_CACHE_MAX_BYTES: int = 20 * 1024 ** 3
+    JIT_SEGMENT_SECONDS: float = 6
+
+    #comma separated api/ module names, empty = all of them
+    ENABLED_ROUTERS: str = ""
+    #comma separated utils.resources names to load in the background at startup, e.g. "whisper_model,upload_contract"
+    WARM_UP_RESOURCES: str = ""
+
+    DAILY_PASS_PRICE_KOBO: int = 20_000  #200.00 NGN, charged by /wallet/pay-for-today
+
+    #pre-generated blockchain wallets for signup
+    WALLET_POOL_ENABLED: bool = True
+    WALLET_POOL_TARGET: int = 200  #unclaimed keys to keep ready
+    WALLET_POOL_BATCH: int = 50  #keys per commit while refilling
+    WALLET_POOL_REFILL_SECONDS: float = 10
+    WALLET_POOL_ENCRYPTION_KEY: str | None = None  #Fernet.generate_key(); unset keeps the pool empty and signups generate inline
+
+    #login/signup throttling, checked before any db query or hashing
+    LOGIN_LIMIT_PER_IP: int = 30
+    LOGIN_LIMIT_PER_EMAIL: int = 10
+    LOGIN_LIMIT_WINDOW_SECONDS: float = 300
+    SIGNUP_LIMIT_PER_IP: int = 10
+    SIGNUP_LIMIT_WINDOW_SECONDS: float = 3600
+    RATE_LIMIT_REDIS_URL: str | None = None  #shared counters across workers, needs the redis package
+    #comma separated proxy IPs/CIDRs (e.g. "127.0.0.1,10.0.0.0/8") whose X-Forwarded-For is believed, empty = none
+    TRUSTED_PROXIES: str = ""
+
+    #password hashing: its own process pool, see services/password_service.py
+    ARGON2_WORKERS: int = 2
+    ARGON2_MAX_PENDING: int = 32  #running + queued hashes before login/signup answer 429
+    ARGON2_TIME_COST: int = 2
+    ARGON2_MEMORY_COST_KIB: int = 102400
+    ARGON2_PARALLELISM: int = 8
+
+    refresh_token_expire_days: int = 7  #slides forward on every refresh
     reset_password_token_expire_minutes: int = 30
 
     class Config:
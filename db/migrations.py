@@ -0,0 +1,145 @@
+from datetime import timedelta
+from sqlalchemy import text, inspect, bindparam, DateTime, String
+from sqlalchemy.engine import Connection
+
+#create_all only creates missing tables, it never touches existing ones.
+#Anything that changes an existing table goes here, in order, and runs once.
+MIGRATIONS = []
+
+def migration(version: int, name: str):
+    def register(fn):
+        MIGRATIONS.append((version, name, fn))
+        return fn
+    return register
+
+def add_column_if_missing(conn: Connection, table: str, column: str, ddl: str):
+    #fresh databases already got the column from create_all
+    columns = {c["name"] for c in inspect(conn).get_columns(table)}
+    if column not in columns:
+        conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {ddl}"))
+
+def run_migrations(engine):
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE IF NOT EXISTS schema_migrations (version INTEGER PRIMARY KEY, name VARCHAR(255))"))
+        applied = {row[0] for row in conn.execute(text("SELECT version FROM schema_migrations"))}
+
+    for version, name, fn in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with engine.begin() as conn:
+            fn(conn)
+            conn.execute(text("INSERT INTO schema_migrations (version, name) VALUES (:v, :n)"), {"v": version, "n": name})
+        print(f"Applied migration {version}: {name}")
+
+
+@migration(1, "movies.source_path")
+def _movies_source_path(conn: Connection):
+    add_column_if_missing(conn, "movies", "source_path", "VARCHAR")
+    #until now url always pointed at the original upload
+    conn.execute(text("UPDATE movies SET source_path = url WHERE source_path IS NULL"))
+
+
+@migration(2, "movies.renditions")
+def _movies_renditions(conn: Connection):
+    add_column_if_missing(conn, "movies", "renditions", "VARCHAR")
+
+
+@migration(3, "movies.thumbnails")
+def _movies_thumbnails(conn: Connection):
+    add_column_if_missing(conn, "movies", "thumbnails", "VARCHAR")
+
+
+@migration(4, "movies merkle anchoring")
+def _movies_anchoring(conn: Connection):
+    add_column_if_missing(conn, "movies", "creator_address", "VARCHAR(255)")
+    add_column_if_missing(conn, "movies", "anchor_status", "VARCHAR(20)")
+    add_column_if_missing(conn, "movies", "anchor_batch_id", "INTEGER REFERENCES anchor_batches(id)")
+    add_column_if_missing(conn, "movies", "merkle_proof", "VARCHAR")
+    #everything uploaded before batching was registered on its own, one transaction per hash
+    conn.execute(text("UPDATE movies SET anchor_status = 'direct' WHERE anchor_status IS NULL"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_anchor_status ON movies (anchor_status)"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_movies_anchor_batch_id ON movies (anchor_batch_id)"))
+
+
+@migration(5, "anchor_batches.status index")
+def _anchor_batches_status_index(conn: Connection):
+    #the receipt poller looks up submitted batches every few seconds
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_anchor_batches_status ON anchor_batches (status)"))
+
+
+@migration(6, "wallets.paid_until")
+def _wallets_paid_until(conn: Connection):
+    add_column_if_missing(conn, "wallets", "paid_until", "TIMESTAMP")
+    #a pass lasts 24 hours from the latest successful "pay"
+    latest = conn.execute(text(
+        "SELECT wallet_id, MAX(created_at) AS paid_at FROM transactions "
+        "WHERE type = 'pay' AND status = 'success' GROUP BY wallet_id"
+    ).columns(paid_at=DateTime(timezone=True))).all()
+    update = text("UPDATE wallets SET paid_until = :paid_until WHERE id = :id").bindparams(
+        bindparam("paid_until", type_=DateTime(timezone=True))
+    )
+    for wallet_id, paid_at in latest:
+        if paid_at is not None:
+            conn.execute(update, {"id": wallet_id, "paid_until": paid_at + timedelta(hours=24)})
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_wallets_paid_until ON wallets (paid_until)"))
+
+
+@migration(7, "sessions.revoked_at")
+def _sessions_revoked_at(conn: Connection):
+    add_column_if_missing(conn, "sessions", "created_at", "TIMESTAMP")
+    add_column_if_missing(conn, "sessions", "revoked_at", "TIMESTAMP")
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sessions_revoked_at ON sessions (revoked_at)"))
+
+
+@migration(8, "money as integer kobo")
+def _money_as_kobo(conn: Connection):
+    add_column_if_missing(conn, "wallets", "balance_kobo", "BIGINT NOT NULL DEFAULT 0")
+    add_column_if_missing(conn, "transactions", "amount_kobo", "BIGINT")
+    #copy the old Numeric(12,2) naira values over; the old columns stay behind unmapped.
+    #A fresh database never had them, so only convert where they exist.
+    if "balance" in {c["name"] for c in inspect(conn).get_columns("wallets")}:
+        conn.execute(text("UPDATE wallets SET balance_kobo = CAST(ROUND(balance * 100) AS BIGINT) WHERE balance IS NOT NULL"))
+    if "amount" in {c["name"] for c in inspect(conn).get_columns("transactions")}:
+        conn.execute(text("UPDATE transactions SET amount_kobo = CAST(ROUND(amount * 100) AS BIGINT) WHERE amount IS NOT NULL"))
+
+
+@migration(9, "anchor_batches nonce tracking")
+def _anchor_batches_nonce(conn: Connection):
+    add_column_if_missing(conn, "anchor_batches", "previous_tx_hashes", "VARCHAR")
+    add_column_if_missing(conn, "anchor_batches", "nonce", "INTEGER")
+    add_column_if_missing(conn, "anchor_batches", "gas_price", "BIGINT")
+    add_column_if_missing(conn, "anchor_batches", "submitted_at", "TIMESTAMP")
+    #batches in flight were sent about when they were built
+    conn.execute(text("UPDATE anchor_batches SET submitted_at = created_at WHERE status = 'submitted' AND submitted_at IS NULL"))
+
+
+@migration(10, "share_codes.movie_id as varchar")
+def _share_codes_movie_id(conn: Connection):
+    #movies.id is a uuid string but the column was declared INTEGER
+    column = next(c for c in inspect(conn).get_columns("share_codes") if c["name"] == "movie_id")
+    if isinstance(column["type"], String):
+        return
+    if conn.dialect.name != "sqlite":
+        conn.execute(text("ALTER TABLE share_codes ALTER COLUMN movie_id TYPE VARCHAR USING movie_id::varchar"))
+        return
+    #sqlite can't change a column's type, rebuild the table
+    conn.execute(text(
+        "CREATE TABLE share_codes_new ("
+        "id INTEGER NOT NULL PRIMARY KEY, code VARCHAR, movie_id VARCHAR REFERENCES movies(id), "
+        "shared_by INTEGER REFERENCES users(id), shared_with INTEGER REFERENCES users(id), "
+        "redeemed BOOLEAN, expires_at DATETIME)"
+    ))
+    conn.execute(text(
+        "INSERT INTO share_codes_new (id, code, movie_id, shared_by, shared_with, redeemed, expires_at) "
+        "SELECT id, code, CAST(movie_id AS VARCHAR), shared_by, shared_with, redeemed, expires_at FROM share_codes"
+    ))
+    conn.execute(text("DROP TABLE share_codes"))
+    conn.execute(text("ALTER TABLE share_codes_new RENAME TO share_codes"))
+    conn.execute(text("CREATE UNIQUE INDEX ix_share_codes_code ON share_codes (code)"))
+    conn.execute(text("CREATE INDEX ix_share_codes_id ON share_codes (id)"))
+
+
+@migration(11, "wallet_keys drop claimed rows")
+def _wallet_keys_drop_claimed(conn: Connection):
+    #claimed keys used to stay behind, encrypted, next to the user's own copy
+    conn.execute(text("DELETE FROM wallet_keys WHERE claimed_by IS NOT NULL"))
@@ -1,13 +1,12 @@
 # models.py
 
 import uuid
-from sqlalchemy import Column, Integer, String, Numeric, ForeignKey, DateTime, Boolean, func, Enum
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, BigInteger, String, Numeric, ForeignKey, DateTime, Boolean, Float, UniqueConstraint, func, Enum, cast
+from sqlalchemy.orm import relationship, foreign
 from db.session import Base
 import datetime
 from sqlalchemy import text, inspect
 from sqlalchemy.orm import declarative_base, Session
-import cv2
 
 Base = declarative_base()
 
@@ -36,25 +35,43 @@ class User(Base):
     wallet = relationship("Wallet", back_populates="user", uselist=False)
     # The name is now "UserSession" to match the renamed class below.
     sessions = relationship("UserSession", back_populates="user")
+    #user_preferences.user_id is a string column, hence the cast
+    preferences = relationship(
+        "UserPreference",
+        primaryjoin=lambda: cast(User.id, String) == foreign(UserPreference.user_id),
+        uselist=False,
+        viewonly=True,
+    )
 
 
 class Wallet(Base):
     __tablename__ = "wallets"
     id = Column(Integer, primary_key=True)
     user_id = Column(Integer, ForeignKey("users.id"), unique=True, nullable=False)
-    balance = Column(Numeric(12, 2), default=0.00)
+    balance_kobo = Column(BigInteger, nullable=False, default=0, server_default="0")  #integer kobo, see utils/money.py
     currency = Column(String(3), default="NGN")
+    paid_until = Column(DateTime(timezone=True), index=True)  #end of the current daily pass, set with the debit that bought it
     updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
 
     user = relationship("User", back_populates="wallet")
     transactions = relationship("Transaction", back_populates="wallet", cascade="all, delete-orphan")
 
+#pre-generated blockchain keypairs waiting for a signup, private key encrypted at rest (services/wallet_key_pool.py)
+class WalletKey(Base):
+    __tablename__ = "wallet_keys"
+    id = Column(Integer, primary_key=True)
+    address = Column(String(255), unique=True, nullable=False)
+    encrypted_key = Column(String, nullable=False)
+    claimed_by = Column(Integer, ForeignKey("users.id"), nullable=True, index=True)  #claims delete the row now, only old claimed rows had this set
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    claimed_at = Column(DateTime(timezone=True), nullable=True)
+
 class Transaction(Base):
     __tablename__ = "transactions"
     id = Column(Integer, primary_key=True)
     wallet_id = Column(Integer, ForeignKey("wallets.id"), nullable=False)
     type = Column(String(20))
-    amount = Column(Numeric(12,2))
+    amount_kobo = Column(BigInteger)
     status = Column(String(20), default="pending")
     reference = Column(String(255), unique=True, index=True, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -67,8 +84,10 @@ class UserSession(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"))
-    token = Column(String, unique=True, index=True, nullable=False)
+    token = Column(String, unique=True, index=True, nullable=False)  #sha256 of the refresh token, never the token itself
     expires_at = Column(DateTime, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    revoked_at = Column(DateTime(timezone=True), nullable=True, index=True)  #workers poll for rows newer than the last one they saw
 
     # The back-reference now points back to the correct model name.
     user = relationship("User", back_populates="sessions")
@@ -85,9 +104,85 @@ class Movie(Base):
     description = Column(String)
     cover = Column(String)  #url to the cover imagd
     url = Column(String) 
+    source_path = Column(String)  #the original upload, url moves to the HLS master once transcoded
+    renditions = Column(String)  #JSON list of the ladder rungs that were actually encoded
+    thumbnails = Column(String)  #JSON: cover sizes + scrub sprite WebVTT track
     hash = Column(String, unique=True, index=True)  #hash of the video file
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    #on-chain ownership: the hash is a leaf in a batch whose Merkle root is registered
+    creator_address = Column(String(255))
+    anchor_status = Column(String(20), default="pending", index=True)  #pending, batched, anchored (direct = registered on its own before batching)
+    anchor_batch_id = Column(Integer, ForeignKey("anchor_batches.id"), nullable=True, index=True)
+    merkle_proof = Column(String)  #JSON list of sibling hashes, leaf -> root
+
+    anchor_batch = relationship("AnchorBatch", back_populates="movies")
+
+
+class AnchorBatch(Base):
+    __tablename__ = "anchor_batches"
+    id = Column(Integer, primary_key=True)
+    root = Column(String(64), nullable=False, index=True)
+    leaf_count = Column(Integer, nullable=False)
+    status = Column(String(20), nullable=False, default="pending", index=True)  #pending, submitted, confirmed, failed
+    tx_hash = Column(String(66), nullable=True)  #the latest broadcast; a fee bump replaces it at the same nonce
+    previous_tx_hashes = Column(String)  #JSON list of the ones it replaced, any of them may still be the one mined
+    nonce = Column(Integer, nullable=True)
+    gas_price = Column(BigInteger, nullable=True)  #wei, of tx_hash
+    block_number = Column(Integer, nullable=True)
+    error = Column(String)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    submitted_at = Column(DateTime(timezone=True), nullable=True)  #last broadcast, the receipt timeout counts from here
+    anchored_at = Column(DateTime(timezone=True), nullable=True)
+
+    movies = relationship("Movie", back_populates="anchor_batch")
+
+
+class ContentRegistration(Base):
+    """Local copy of the contract's ContentRegistered events, kept by services/chain_indexer."""
+    __tablename__ = "content_registrations"
+    __table_args__ = (UniqueConstraint("tx_hash", "log_index", name="uq_content_registrations_log"),)
+    id = Column(Integer, primary_key=True)
+    hash = Column(String, unique=True, index=True, nullable=False)  #file hash or a batch Merkle root
+    creator = Column(String(42), index=True, nullable=False)
+    registered_at = Column(Integer, nullable=False)  #block timestamp, unix seconds
+    block_number = Column(Integer, index=True, nullable=False)
+    block_hash = Column(String(66), nullable=False)
+    tx_hash = Column(String(66), nullable=False)
+    log_index = Column(Integer, nullable=False)
+
+
+class IndexedBlock(Base):
+    """Block hashes the indexer has seen, newest kept; a mismatch with the chain means a reorg."""
+    __tablename__ = "indexed_blocks"
+    block_number = Column(Integer, primary_key=True)
+    block_hash = Column(String(66), nullable=False)
+
+
+class IndexerCheckpoint(Base):
+    __tablename__ = "indexer_checkpoints"
+    name = Column(String(50), primary_key=True)
+    block_number = Column(Integer, nullable=False)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+
+class MediaJob(Base):
+    __tablename__ = "media_jobs"
+    id = Column(Integer, primary_key=True)
+    movie_id = Column(String, ForeignKey("movies.id"), nullable=False, index=True)
+    kind = Column(String(20), nullable=False, default="transcode")
+    status = Column(String(20), nullable=False, default="queued", index=True)  #queued, running, done, failed
+    progress = Column(Float, nullable=False, default=0.0)  #0..1
+    input_path = Column(String, nullable=False)
+    output_dir = Column(String, nullable=False)
+    result = Column(String)  #e.g. path to the master playlist
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    movie = relationship("Movie")
+
 
 class UserPreference(Base):
     __tablename__ = "user_preferences"
@@ -101,7 +196,7 @@ class ShareCode(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     code = Column(String, unique=True, index=True)
-    movie_id = Column(Integer, ForeignKey("movies.id"))
+    movie_id = Column(String, ForeignKey("movies.id"))  #movies.id is a uuid string
     shared_by = Column(Integer, ForeignKey("users.id"))
     shared_with = Column(Integer, ForeignKey("users.id"), nullable=True)
     redeemed = Column(Boolean, default=False)
@@ -12,7 +12,7 @@ class Token(BaseModel):
     token_type: str
 
 class WalletRead(BaseModel):
-    balance: Decimal
+    balance_kobo: int
     currency: str
     class Config:
         from_attributes = True
@@ -23,7 +23,7 @@ class TransactionCreate(BaseModel):
 
 class TransactionRead(BaseModel):
     id: int
-    amount: Decimal
+    amount_kobo: int
     type: str
     status: str
     reference: Optional[str]
@@ -48,6 +48,9 @@ class UserLogin(BaseModel):
     email: EmailStr
     password: str
 
+class RefreshRequest(BaseModel):
+    refresh_token: str
+
 class UserResponse(UserBase):
     id: int
     class Config:
@@ -11,7 +11,7 @@ def create_user(db: Session, email: str, password_hash: str, role: str = "user")
     user = models.User(email=email, password_hash=password_hash, role=role)
     db.add(user)
 
-    wallet = models.Wallet(user_id=user.id, balance=0.00)
+    wallet = models.Wallet(user_id=user.id, balance_kobo=0)
     db.add(wallet)
 
     db.flush()
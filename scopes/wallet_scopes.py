@@ -1,6 +1,10 @@
+from sqlalchemy import update, or_
 from sqlalchemy.orm import Session
+from datetime import datetime, timedelta, timezone
 import models
 
+PASS_DURATION = timedelta(hours=24)
+
 def get_wallet_by_user_id(db: Session, user_id: int):
     return db.query(models.Wallet).filter(models.Wallet.user_id == user_id).first()
 
@@ -8,8 +12,65 @@ def get_wallet_by_id_for_update(db: Session, wallet_id: int):
     #lock for safe concurrent updates
     return db.query(models.Wallet).filter(models.Wallet.id == wallet_id).with_for_update().first()
 
-def update_balance(db: Session, wallet: models.Wallet, new_balance):
-    wallet.balance = new_balance
+def update_balance(db: Session, wallet: models.Wallet, new_balance_kobo: int):
+    wallet.balance_kobo = new_balance_kobo
     db.add(wallet)
     db.flush()
-    return wallet
\ No newline at end of file
+    return wallet
+
+# -------------------- Debit / credit -------------------- #
+#Each one is a single conditional UPDATE: the check and the write happen under the row lock
+#the write itself takes, so the balance can't change between a read and a write.
+#They don't commit and don't touch Wallet objects already loaded in the session.
+#Amounts are integer kobo (utils/money.py).
+
+def _apply(db: Session, wallet_id: int, *conditions, **values) -> bool:
+    result = db.execute(
+        update(models.Wallet).where(models.Wallet.id == wallet_id, *conditions).values(**values),
+        execution_options={"synchronize_session": False},
+    )
+    return result.rowcount == 1
+
+def debit(db: Session, wallet_id: int, amount_kobo: int) -> bool:
+    """balance -= amount if the balance covers it. False (and nothing written) if it doesn't."""
+    return _apply(db, wallet_id, models.Wallet.balance_kobo >= amount_kobo, balance_kobo=models.Wallet.balance_kobo - amount_kobo)
+
+def credit(db: Session, wallet_id: int, amount_kobo: int) -> bool:
+    return _apply(db, wallet_id, balance_kobo=models.Wallet.balance_kobo + amount_kobo)
+
+def buy_pass(db: Session, wallet_id: int, amount_kobo: int, at: datetime | None = None) -> bool:
+    """
+    Debit the pass price and start the pass in one statement, only if the
+    balance covers it and no pass is running. Two taps on "pay" can't both charge.
+    """
+    at = at or datetime.now(timezone.utc)
+    return _apply(
+        db, wallet_id,
+        models.Wallet.balance_kobo >= amount_kobo,
+        or_(models.Wallet.paid_until.is_(None), models.Wallet.paid_until <= at),
+        balance_kobo=models.Wallet.balance_kobo - amount_kobo,
+        paid_until=at + PASS_DURATION,
+    )
+
+def transfer_between(db: Session, from_wallet_id: int, to_wallet_id: int, amount_kobo: int) -> bool:
+    """
+    Move amount between two wallets in the caller's transaction. The rows are
+    written in wallet id order, so two opposite transfers queue on the same
+    row first instead of each holding the lock the other one needs.
+    """
+    if from_wallet_id < to_wallet_id:
+        return debit(db, from_wallet_id, amount_kobo) and credit(db, to_wallet_id, amount_kobo)
+    #credit first; if the debit then fails the caller rolls the credit back
+    return credit(db, to_wallet_id, amount_kobo) and debit(db, from_wallet_id, amount_kobo)
+
+def _utc(moment: datetime) -> datetime:
+    #sqlite hands back naive datetimes, everything is stored in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+def pass_is_active(paid_until: datetime | None, at: datetime | None = None) -> bool:
+    return paid_until is not None and _utc(paid_until) > (at or datetime.now(timezone.utc))
+
+def active_pass_user_ids(db: Session, at: datetime | None = None) -> list[int]:
+    #range scan on ix_wallets_paid_until
+    at = at or datetime.now(timezone.utc)
+    return [user_id for (user_id,) in db.query(models.Wallet.user_id).filter(models.Wallet.paid_until > at)]
@@ -0,0 +1,305 @@
+import json
+import datetime
+import threading
+from sqlalchemy import update
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from blockchain.client import get_upload_contract, get_tx_pipeline
+from blockchain.tx_pipeline import TxPipeline
+from utils import merkle
+from utils.background import PeriodicTask
+from utils.leader_lock import LeaderLock
+
+
+def build_batch(db: Session, max_leaves: int) -> models.AnchorBatch | None:
+    """
+    Fold every pending movie hash (up to max_leaves) into one Merkle tree
+    and give each movie its inclusion proof. Nothing touches the chain here.
+    """
+    candidates = [movie_id for (movie_id,) in db.query(models.Movie.id).filter(
+        models.Movie.anchor_status == "pending"
+    ).order_by(models.Movie.created_at, models.Movie.id).limit(max_leaves).all()]
+    if not candidates:
+        return None
+
+    batch = models.AnchorBatch(root="", leaf_count=0, status="pending")
+    db.add(batch)
+    db.flush()
+    #claim: anything another builder took in the meantime is no longer "pending" and stays theirs
+    db.execute(
+        update(models.Movie)
+        .where(models.Movie.id.in_(candidates), models.Movie.anchor_status == "pending")
+        .values(anchor_status="batched", anchor_batch_id=batch.id)
+        .execution_options(synchronize_session=False)
+    )
+    movies = db.query(models.Movie).filter(models.Movie.anchor_batch_id == batch.id).order_by(models.Movie.created_at, models.Movie.id).all()
+    if not movies:
+        db.rollback()
+        return None
+
+    levels = merkle.build_tree([merkle.leaf_hash(m.creator_address, m.hash) for m in movies])
+    batch.root = merkle.root(levels).hex()
+    batch.leaf_count = len(movies)
+    for index, movie in enumerate(movies):
+        movie.merkle_proof = json.dumps(merkle.proof(levels, index))
+    db.commit()
+    return batch
+
+
+def mark_confirmed(db: Session, batch: models.AnchorBatch, tx_hash: str, block_number: int):
+    batch.status = "confirmed"
+    batch.tx_hash = tx_hash
+    batch.block_number = block_number
+    batch.anchored_at = datetime.datetime.now(datetime.timezone.utc)
+    for movie in batch.movies:
+        movie.anchor_status = "anchored"
+    db.commit()
+
+def mark_failed(db: Session, batch: models.AnchorBatch, error: str):
+    #release the movies so the next round puts them in a fresh batch
+    batch.status = "failed"
+    batch.error = error[:1000]
+    for movie in batch.movies:
+        movie.anchor_status = "pending"
+        movie.anchor_batch_id = None
+        movie.merkle_proof = None
+    db.commit()
+
+
+def anchor_pending(db: Session, pipeline: TxPipeline, contract, private_key: str, max_leaves: int = 1024) -> models.AnchorBatch | None:
+    """
+    One anchoring round: batch what is pending and send the root.
+    Returns straight after the node accepts the transaction, the batch
+    stays "submitted" until poll_receipts sees it mined.
+    pipeline/contract are passed in so this runs the same against eth-tester, anvil or the real RPC.
+    """
+    batch = build_batch(db, max_leaves)
+    if not batch:
+        return None
+    try:
+        signed = pipeline.sign(contract.functions.registerContent(batch.root), private_key)
+    except Exception as e:
+        mark_failed(db, batch, str(e))
+        raise
+    #recorded before it goes out, so a crash right after the broadcast can't lose track of it
+    _record_signed(batch, signed)
+    db.commit()
+    try:
+        pipeline.broadcast(signed)
+    except Exception as e:
+        #the node may have taken it anyway (timeout); the poller settles it either way by its nonce
+        print(f"Broadcasting anchor batch {batch.id} failed, the receipt poller will retry: {e}")
+    batch.status = "submitted"
+    db.commit()
+    return batch
+
+
+def _record_signed(batch: models.AnchorBatch, signed):
+    if batch.tx_hash and batch.tx_hash != signed.tx_hash:
+        batch.previous_tx_hashes = json.dumps(_batch_hashes(batch))
+    batch.tx_hash = signed.tx_hash
+    batch.nonce = signed.nonce
+    batch.gas_price = signed.gas_price
+    batch.submitted_at = datetime.datetime.now(datetime.timezone.utc)
+
+def _batch_hashes(batch: models.AnchorBatch) -> list[str]:
+    #every transaction ever sent for this batch, all at the same nonce, so at most one can be mined
+    hashes = json.loads(batch.previous_tx_hashes) if batch.previous_tx_hashes else []
+    return hashes + ([batch.tx_hash] if batch.tx_hash else [])
+
+def _utc(moment: datetime.datetime | None) -> datetime.datetime | None:
+    #sqlite hands back naive datetimes, everything is stored in UTC
+    return moment.replace(tzinfo=datetime.timezone.utc) if moment and moment.tzinfo is None else moment
+
+
+def recover_interrupted(db: Session) -> int:
+    """
+    Batches a crash left "pending" (built, maybe signed, never marked sent).
+    Unsigned ones give their movies back; signed ones may be on the chain
+    already, so they go to the receipt poller like any other sent batch.
+    """
+    batches = db.query(models.AnchorBatch).filter(models.AnchorBatch.status == "pending").all()
+    for batch in batches:
+        if batch.tx_hash:
+            batch.status = "submitted"
+            db.commit()
+        else:
+            mark_failed(db, batch, "interrupted before sending")
+    return len(batches)
+
+
+def replace_stuck(db: Session, batch: models.AnchorBatch, pipeline: TxPipeline, contract, private_key: str,
+                  bump_percent: int, max_gas_price: int) -> bool:
+    """
+    Re-send the batch at its own nonce with a higher fee. Whichever of its
+    transactions gets mined settles it, and since they share a nonce the
+    root can't be registered twice. False if the fee is already at the cap.
+    """
+    current = batch.gas_price or pipeline.w3.to_wei(pipeline.gas_price_gwei, "gwei")
+    gas_price = min(current * (100 + bump_percent) // 100, max_gas_price)
+    if gas_price <= current:
+        #nothing left to bump, keep waiting (and don't log this every poll)
+        batch.submitted_at = datetime.datetime.now(datetime.timezone.utc)
+        db.commit()
+        print(f"Anchor batch {batch.id} is stuck at the gas price cap, nonce {batch.nonce}")
+        return False
+
+    signed = pipeline.sign(contract.functions.registerContent(batch.root), private_key, nonce=batch.nonce, gas_price=gas_price)
+    _record_signed(batch, signed)
+    db.commit()
+    try:
+        pipeline.broadcast(signed)
+    except Exception as e:
+        #e.g. the old one was mined meanwhile ("nonce too low"): the next poll sees that
+        print(f"Replacing anchor batch {batch.id} failed: {e}")
+    print(f"Anchor batch {batch.id} re-sent at nonce {batch.nonce}, gas price {gas_price} wei, tx {batch.tx_hash}")
+    return True
+
+
+def _lookup_nonce(pipeline: TxPipeline, tx_hash: str | None) -> int | None:
+    from web3.exceptions import TransactionNotFound
+
+    if not tx_hash:
+        return None
+    try:
+        return pipeline.w3.eth.get_transaction(tx_hash)["nonce"]
+    except TransactionNotFound:
+        return None
+
+
+def poll_receipts(db: Session, pipeline: TxPipeline, contract, private_key: str, timeout_seconds: float,
+                  bump_percent: int = 25, max_gas_price: int | None = None) -> int:
+    """
+    Settle every submitted batch whose nonce has been used:
+      - one of its transactions was mined -> confirmed (or failed if it reverted)
+      - something else took the nonce (dropped, replaced from outside) -> failed, hashes back to pending
+    A batch whose nonce is still open is never given up on: after timeout_seconds
+    without a receipt it is re-sent at the same nonce with a higher fee.
+    Returns how many batches were settled.
+    """
+    batches = db.query(models.AnchorBatch).filter(models.AnchorBatch.status == "submitted").all()
+    if not batches:
+        return 0
+
+    sender = pipeline.w3.eth.account.from_key(private_key).address
+    #nonce count first, receipts second: a transaction mined in between still shows up in the receipts
+    mined_nonce = pipeline.w3.eth.get_transaction_count(sender, "latest")
+    receipts = pipeline.get_receipts([h for batch in batches for h in _batch_hashes(batch)])
+    max_gas_price = max_gas_price or pipeline.w3.to_wei(500, "gwei")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    settled = 0
+    for batch in batches:
+        mined = next(((h, receipts[h]) for h in _batch_hashes(batch) if receipts.get(h)), None)
+        if mined:
+            tx_hash, receipt = mined
+            if receipt["status"] == 1:
+                mark_confirmed(db, batch, tx_hash, receipt["blockNumber"])
+            else:
+                mark_failed(db, batch, f"transaction {tx_hash} reverted")
+            settled += 1
+            continue
+
+        if batch.nonce is None:
+            #sent before nonces were recorded: ask the node, and if it has never heard of it, it was dropped
+            batch.nonce = _lookup_nonce(pipeline, batch.tx_hash)
+            if batch.nonce is None:
+                mark_failed(db, batch, f"transaction {batch.tx_hash} unknown to the node")
+                settled += 1
+                continue
+            db.commit()
+
+        if batch.nonce < mined_nonce:
+            mark_failed(db, batch, f"nonce {batch.nonce} was used by a transaction that isn't this batch's")
+            settled += 1
+            continue
+
+        sent_at = _utc(batch.submitted_at or batch.created_at)
+        if sent_at and (now - sent_at).total_seconds() > timeout_seconds:
+            replace_stuck(db, batch, pipeline, contract, private_key, bump_percent, max_gas_price)
+    return settled
+
+
+def movie_proof(movie: models.Movie) -> dict:
+    """Everything a client needs to check ownership offline against the on-chain root."""
+    batch = movie.anchor_batch
+    siblings = json.loads(movie.merkle_proof) if movie.merkle_proof else []
+    leaf = merkle.leaf_hash(movie.creator_address, movie.hash)
+    return {
+        "movie_id": movie.id,
+        "file_hash": movie.hash,
+        "creator_address": movie.creator_address,
+        "anchor_status": movie.anchor_status,
+        "leaf": leaf.hex(),
+        "proof": siblings,
+        "root": batch.root if batch else None,
+        "tx_hash": batch.tx_hash if batch else None,
+        "block_number": batch.block_number if batch else None,
+        "valid": merkle.verify(leaf, siblings, batch.root) if batch else None,
+    }
+
+
+class AnchorService:
+    """
+    Two loops: an anchoring round every ANCHOR_INTERVAL_SECONDS, and a
+    receipt poller every RECEIPT_POLL_SECONDS that confirms what was sent.
+    Every worker runs the loops, only the one holding the leader lock does
+    anything; it sweeps up after a crashed predecessor when it takes over.
+    """
+    def __init__(self, interval: float, poll_interval: float):
+        self._leader = LeaderLock("anchor")
+        self._lead_guard = threading.Lock()
+        self._anchor_task = PeriodicTask("anchor-batches", interval, self.run_once)
+        self._receipt_task = PeriodicTask("anchor-receipts", poll_interval, self.poll_once)
+
+    def start(self):
+        self._anchor_task.start()
+        self._receipt_task.start()
+
+    def stop(self):
+        self._anchor_task.stop()
+        self._receipt_task.stop()
+        self._leader.release()
+
+    def _lead(self) -> bool:
+        #both loops call this; the guard makes sure recovery finishes before either does real work
+        with self._lead_guard:
+            if self._leader.held:
+                return True
+            if not self._leader.try_acquire():
+                return False
+            db = SessionLocal()
+            try:
+                recovered = recover_interrupted(db)
+                if recovered:
+                    print(f"Recovered {recovered} interrupted anchor batches")
+            finally:
+                db.close()
+            return True
+
+    def run_once(self):
+        if not self._lead():
+            return
+        db = SessionLocal()
+        try:
+            batch = anchor_pending(db, get_tx_pipeline(), get_upload_contract(), settings.DEPLOYER_PRIVATE_KEY, settings.ANCHOR_MAX_BATCH)
+            if batch:
+                print(f"Submitted anchor batch {batch.id}: {batch.leaf_count} hashes, root {batch.root}, tx {batch.tx_hash}")
+        finally:
+            db.close()
+
+    def poll_once(self):
+        if not self._lead():
+            return
+        db = SessionLocal()
+        try:
+            pipeline = get_tx_pipeline()
+            poll_receipts(db, pipeline, get_upload_contract(), settings.DEPLOYER_PRIVATE_KEY, settings.RECEIPT_TIMEOUT_SECONDS,
+                          settings.ANCHOR_GAS_BUMP_PERCENT, pipeline.w3.to_wei(settings.ANCHOR_MAX_GAS_PRICE_GWEI, "gwei"))
+        finally:
+            db.close()
+
+
+anchor_service = AnchorService(settings.ANCHOR_INTERVAL_SECONDS, settings.RECEIPT_POLL_SECONDS)
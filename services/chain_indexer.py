@@ -0,0 +1,131 @@
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from blockchain.client import get_w3, get_upload_contract
+from utils.background import PeriodicTask
+from utils.leader_lock import LeaderLock
+
+CHECKPOINT_NAME = "content_registry"
+
+
+def _hex(value) -> str:
+    if isinstance(value, str):
+        return value if value.startswith("0x") else "0x" + value
+    return "0x" + bytes(value).hex()
+
+def _checkpoint(db: Session, start_block: int) -> models.IndexerCheckpoint:
+    checkpoint = db.get(models.IndexerCheckpoint, CHECKPOINT_NAME)
+    if not checkpoint:
+        checkpoint = models.IndexerCheckpoint(name=CHECKPOINT_NAME, block_number=start_block - 1)
+        db.add(checkpoint)
+        db.flush()
+    return checkpoint
+
+
+def rewind_reorged(db: Session, w3, checkpoint: models.IndexerCheckpoint) -> int | None:
+    """
+    Compare the blocks we indexed against the chain, newest first. If the
+    newest one no longer matches, walk back to the last block that still
+    does, drop everything indexed after it and move the checkpoint there.
+    Returns the fork block, or None if there was no reorg.
+    """
+    seen = db.query(models.IndexedBlock).order_by(models.IndexedBlock.block_number.desc()).all()
+    if not seen:
+        return None
+    fork = None
+    for block in seen:
+        if _hex(w3.eth.get_block(block.block_number)["hash"]) == block.block_hash:
+            fork = block.block_number
+            break
+    if fork == seen[0].block_number:
+        return None
+
+    #nothing we remember survived: start again from before the oldest block we still track
+    if fork is None:
+        fork = seen[-1].block_number - 1
+
+    db.query(models.ContentRegistration).filter(models.ContentRegistration.block_number > fork).delete()
+    db.query(models.IndexedBlock).filter(models.IndexedBlock.block_number > fork).delete()
+    checkpoint.block_number = min(checkpoint.block_number, fork)
+    db.commit()
+    print(f"Reorg detected, indexer rewound to block {fork}")
+    return fork
+
+
+def sync(db: Session, w3, contract, start_block: int = 0, confirmations: int = 2, chunk_size: int = 2000, reorg_depth: int = 64) -> int:
+    """
+    Pull ContentRegistered logs from the checkpoint up to the chain head
+    (minus `confirmations`) in chunk_size block ranges. Returns how many
+    registrations were added.
+    w3/contract are passed in so this runs the same against eth-tester, anvil or the real RPC.
+    """
+    checkpoint = _checkpoint(db, start_block)
+    rewind_reorged(db, w3, checkpoint)
+
+    head = w3.eth.block_number - confirmations
+    added = 0
+    while checkpoint.block_number < head:
+        from_block = checkpoint.block_number + 1
+        to_block = min(from_block + chunk_size - 1, head)
+        logs = contract.events.ContentRegistered.get_logs(from_block=from_block, to_block=to_block)
+
+        for log in logs:
+            db.add(models.ContentRegistration(
+                hash=log["args"]["hash"],
+                creator=log["args"]["creator"],
+                registered_at=log["args"]["timestamp"],
+                block_number=log["blockNumber"],
+                block_hash=_hex(log["blockHash"]),
+                tx_hash=_hex(log["transactionHash"]),
+                log_index=log["logIndex"],
+            ))
+            db.merge(models.IndexedBlock(block_number=log["blockNumber"], block_hash=_hex(log["blockHash"])))
+            added += 1
+
+        #remember the tip of every range too, so a reorg with no events in it is still noticed
+        db.merge(models.IndexedBlock(block_number=to_block, block_hash=_hex(w3.eth.get_block(to_block)["hash"])))
+        checkpoint.block_number = to_block
+        db.query(models.IndexedBlock).filter(models.IndexedBlock.block_number <= to_block - reorg_depth).delete()
+        db.commit()
+    return added
+
+
+def lookup(db: Session, file_hash: str):
+    return db.query(models.ContentRegistration).filter(models.ContentRegistration.hash == file_hash).first()
+
+
+class ChainIndexer:
+    """
+    Every worker runs the loop, only the holder of the leader lock syncs, so
+    workers don't race each other into the unique constraints on the index.
+    """
+    def __init__(self, interval: float):
+        self._leader = LeaderLock("indexer")
+        self._task = PeriodicTask("content-indexer", interval, self.run_once)
+
+    def start(self):
+        self._task.start()
+
+    def stop(self):
+        self._task.stop()
+        self._leader.release()
+
+    def run_once(self):
+        if not self._leader.try_acquire():
+            return
+        db = SessionLocal()
+        try:
+            added = sync(db, get_w3(), get_upload_contract(), settings.INDEXER_START_BLOCK, settings.INDEXER_CONFIRMATIONS,
+                         settings.INDEXER_CHUNK_SIZE, settings.INDEXER_REORG_DEPTH)
+            if added:
+                print(f"Indexed {added} content registrations")
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+
+chain_indexer = ChainIndexer(settings.INDEXER_POLL_SECONDS)
@@ -0,0 +1,84 @@
+"""
+"User X may watch movie Y until T", from both ways of getting access:
+the daily pass (Wallet.paid_until, set by pay-for-today) and
+share codes the user redeemed. Computed once per user and kept in memory;
+pay-for-today and redeem invalidate it, so every other check is a dict lookup.
+"No access" is only kept for a couple of seconds: a payment confirmed on
+another worker can't invalidate this one's copy, and a user who just paid
+shouldn't be refused for a minute.
+"""
+import time
+from datetime import datetime, timezone
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from utils.ttl_cache import TTLCache
+
+#user_id -> {"pass_until": epoch | None, "movies": {movie_id: epoch}}
+_cache = TTLCache(settings.ENTITLEMENT_CACHE_SECONDS)
+
+
+def _epoch(moment: datetime | None) -> float | None:
+    if moment is None:
+        return None
+    #sqlite hands back naive datetimes, and everything here is stored in UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
+
+
+def load_entitlements(db: Session, user_id: int) -> dict:
+    paid_until = db.query(models.Wallet.paid_until).filter(models.Wallet.user_id == user_id).scalar()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    grants = db.query(models.ShareCode.movie_id, models.ShareCode.expires_at).filter(
+        models.ShareCode.shared_with == user_id,
+        models.ShareCode.redeemed == True,
+        models.ShareCode.expires_at > now,
+    ).all()
+
+    movies = {}
+    for movie_id, expires_at in grants:
+        movies[str(movie_id)] = max(movies.get(str(movie_id), 0), _epoch(expires_at))
+
+    return {
+        "pass_until": _epoch(paid_until),
+        "movies": movies,
+    }
+
+def _cache_ttl(granted: dict) -> float:
+    #keep it until the soonest grant runs out at the latest; once nothing is active, only briefly
+    now = time.time()
+    active = [until for until in [granted["pass_until"], *granted["movies"].values()] if until and until > now]
+    if not active:
+        return settings.ENTITLEMENT_NEGATIVE_CACHE_SECONDS
+    return max(min(active) - now, settings.ENTITLEMENT_NEGATIVE_CACHE_SECONDS)
+
+def entitlements(db: Session, user_id: int) -> dict:
+    cached = _cache.get(user_id)
+    if cached is None:
+        cached = load_entitlements(db, user_id)
+        _cache.set(user_id, cached, ttl=_cache_ttl(cached))
+    return cached
+
+def invalidate(user_id: int):
+    """Call after anything that changes what a user may watch (payment, redeemed code)."""
+    _cache.invalidate(user_id)
+
+
+def pass_until(db: Session, user_id: int) -> float | None:
+    until = entitlements(db, user_id)["pass_until"]
+    return until if until and until > time.time() else None
+
+def has_daily_pass(db: Session, user_id: int) -> bool:
+    return pass_until(db, user_id) is not None
+
+def access_until(db: Session, user_id: int, movie_id: str) -> float | None:
+    """Epoch seconds until which the user may watch the movie, None if they may not."""
+    granted = entitlements(db, user_id)
+    until = max(granted["pass_until"] or 0, granted["movies"].get(str(movie_id), 0))
+    return until if until > time.time() else None
+
+def cache_stats() -> dict:
+    return _cache.stats()
@@ -0,0 +1,83 @@
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from config import settings
+from utils.lru_cache import ByteLRUCache, StatLRUCache, path_mtime
+
+#only files the transcoder writes: {file_id}_master.m3u8, {file_id}_720p.m3u8, {file_id}_720p12.ts
+HLS_NAME = re.compile(r"^[\w-]+\.(m3u8|ts)$")
+MEDIA_TYPES = {
+    "m3u8": "application/vnd.apple.mpegurl",
+    "ts": "video/mp2t",
+}
+
+hls_cache = ByteLRUCache(settings.HLS_CACHE_MAX_BYTES)
+
+#variant playlist path -> ordered segment names, so prefetch knows what comes next.
+#Checked against the directory's mtime, a re-transcode into the same folder drops it
+_segment_order = StatLRUCache(settings.HLS_INDEX_CACHE_ENTRIES)
+_prefetch_pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hls-prefetch")
+
+
+def media_type(name: str) -> str:
+    return MEDIA_TYPES[name.rsplit(".", 1)[1]]
+
+def _read(path: str) -> bytes:
+    with open(path, "rb") as f:
+        return f.read()
+
+def read_file(directory: str, name: str) -> bytes:
+    """Bytes of one HLS file, from memory when it is hot. FileNotFoundError if it doesn't exist."""
+    path = os.path.join(directory, name)
+    return hls_cache.get_or_load((directory, name), lambda: _read(path))
+
+
+# -------------------- Prefetch -------------------- #
+
+def playlist_segments(playlist: bytes) -> list[str]:
+    return [line.strip() for line in playlist.decode("utf-8", "replace").splitlines() if line.strip() and not line.startswith("#")]
+
+def _variant_playlist(segment: str) -> str:
+    #{file_id}_720p12.ts -> {file_id}_720p.m3u8 (segment numbers are appended straight onto the variant name)
+    return re.sub(r"\d+\.ts$", ".m3u8", segment)
+
+def _segments_after(directory: str, segment: str, count: int) -> list[str]:
+    playlist = _variant_playlist(segment)
+    key = os.path.join(directory, playlist)
+    order = _segment_order.get(key)
+    if order is None:
+        mtime = path_mtime(directory)
+        try:
+            order = playlist_segments(read_file(directory, playlist))
+        except FileNotFoundError:
+            return []
+        _segment_order.put(key, directory, order, mtime)
+    try:
+        index = order.index(segment)
+    except ValueError:
+        return []
+    return order[index + 1:index + 1 + count]
+
+def _prefetch_one(directory: str, name: str):
+    path = os.path.join(directory, name)
+    try:
+        #warming the cache isn't a viewer lookup, keep it out of the hit ratio
+        hls_cache.get_or_load((directory, name), lambda: _read(path), count=False)
+    except OSError:
+        pass
+
+def prefetch_after(directory: str, segment: str, count: int = None):
+    """Start loading the next `count` segments of the same variant in the background."""
+    count = settings.HLS_PREFETCH_SEGMENTS if count is None else count
+    if count <= 0 or not segment.endswith(".ts"):
+        return
+    for name in _segments_after(directory, segment, count):
+        if (directory, name) not in hls_cache:
+            _prefetch_pool.submit(_prefetch_one, directory, name)
+
+
+def cache_stats() -> dict:
+    stats = hls_cache.stats()
+    stats["prefetch_segments"] = settings.HLS_PREFETCH_SEGMENTS
+    return stats
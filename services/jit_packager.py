@@ -0,0 +1,147 @@
+"""
+Just-in-time HLS for titles that only exist as the uploaded MP4.
+The playlist is cut on the file's own keyframes, and each segment is
+remuxed (-c copy, never re-encoded) the first time someone asks for it,
+then kept in a size-bounded disk cache.
+"""
+import os
+import json
+import math
+import subprocess
+
+from config import settings
+from utils import media, mp4_index
+from utils.disk_cache import DiskSegmentCache
+from utils.lru_cache import StatLRUCache, path_mtime
+
+jit_cache = DiskSegmentCache(settings.JIT_CACHE_DIR, settings.JIT_CACHE_MAX_BYTES)
+
+#source path -> plan, so segment requests don't re-read plan.json; a replaced upload changes the mtime and misses
+_plans = StatLRUCache(settings.HLS_INDEX_CACHE_ENTRIES)
+
+
+def source_key(path: str) -> str:
+    #uploads/{file_id}.mp4 -> {file_id}
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+# -------------------- Segment plan -------------------- #
+
+def probe_keyframes(path: str) -> list[float]:
+    """
+    Presentation times of the video keyframes, from the mp4 index when the
+    file has one, otherwise from ffprobe reading packets (nothing is decoded).
+    """
+    index = mp4_index.try_load(path)
+    if index is not None and len(index):
+        return list(index.times)
+    if not media.ffprobe_bin():
+        return []
+    result = subprocess.run([
+        media.ffprobe_bin(), "-v", "error", "-select_streams", "v:0",
+        "-show_entries", "packet=pts_time,flags", "-of", "csv=p=0", path,
+    ], capture_output=True, text=True, check=True)
+    keyframes = []
+    for line in result.stdout.splitlines():
+        pts_time, _, flags = line.partition(",")
+        if "K" in flags and pts_time not in ("", "N/A"):
+            keyframes.append(float(pts_time))
+    return sorted(keyframes)
+
+def plan_segments(keyframes: list[float], duration: float, target: float) -> list[tuple[float, float]]:
+    """
+    (start, duration) per segment. Segments start on keyframes and are at
+    least `target` seconds long where the GOP structure allows it. Without a
+    keyframe list we cut every `target` seconds and let ffmpeg snap back.
+    """
+    if not keyframes:
+        keyframes = [i * target for i in range(max(1, math.ceil(duration / target)))]
+
+    starts = [0.0]
+    for time in keyframes:
+        if time - starts[-1] >= target and time < duration:
+            starts.append(time)
+    ends = starts[1:] + [duration]
+    return [(start, end - start) for start, end in zip(starts, ends) if end > start]
+
+def build_plan(path: str) -> list[tuple[float, float]]:
+    index = mp4_index.try_load(path)
+    duration = (index.duration if index is not None else None) or media.probe(path).get("duration") or 0.0
+    return plan_segments(probe_keyframes(path), duration, settings.JIT_SEGMENT_SECONDS)
+
+def segment_plan(path: str) -> list[tuple[float, float]]:
+    plan = _plans.get(path)
+    if plan is not None:
+        return plan
+    mtime_ns = path_mtime(path)
+    if mtime_ns is None:
+        raise FileNotFoundError(path)
+
+    built = []
+    def produce(tmp_path):
+        built.append(build_plan(path))
+        with open(tmp_path, "w") as f:
+            json.dump({"source_mtime_ns": mtime_ns, "segments": built[0]}, f)
+
+    plan_path = jit_cache.get_or_create(os.path.join(source_key(path), "plan.json"), produce)
+    if built:
+        plan = built[0]
+    else:
+        try:
+            with open(plan_path) as f:
+                cached = json.load(f)
+        except FileNotFoundError:
+            #evicted between the lookup and the read; rebuilding is cheap next to failing the request
+            cached = {"source_mtime_ns": mtime_ns, "segments": build_plan(path)}
+        if cached["source_mtime_ns"] != mtime_ns:
+            #the upload was replaced, the cached segments are for the old file
+            jit_cache.invalidate(source_key(path))
+            return segment_plan(path)
+        plan = [tuple(segment) for segment in cached["segments"]]
+    _plans.put(path, path, plan, mtime_ns)
+    return plan
+
+
+# -------------------- Playlist and segments -------------------- #
+
+def build_playlist(plan: list[tuple[float, float]]) -> str:
+    target = math.ceil(max((length for _, length in plan), default=settings.JIT_SEGMENT_SECONDS))
+    lines = [
+        "#EXTM3U",
+        "#EXT-X-VERSION:3",
+        "#EXT-X-PLAYLIST-TYPE:VOD",
+        f"#EXT-X-TARGETDURATION:{target}",
+        "#EXT-X-MEDIA-SEQUENCE:0",
+    ]
+    for seq, (_, length) in enumerate(plan):
+        lines.append(f"#EXTINF:{length:.3f},")
+        lines.append(f"{seq}.ts")
+    lines.append("#EXT-X-ENDLIST")
+    return "\n".join(lines) + "\n"
+
+def playlist(path: str) -> str:
+    return build_playlist(segment_plan(path))
+
+def remux_command(path: str, start: float, length: float, output_path: str) -> list[str]:
+    return [
+        media.ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error",
+        #input seeking: jumps straight to the keyframe at `start` instead of reading up to it
+        "-ss", f"{start:.6f}", "-i", path, "-t", f"{length:.6f}",
+        "-map", "0:v:0", "-map", "0:a:0?",
+        "-c", "copy",
+        #keep timestamps continuous across segments so players don't see a reset at every boundary
+        "-output_ts_offset", f"{start:.6f}",
+        "-f", "mpegts", output_path,
+    ]
+
+def segment(path: str, seq: int) -> str:
+    """Path of remuxed segment `seq`, cutting it on first request. IndexError past the end."""
+    plan = segment_plan(path)
+    if seq < 0 or seq >= len(plan):
+        raise IndexError(seq)
+    start, length = plan[seq]
+
+    def produce(tmp_path):
+        subprocess.run(remux_command(path, start, length, tmp_path), capture_output=True, check=True)
+
+    return jit_cache.get_or_create(os.path.join(source_key(path), f"{seq}.ts"), produce)
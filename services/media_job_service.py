@@ -0,0 +1,243 @@
+import time
+import multiprocessing
+from datetime import datetime, timedelta, timezone
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy import update, select, func, text
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from services import transcode_service, thumbnail_service
+from utils.background import PeriodicTask
+
+#kind -> handler(db, job, on_progress) returning whatever goes in job.result
+JOB_HANDLERS = {
+    "transcode": transcode_service.run_transcode_job,
+    "thumbnails": thumbnail_service.run_thumbnail_job,
+}
+
+#don't hammer the db with a write for every progress block ffmpeg prints
+PROGRESS_WRITE_INTERVAL = 1.0
+#running jobs touch updated_at this often, so other workers can tell them from abandoned ones
+HEARTBEAT_SECONDS = 30
+#pg_advisory_xact_lock key that serialises claims across API workers ("mjob")
+CLAIM_LOCK_KEY = 0x6D6A6F62
+
+
+# -------------------- Queue API (request side) -------------------- #
+
+def enqueue_job(db: Session, movie_id: str, kind: str, input_path: str, output_dir: str) -> models.MediaJob:
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f"Unknown job kind: {kind}")
+    job = models.MediaJob(movie_id=movie_id, kind=kind, input_path=input_path, output_dir=output_dir, status="queued", progress=0.0)
+    db.add(job)
+    db.flush()
+    return job
+
+def get_job(db: Session, job_id: int):
+    return db.query(models.MediaJob).filter(models.MediaJob.id == job_id).first()
+
+def job_to_dict(job: models.MediaJob):
+    return {
+        "id": job.id,
+        "movie_id": job.movie_id,
+        "kind": job.kind,
+        "status": job.status,
+        "progress": round(job.progress or 0.0, 4),
+        "result": job.result,
+        "error": job.error,
+        "attempts": job.attempts,
+    }
+
+
+# -------------------- Worker side (runs in the process pool) -------------------- #
+
+def _set_job(db: Session, job_id: int, **values):
+    db.execute(update(models.MediaJob).where(models.MediaJob.id == job_id).values(**values))
+    db.commit()
+
+def _fail_or_retry(db: Session, job_id: int, error: str):
+    #back in the queue until MEDIA_JOB_MAX_ATTEMPTS runs (claims) are used up
+    attempts = db.query(models.MediaJob.attempts).filter(models.MediaJob.id == job_id).scalar() or 0
+    status = "queued" if attempts < settings.MEDIA_JOB_MAX_ATTEMPTS else "failed"
+    _set_job(db, job_id, status=status, progress=0.0, error=error[:1000])
+
+def _heartbeat(job_id: int):
+    db = SessionLocal()
+    try:
+        _set_job(db, job_id, updated_at=func.now())
+    finally:
+        db.close()
+
+def run_job(job_id: int):
+    db = SessionLocal()
+    try:
+        job = get_job(db, job_id)
+        if not job:
+            return
+
+        last_write = 0.0
+        def on_progress(fraction: float):
+            nonlocal last_write
+            now = time.monotonic()
+            if now - last_write < PROGRESS_WRITE_INTERVAL and fraction < 1.0:
+                return
+            last_write = now
+            _set_job(db, job_id, progress=fraction)
+
+        heartbeat = PeriodicTask(f"media-job-{job_id}-heartbeat", HEARTBEAT_SECONDS, lambda: _heartbeat(job_id))
+        heartbeat.start()
+        try:
+            result = JOB_HANDLERS[job.kind](db, job, on_progress)
+        except Exception as e:
+            db.rollback()
+            _fail_or_retry(db, job_id, str(e))
+            return
+        finally:
+            heartbeat.stop()
+
+        job.status = "done"
+        job.progress = 1.0
+        job.result = result
+        job.error = None
+        db.commit()
+    finally:
+        db.close()
+
+
+# -------------------- Dispatcher (runs in the API process) -------------------- #
+
+class MediaJobQueue:
+    """
+    Polls media_jobs for queued work and runs it on a pool of worker
+    processes. The table is the queue, so nothing is lost on restart, and
+    `concurrency` is enforced in the claim itself, so it holds across every
+    worker polling the same database.
+    """
+    def __init__(self, concurrency: int, poll_seconds: float):
+        self.concurrency = max(1, concurrency)
+        self._pool = None
+        self._running = {}  #job_id -> future
+        self._task = PeriodicTask("media-jobs", poll_seconds, self.dispatch)
+
+    def start(self):
+        self._new_pool()
+        self.requeue_stale()
+        self._task.start()
+
+    def _new_pool(self):
+        #spawn, not fork: the parent has live threads and db connections
+        self._pool = ProcessPoolExecutor(max_workers=self.concurrency, mp_context=multiprocessing.get_context("spawn"))
+
+    def _replace_pool(self, broken: ProcessPoolExecutor):
+        #a worker process died and took the executor with it, every later submit would fail too
+        if self._pool is broken:
+            print("Media job pool broke, restarting it")
+            broken.shutdown(wait=False, cancel_futures=True)
+            self._new_pool()
+
+    def _submit(self, job_id: int):
+        pool = self._pool
+        try:
+            return pool.submit(run_job, job_id)
+        except BrokenProcessPool:
+            self._replace_pool(pool)
+            return self._pool.submit(run_job, job_id)
+
+    def stop(self):
+        self._task.stop()
+        if self._pool:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def requeue_stale(self):
+        #"running" with no heartbeat lately: the process running it is gone (other workers' live jobs keep beating)
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=settings.MEDIA_JOB_STALE_SECONDS)
+        db = SessionLocal()
+        try:
+            stale = [job_id for (job_id,) in db.query(models.MediaJob.id).filter(
+                models.MediaJob.status == "running", models.MediaJob.updated_at < cutoff,
+            ).all()]
+            for job_id in stale:
+                if job_id not in self._running:
+                    _fail_or_retry(db, job_id, "interrupted")
+        finally:
+            db.close()
+
+    def dispatch(self):
+        pool = self._pool
+        for job_id, future in list(self._running.items()):
+            if not future.done():
+                continue
+            del self._running[job_id]
+            error = future.exception()
+            if error:
+                #the worker process itself died, run_job never got to record it
+                db = SessionLocal()
+                try:
+                    _fail_or_retry(db, job_id, str(error) or type(error).__name__)
+                finally:
+                    db.close()
+                if isinstance(error, BrokenProcessPool):
+                    self._replace_pool(pool)
+
+        self.requeue_stale()
+        free = self.concurrency - len(self._running)
+        if free <= 0:
+            return
+
+        db = SessionLocal()
+        try:
+            queued = db.query(models.MediaJob.id).filter(
+                models.MediaJob.status == "queued",
+                models.MediaJob.attempts < settings.MEDIA_JOB_MAX_ATTEMPTS,
+            ).order_by(models.MediaJob.created_at, models.MediaJob.id).limit(free).all()
+
+            running = aliased(models.MediaJob)
+            running_count = select(func.count(running.id)).where(running.status == "running").scalar_subquery()
+            for (job_id,) in queued:
+                #claim it, another API worker may be polling the same table; the count keeps the cap global
+                self._serialize_claims(db)
+                claimed = db.execute(
+                    update(models.MediaJob)
+                    .where(models.MediaJob.id == job_id, models.MediaJob.status == "queued", running_count < self.concurrency)
+                    .values(status="running", attempts=models.MediaJob.attempts + 1)
+                    .execution_options(synchronize_session=False)
+                ).rowcount
+                db.commit()
+                if not claimed:
+                    continue
+                try:
+                    self._running[job_id] = self._submit(job_id)
+                except Exception as e:
+                    _fail_or_retry(db, job_id, str(e) or type(e).__name__)
+        finally:
+            db.close()
+
+    @staticmethod
+    def _serialize_claims(db: Session):
+        """
+        The running count in the claim is only a global cap if claimers take
+        turns: under READ COMMITTED two of them would both count the old
+        number and both pass. On Postgres a transaction advisory lock makes
+        them queue, released by the claim's commit. SQLite already runs one
+        writer at a time.
+        """
+        if db.get_bind().dialect.name == "postgresql":
+            db.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": CLAIM_LOCK_KEY})
+
+
+media_job_queue = MediaJobQueue(settings.MEDIA_JOB_CONCURRENCY, settings.MEDIA_JOB_POLL_SECONDS)
+
+
+if __name__ == "__main__":
+    #dedicated worker box: run with MEDIA_JOBS_ENABLED=false on the API workers and
+    #  python -m services.media_job_service
+    media_job_queue.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        media_job_queue.stop()
@@ -0,0 +1,126 @@
+"""
+Password hashing off the request threads. argon2 runs in its own small
+process pool, so a burst of logins can use at most ARGON2_WORKERS cores and
+never the threadpool that serves every other sync endpoint. At most
+ARGON2_MAX_PENDING hashes may be running or waiting; past that callers get
+PasswordPoolBusy straight away (a 429) instead of queueing without bound.
+"""
+import asyncio
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from passlib.context import CryptContext
+
+from config import settings
+
+
+class PasswordPoolBusy(RuntimeError):
+    pass
+
+
+def build_context() -> CryptContext:
+    #argon2 for new hashes, bcrypt still verifies (and gets upgraded) for old users.
+    #Changing the argon2 costs makes existing hashes "need update", so they're rehashed on next login.
+    return CryptContext(
+        schemes=["argon2", "bcrypt"],
+        deprecated="auto",
+        argon2__time_cost=settings.ARGON2_TIME_COST,
+        argon2__memory_cost=settings.ARGON2_MEMORY_COST_KIB,
+        argon2__parallelism=settings.ARGON2_PARALLELISM,
+    )
+
+
+# -------------------- Worker side (runs in the pool) -------------------- #
+
+_context = None
+
+def _worker_context() -> CryptContext:
+    global _context
+    if _context is None:
+        _context = build_context()
+    return _context
+
+def _hash(password: str) -> str:
+    return _worker_context().hash(password)
+
+def _verify_and_update(password: str, password_hash: str) -> tuple[bool, str | None]:
+    try:
+        return _worker_context().verify_and_update(password, password_hash)
+    except (ValueError, TypeError):
+        #unknown or corrupt hash format
+        return False, None
+
+
+# -------------------- Request side -------------------- #
+
+class PasswordPool:
+    def __init__(self, workers: int, max_pending: int):
+        self.workers = max(1, workers)
+        self.max_pending = max(1, max_pending)
+        self.pending = 0
+        self.rejected = 0
+        self._pool = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                #spawn, not fork: the parent has live threads and db connections
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            return self._pool
+
+    def _discard(self, pool: ProcessPoolExecutor):
+        #a worker died (OOM killer, segfault) and took the executor with it; the next call builds a fresh one
+        with self._lock:
+            if self._pool is pool:
+                self._pool = None
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def _release(self, _future=None):
+        with self._lock:
+            self.pending -= 1
+
+    def _submit(self, pool: ProcessPoolExecutor, fn, *args):
+        with self._lock:
+            if self.pending >= self.max_pending:
+                self.rejected += 1
+                raise PasswordPoolBusy("too many password checks in flight")
+            self.pending += 1
+        try:
+            future = pool.submit(fn, *args)
+        except Exception:
+            self._release()
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args):
+        pool = self._executor()
+        try:
+            return await asyncio.wrap_future(self._submit(pool, fn, *args))
+        except BrokenProcessPool:
+            self._discard(pool)
+            print("Password pool broke, restarting it")
+        #once, on a new pool; a second break means something is really wrong and the caller sees it
+        return await asyncio.wrap_future(self._submit(self._executor(), fn, *args))
+
+    def shutdown(self):
+        with self._lock:
+            if self._pool:
+                self._pool.shutdown(wait=False, cancel_futures=True)
+                self._pool = None
+
+    def stats(self) -> dict:
+        return {"workers": self.workers, "max_pending": self.max_pending, "pending": self.pending, "rejected": self.rejected}
+
+
+password_pool = PasswordPool(settings.ARGON2_WORKERS, settings.ARGON2_MAX_PENDING)
+
+
+async def hash_password(password: str) -> str:
+    return await password_pool.run(_hash, password)
+
+async def verify_and_update(password: str, password_hash: str) -> tuple[bool, str | None]:
+    """(valid, new_hash) where new_hash is set when the stored hash should be replaced (bcrypt, old argon2 costs)."""
+    return await password_pool.run(_verify_and_update, password, password_hash)
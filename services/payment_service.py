@@ -1,16 +1,16 @@
 import requests, hmac, hashlib, json
+from sqlalchemy import update
 from sqlalchemy.orm import Session
-from decimal import Decimal
 from config import settings
 from scopes import user_scopes, wallet_scopes, transaction_scopes
 import models
 
 PAYSTACK_INIT_URL = "https://api.paystack.co/transaction/initialize"
 
-def initialize_paystack_payment(db: Session, email: str, amount_decimal: Decimal):
+def initialize_paystack_payment(db: Session, email: str, amount_kobo: int):
     payload = {
         "email": email,
-        "amount": int(amount_decimal * 100),
+        "amount": amount_kobo,  #Paystack counts in kobo too
         "callback_url": settings.PAYSTACK_CALLBACK_URL or "https://hello.pstk.xyz/callback",
         "metadata": {"cancel_action": "https://your-cancel-url.com"},
         "metadata": {"cancel_action": settings.PAYSTACK_CANCEL_URL or "https://your-cancel-url.com"} 
@@ -28,7 +28,7 @@ def initialize_paystack_payment(db: Session, email: str, amount_decimal: Decimal
         user = user_scopes.get_user_by_email(db, email)
         if user:
             wallet = wallet_scopes.get_wallet_by_user_id(db, user.id)
-            transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="fund", amount=amount_decimal, status="pending", reference=data["data"]["reference"])
+            transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="fund", amount_kobo=amount_kobo, status="pending", reference=data["data"]["reference"])
             db.commit()
     # return data
     if data.get("status") == True:
@@ -47,8 +47,7 @@ def handle_paystack_event(db: Session, payload: dict):
     if event != "charge.success":
         return {"skipped": True}
     ref = payload["data"]["reference"]
-    amount_kobo = payload["data"]["amount"]
-    amount = Decimal(amount_kobo) / Decimal(100)
+    amount_kobo = int(payload["data"]["amount"])
     tx = transaction_scopes.get_by_reference(db, ref)
     if not tx:
         #if we didn't previously create the pending tx, create one and mark success
@@ -59,22 +58,24 @@ def handle_paystack_event(db: Session, payload: dict):
         if not user:
             return {"error": "user not found"}
         wallet = wallet_scopes.get_wallet_by_user_id(db, user.id)
-        with db.begin():
-            transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="deposit", amount=amount, status="success", reference=ref)
-            # update balance
-            wallet_db = db.query(models.Wallet).filter(models.Wallet.id == wallet.id).with_for_update().one()
-            wallet_db.balance = wallet_db.balance + amount
-            db.add(wallet_db)
+        transaction_scopes.create_transaction(db, wallet_id=wallet.id, t_type="deposit", amount_kobo=amount_kobo, status="success", reference=ref)
+        # update balance, same commit as the tx record
+        wallet_scopes.credit(db, wallet.id, amount_kobo)
+        db.commit()
         return {"created": True}
     else:
         #idempotency if already success, do nothing
         if tx.status == "success":
             return {"ok": "already processed"}
-        #otherwise, mark success and update balance
-        with db.begin():
-            tx.status = "success"
-            db.add(tx)
-            wallet_db = db.query(models.Wallet).filter(models.Wallet.id == tx.wallet_id).with_for_update().one()
-            wallet_db.balance = wallet_db.balance + amount
-            db.add(wallet_db)
+        #otherwise, mark success and update balance. The flip is conditional, so a
+        #duplicate delivery racing this one finds nothing to flip and credits nothing
+        flipped = db.execute(
+            update(models.Transaction).where(models.Transaction.id == tx.id, models.Transaction.status != "success").values(status="success"),
+            execution_options={"synchronize_session": False},
+        ).rowcount
+        if not flipped:
+            db.rollback()
+            return {"ok": "already processed"}
+        wallet_scopes.credit(db, tx.wallet_id, amount_kobo)
+        db.commit()
         return {"ok": True}
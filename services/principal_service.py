@@ -0,0 +1,63 @@
+"""
+Who is calling, without a database round trip on every request. The JWT
+says which user; the handful of fields handlers actually read are cached
+per user id and dropped whenever that user's row changes.
+"""
+from dataclasses import dataclass
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from utils.ttl_cache import TTLCache
+
+
+@dataclass(frozen=True, slots=True)
+class Principal:
+    #deliberately no password_hash / private_key: handlers that need those load the row themselves
+    id: int
+    email: str
+    first_name: str
+    last_name: str
+    role: str | None
+    b_wallet_address: str | None
+
+
+_cache = TTLCache(settings.PRINCIPAL_CACHE_SECONDS, max_entries=settings.PRINCIPAL_CACHE_MAX_ENTRIES)
+
+
+def load_principal(db: Session, user_id: int) -> Principal | None:
+    row = db.query(
+        models.User.id, models.User.email, models.User.first_name, models.User.last_name,
+        models.User.role, models.User.b_wallet_address,
+    ).filter(models.User.id == user_id).first()
+    return Principal(*row) if row else None
+
+def get_principal(user_id: int) -> Principal | None:
+    principal = _cache.get(user_id)
+    if principal is not None:
+        return principal
+
+    db = SessionLocal()
+    try:
+        principal = load_principal(db, user_id)
+    finally:
+        db.close()
+    if principal is not None:
+        _cache.set(user_id, principal)
+    return principal
+
+def invalidate(user_id: int):
+    _cache.invalidate(user_id)
+
+def cache_stats() -> dict:
+    return _cache.stats()
+
+
+#any ORM update or delete of a user in this process drops the cached copy;
+#other workers catch up within PRINCIPAL_CACHE_SECONDS
+@event.listens_for(models.User, "after_update")
+@event.listens_for(models.User, "after_delete")
+def _user_changed(mapper, connection, target):
+    invalidate(target.id)
@@ -0,0 +1,173 @@
+"""
+Refresh-token sessions and the revocation list get_current_user checks.
+Access tokens are short JWTs that carry their session id (sid); refresh
+tokens live in the sessions table, stored as sha256 so a leaked table can't
+be replayed. Revoking a session stamps revoked_at. Every worker keeps the
+recently revoked session ids in a set and polls for new ones every
+SESSION_REVOCATION_POLL_SECONDS, so the check per request is a set lookup.
+A session only has to stay in the set for one access-token lifetime:
+after that no access token naming it can still verify, and refresh reads
+revoked_at from the row itself. revoked_at is stamped by the database
+clock, the same clock the poll compares against, so app hosts whose clocks
+disagree can't miss each other's revocations.
+"""
+import hashlib
+import secrets
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import update, func
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from utils.background import PeriodicTask
+
+#each poll re-reads this far behind the newest revocation seen, so one committed late with an earlier stamp isn't missed
+POLL_OVERLAP = timedelta(seconds=30)
+
+
+class SessionError(ValueError):
+    pass
+
+
+def hash_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc)
+
+def _utc(moment: datetime) -> datetime:
+    #sqlite hands back naive datetimes, everything is stored in UTC
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+def _refresh_expiry() -> datetime:
+    #expires_at is a naive UTC column, like the share codes
+    return (_now() + timedelta(days=settings.refresh_token_expire_days)).replace(tzinfo=None)
+
+
+def create_session(db: Session, user_id: int) -> tuple[int, str]:
+    """(session_id, refresh_token). Commits."""
+    refresh_token = secrets.token_urlsafe(32)
+    session = models.UserSession(user_id=user_id, token=hash_token(refresh_token), expires_at=_refresh_expiry())
+    db.add(session)
+    db.commit()
+    return session.id, refresh_token
+
+def rotate(db: Session, refresh_token: str) -> tuple[int, int, str]:
+    """
+    (user_id, session_id, new_refresh_token). A refresh token works once:
+    it is swapped for a new one and the session's expiry slides forward.
+    """
+    old_hash = hash_token(refresh_token)
+    session = db.query(models.UserSession).filter(models.UserSession.token == old_hash).first()
+    if session is None or session.revoked_at is not None or _utc(session.expires_at) <= _now():
+        raise SessionError("Invalid or expired refresh token")
+
+    new_token = secrets.token_urlsafe(32)
+    #conditional on the old hash, so two refreshes racing with the same token can't both win
+    result = db.execute(
+        update(models.UserSession)
+        .where(models.UserSession.id == session.id, models.UserSession.token == old_hash, models.UserSession.revoked_at.is_(None))
+        .values(token=hash_token(new_token), expires_at=_refresh_expiry())
+    )
+    db.commit()
+    if result.rowcount != 1:
+        raise SessionError("Invalid or expired refresh token")
+    return session.user_id, session.id, new_token
+
+def revoke(db: Session, session_id: int, user_id: int) -> bool:
+    """Revoke one of the user's sessions. False if it was already revoked or isn't theirs."""
+    result = db.execute(
+        update(models.UserSession)
+        .where(models.UserSession.id == session_id, models.UserSession.user_id == user_id, models.UserSession.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+    )
+    db.commit()
+    if result.rowcount != 1:
+        return False
+    #this worker stops accepting it now, the others on their next poll
+    at = db.query(models.UserSession.revoked_at).filter(models.UserSession.id == session_id).scalar()
+    revocations.add(session_id, _utc(at))
+    return True
+
+def revoke_all(db: Session, user_id: int) -> int:
+    session_ids = [row[0] for row in db.query(models.UserSession.id).filter(
+        models.UserSession.user_id == user_id, models.UserSession.revoked_at.is_(None)
+    ).all()]
+    if not session_ids:
+        return 0
+    db.execute(
+        update(models.UserSession)
+        .where(models.UserSession.id.in_(session_ids), models.UserSession.revoked_at.is_(None))
+        .values(revoked_at=func.now())
+    )
+    db.commit()
+    for session_id, at in db.query(models.UserSession.id, models.UserSession.revoked_at).filter(models.UserSession.id.in_(session_ids)).all():
+        revocations.add(session_id, _utc(at))
+    return len(session_ids)
+
+
+class RevocationList:
+    def __init__(self, interval: float):
+        self._revoked = {}  #session id -> revoked_at
+        self._watermark = None  #newest revoked_at seen so far
+        self._loaded = False
+        self.polls = 0
+        self._lock = threading.Lock()
+        self._task = PeriodicTask("session-revocations", interval, self.refresh)
+
+    def start(self):
+        self._task.start()
+
+    def stop(self):
+        self._task.stop()
+
+    def _retention(self) -> timedelta:
+        return timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+
+    def refresh(self):
+        db = SessionLocal()
+        try:
+            #"now" by the database clock, the one that stamped revoked_at
+            now = _utc(db.query(func.now()).scalar())
+            with self._lock:
+                since = self._watermark - POLL_OVERLAP if self._watermark else now - self._retention()
+            rows = db.query(models.UserSession.id, models.UserSession.revoked_at).filter(
+                models.UserSession.revoked_at >= since
+            ).all()
+        finally:
+            db.close()
+
+        cutoff = now - self._retention()
+        with self._lock:
+            for session_id, revoked_at in rows:
+                revoked_at = _utc(revoked_at)
+                self._revoked[session_id] = revoked_at
+                if self._watermark is None or revoked_at > self._watermark:
+                    self._watermark = revoked_at
+            for session_id in [sid for sid, at in self._revoked.items() if at < cutoff]:
+                del self._revoked[session_id]
+            self._loaded = True
+            self.polls += 1
+
+    def add(self, session_id: int, revoked_at: datetime):
+        with self._lock:
+            self._revoked[session_id] = revoked_at
+
+    def is_revoked(self, session_id: int) -> bool:
+        if not self._loaded:
+            #first request beat the background poll (or it isn't running, e.g. a bench script)
+            self.refresh()
+        return session_id in self._revoked
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "revoked": len(self._revoked),
+                "watermark": self._watermark.isoformat() if self._watermark else None,
+                "polls": self.polls,
+            }
+
+
+revocations = RevocationList(settings.SESSION_REVOCATION_POLL_SECONDS)
@@ -0,0 +1,133 @@
+import os
+import json
+import math
+from sqlalchemy.orm import Session
+
+import models
+from utils import media, mp4_index
+from utils.media import ffmpeg_bin, run_ffmpeg
+
+COVER_WIDTHS = (1280, 640, 320)
+
+#scrub preview: one tile every `interval` seconds, 10x10 tiles per sprite sheet
+SPRITE_TILE_WIDTH = 160
+SPRITE_COLUMNS = 10
+SPRITE_ROWS = 10
+SPRITE_MIN_INTERVAL = 2.0
+SPRITE_MAX_TILES = 600
+
+
+def sprite_interval(duration: float) -> float:
+    #long movies get sparser tiles so the track stays a handful of sheets
+    return max(SPRITE_MIN_INTERVAL, math.ceil(duration / SPRITE_MAX_TILES))
+
+def _tile_height(info: dict) -> int:
+    if info.get("width") and info.get("height"):
+        return int(round(SPRITE_TILE_WIDTH * info["height"] / info["width"] / 2)) * 2
+    return 90
+
+
+def build_thumbnail_command(input_path: str, output_dir: str, info: dict, cover_time: float | None = None) -> list[str]:
+    """
+    One ffmpeg pass that only decodes keyframes (-skip_frame nokey) and feeds them to:
+      - the first keyframe at/after cover_time (default: the middle of the movie) -> cover in every COVER_WIDTHS size
+      - one tile every sprite_interval seconds -> sprite_%03d.jpg sheets
+    """
+    duration = info.get("duration") or 0
+    middle = duration / 2 if cover_time is None else cover_time
+    interval = sprite_interval(duration)
+    tile_height = _tile_height(info)
+
+    cover_labels = [f"c{i}" for i in range(len(COVER_WIDTHS))]
+    graph = [
+        "[0:v]split=2[cover][sprite]",
+        #isnan(prev_selected_t) lets exactly one frame through
+        f"[cover]select='gte(t\\,{middle:.3f})*isnan(prev_selected_t)',split={len(COVER_WIDTHS)}" + "".join(f"[{l}]" for l in cover_labels),
+        *[f"[{label}]scale={width}:-2[o{label}]" for label, width in zip(cover_labels, COVER_WIDTHS)],
+        f"[sprite]fps=1/{interval},scale={SPRITE_TILE_WIDTH}:{tile_height},tile={SPRITE_COLUMNS}x{SPRITE_ROWS}[sheets]",
+    ]
+
+    command = [
+        ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+        "-skip_frame", "nokey", "-i", input_path,
+        "-filter_complex", ";".join(graph),
+    ]
+    for label, width in zip(cover_labels, COVER_WIDTHS):
+        command += ["-map", f"[o{label}]", "-frames:v", "1", "-q:v", "3", os.path.join(output_dir, f"cover_{width}.jpg")]
+    command += ["-map", "[sheets]", "-q:v", "5", os.path.join(output_dir, "sprite_%03d.jpg")]
+    return command
+
+
+def _vtt_time(seconds: float) -> str:
+    hours, rest = divmod(seconds, 3600)
+    minutes, secs = divmod(rest, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{secs:06.3f}"
+
+def write_sprite_vtt(path: str, duration: float, info: dict):
+    """WebVTT thumbnail track, each cue points at its tile with a #xywh media fragment."""
+    interval = sprite_interval(duration)
+    tile_height = _tile_height(info)
+    per_sheet = SPRITE_COLUMNS * SPRITE_ROWS
+    tiles = max(1, math.ceil(duration / interval))
+
+    lines = ["WEBVTT", ""]
+    for i in range(tiles):
+        start, end = i * interval, min((i + 1) * interval, duration)
+        sheet, slot = divmod(i, per_sheet)
+        row, col = divmod(slot, SPRITE_COLUMNS)
+        lines.append(f"{_vtt_time(start)} --> {_vtt_time(end)}")
+        lines.append(f"sprite_{sheet + 1:03d}.jpg#xywh={col * SPRITE_TILE_WIDTH},{row * tile_height},{SPRITE_TILE_WIDTH},{tile_height}")
+        lines.append("")
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+
+
+def generate_thumbnails(input_path: str, output_dir: str, on_progress=None, info: dict | None = None) -> dict:
+    info = info or media.probe(input_path)
+    os.makedirs(output_dir, exist_ok=True)
+
+    #building the index here also leaves the .kfidx on disk before anyone streams the title
+    index = mp4_index.try_load(input_path)
+    cover_time = None
+    if index is not None and len(index):
+        if not info.get("duration"):
+            info["duration"] = index.duration
+        #a keyframe we know exists, so the cover select can't come up empty
+        middle = (info.get("duration") or 0) / 2
+        cover_time = index.keyframe_after(middle)
+        if cover_time is None:
+            cover_time = index.keyframe_before(middle)[0]
+
+    command = build_thumbnail_command(input_path, output_dir, info, cover_time)
+    run_ffmpeg(command, os.path.join(output_dir, "ffmpeg.log"), info.get("duration"), on_progress)
+
+    covers = {width: os.path.join(output_dir, f"cover_{width}.jpg") for width in COVER_WIDTHS}
+    if not all(os.path.exists(p) for p in covers.values()):
+        #no keyframe after the middle (or no duration): fall back to the very first frame
+        command = [ffmpeg_bin(), "-y", "-loglevel", "error", "-i", input_path,
+                   "-filter_complex", f"split={len(COVER_WIDTHS)}" + "".join(f"[s{i}]" for i in range(len(COVER_WIDTHS))) + ";"
+                   + ";".join(f"[s{i}]scale={w}:-2[o{i}]" for i, w in enumerate(COVER_WIDTHS))]
+        for i, width in enumerate(COVER_WIDTHS):
+            command += ["-map", f"[o{i}]", "-frames:v", "1", "-q:v", "3", covers[width]]
+        run_ffmpeg(command, os.path.join(output_dir, "ffmpeg_cover.log"))
+
+    result = {"covers": {str(w): p for w, p in covers.items()}, "sprite_vtt": None}
+    if info.get("duration"):
+        vtt_path = os.path.join(output_dir, "sprite.vtt")
+        write_sprite_vtt(vtt_path, info["duration"], info)
+        result["sprite_vtt"] = vtt_path
+    return result
+
+
+def run_thumbnail_job(db: Session, job: models.MediaJob, on_progress) -> str:
+    """media_jobs handler: covers + scrub sprites, then point the movie at them."""
+    artwork = generate_thumbnails(job.input_path, job.output_dir, on_progress)
+
+    movie = db.get(models.Movie, job.movie_id)
+    if movie:
+        movie.cover = artwork["covers"][str(COVER_WIDTHS[0])]
+        movie.thumbnails = json.dumps(artwork)
+    return artwork["covers"][str(COVER_WIDTHS[0])]
+
+def movie_thumbnails(movie: models.Movie) -> dict:
+    return json.loads(movie.thumbnails) if movie.thumbnails else {}
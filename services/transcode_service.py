@@ -0,0 +1,313 @@
+import os
+import json
+import math
+import shutil
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from utils import media
+from utils.media import ffmpeg_bin, run_ffmpeg
+from utils.cpu_scheduler import CpuScheduler, available_cores
+
+HLS_TIME = 6
+#every rendition cuts keyframes at the same timestamps so players can switch between them
+FORCE_KEYFRAMES = f"expr:gte(t,n_forced*{HLS_TIME})"
+
+ENCODE_MODES = ("single", "rendition", "segment")
+
+#the most we will ever encode, top to bottom. `height` is the short side,
+#so portrait uploads get the same treatment as landscape ones
+DEFAULT_LADDER = [
+    {"name": "1080p", "height": 1080, "video_kbps": 5000, "audio_kbps": 128},
+    {"name": "720p", "height": 720, "video_kbps": 2800, "audio_kbps": 128},
+    {"name": "480p", "height": 480, "video_kbps": 1200, "audio_kbps": 96},
+]
+
+#a 1072p or 1088p source still counts as 1080p
+HEIGHT_TOLERANCE = 16
+
+
+def build_ladder(info: dict, ladder: list[dict] = DEFAULT_LADDER) -> list[dict]:
+    """
+    Pick the renditions worth encoding for this source: nothing taller
+    than the source, and no rung asking for more bits than the source has.
+    Sources below the lowest rung get a single rung at their own size.
+    """
+    width, height = info.get("width"), info.get("height")
+    short_side = min(width, height) if width and height else None
+    source_kbps = (info.get("video_bitrate") or info.get("bitrate") or 0) // 1000 or None
+
+    if short_side:
+        rungs = [dict(r) for r in ladder if r["height"] <= short_side + HEIGHT_TOLERANCE]
+        if not rungs:
+            lowest = ladder[-1]
+            even_side = short_side - short_side % 2
+            rungs = [{**lowest, "name": f"{even_side}p", "height": even_side}]
+    else:
+        #couldn't read the size, encode the whole ladder as before
+        rungs = [dict(r) for r in ladder]
+
+    for rung in rungs:
+        if source_kbps:
+            rung["video_kbps"] = min(rung["video_kbps"], source_kbps)
+        rung["fps"] = info.get("fps")
+    return rungs
+
+
+def _output_size(info: dict, rung: dict) -> tuple[int | None, int | None]:
+    width, height = info.get("width"), info.get("height")
+    if not width or not height:
+        return None, None
+    if height > width:
+        return rung["height"], int(round(height * rung["height"] / width / 2)) * 2
+    return int(round(width * rung["height"] / height / 2)) * 2, rung["height"]
+
+
+def _scale_filter(info: dict, rung: dict) -> str:
+    #keep the aspect ratio, only pin the short side
+    if info.get("width") and info.get("height") and info["height"] > info["width"]:
+        return f"scale={rung['height']}:-2"
+    return f"scale=-2:{rung['height']}"
+
+
+def build_hls_command(input_path: str, output_dir: str, file_id: str, ladder: list[dict], info: dict) -> list[str]:
+    has_audio = info.get("has_audio", True)
+    command = [
+        ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error",
+        "-progress", "pipe:1",
+        "-i", input_path,
+    ]
+    stream_map = []
+    for i, rung in enumerate(ladder):
+        command += ["-map", "0:v:0"]
+        if has_audio:
+            command += ["-map", "0:a:0"]
+        command += [
+            f"-c:v:{i}", "libx265", f"-b:v:{i}", f"{rung['video_kbps']}k",
+            f"-filter:v:{i}", _scale_filter(info, rung),
+            f"-force_key_frames:v:{i}", FORCE_KEYFRAMES,
+        ]
+        if has_audio:
+            command += [f"-c:a:{i}", "aac", f"-b:a:{i}", f"{rung['audio_kbps']}k"]
+            stream_map.append(f"v:{i},a:{i},name:{rung['name']}")
+        else:
+            stream_map.append(f"v:{i},name:{rung['name']}")
+
+    command += [
+        # HLS options
+        "-f", "hls",
+        "-hls_time", str(HLS_TIME),
+        "-hls_playlist_type", "vod",
+        "-var_stream_map", " ".join(stream_map),
+        "-master_pl_name", f"{file_id}_master.m3u8",
+        os.path.join(output_dir, f"{file_id}_%v.m3u8")
+    ]
+    return command
+
+
+def compress_video_multires(input_path: str, output_dir: str, file_id: str, on_progress=None, ladder: list[dict] | None = None, info: dict | None = None, mode: str | None = None, cores: int | None = None):
+    """
+    Generate HLS video with one rendition per ladder rung (1080p, 720p, 480p
+    unless a per-title ladder is passed in).
+    on_progress, if given, is called with a 0..1 fraction as ffmpeg works.
+
+    mode:
+      single    -> one ffmpeg process encodes every rendition
+      rendition -> one ffmpeg process per rendition, run side by side
+      segment   -> every rendition is cut into time chunks encoded in parallel, then concatenated
+    The parallel modes share `cores` (default: this worker's share of the box) between their processes.
+    """
+    info = info or media.probe(input_path)
+    ladder = ladder or build_ladder(info)
+    mode = mode or settings.TRANSCODE_MODE
+    if mode not in ENCODE_MODES:
+        raise ValueError(f"Unknown transcode mode: {mode}")
+    master_playlist = os.path.join(output_dir, f"{file_id}_master.m3u8")
+
+    if mode == "segment" and not info.get("duration"):
+        #can't cut the timeline without knowing how long it is
+        mode = "rendition"
+
+    if mode == "single":
+        command = build_hls_command(input_path, output_dir, file_id, ladder, info)
+        run_ffmpeg(command, os.path.join(output_dir, f"{file_id}_ffmpeg.log"), info.get("duration"), on_progress)
+        return master_playlist
+
+    scheduler = CpuScheduler(cores or worker_cores())
+    if mode == "rendition":
+        _encode_per_rendition(scheduler, input_path, output_dir, file_id, ladder, info, on_progress)
+    else:
+        _encode_per_segment(scheduler, input_path, output_dir, file_id, ladder, info, on_progress)
+    write_master_playlist(master_playlist, file_id, ladder, info)
+    return master_playlist
+
+
+def worker_cores() -> int:
+    #every media job worker process gets an equal slice, so concurrent jobs never oversubscribe the box
+    total = settings.TRANSCODE_CPU_CORES or available_cores()
+    return max(1, total // max(1, settings.MEDIA_JOB_CONCURRENCY))
+
+
+def _video_args(info: dict, rung: dict, threads: int) -> list[str]:
+    return [
+        "-c:v", "libx265", "-b:v", f"{rung['video_kbps']}k",
+        "-x265-params", f"pools={threads}",
+        "-vf", _scale_filter(info, rung),
+        "-force_key_frames", FORCE_KEYFRAMES,
+    ]
+
+def _hls_args(output_dir: str, file_id: str, rung: dict) -> list[str]:
+    return [
+        "-f", "hls",
+        "-hls_time", str(HLS_TIME),
+        "-hls_playlist_type", "vod",
+        "-hls_segment_filename", os.path.join(output_dir, f"{file_id}_{rung['name']}%d.ts"),
+        os.path.join(output_dir, f"{file_id}_{rung['name']}.m3u8"),
+    ]
+
+
+class _ProgressBoard:
+    """Weighted progress of many concurrent ffmpeg processes, reported from one thread."""
+    def __init__(self, weights: list[float], on_progress):
+        self.weights = weights
+        self.fractions = [0.0] * len(weights)
+        self.on_progress = on_progress
+
+    def reporter(self, index: int):
+        def report(fraction: float):
+            self.fractions[index] = fraction
+        return report
+
+    def tick(self):
+        if self.on_progress:
+            total = sum(self.weights) or 1
+            self.on_progress(min(sum(w * f for w, f in zip(self.weights, self.fractions)) / total, 0.99))
+
+
+def _encode_per_rendition(scheduler: CpuScheduler, input_path, output_dir, file_id, ladder, info, on_progress):
+    has_audio = info.get("has_audio", True)
+    weights = [rung["height"] ** 2 for rung in ladder]
+    board = _ProgressBoard(weights, on_progress)
+
+    tasks = []
+    for i, (rung, threads) in enumerate(zip(ladder, scheduler.split(weights))):
+        def encode(granted, rung=rung, i=i):
+            command = [
+                ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+                "-threads", str(granted), "-i", input_path,
+                "-map", "0:v:0", *(["-map", "0:a:0"] if has_audio else []),
+                *_video_args(info, rung, granted),
+                *(["-c:a", "aac", "-b:a", f"{rung['audio_kbps']}k"] if has_audio else []),
+                "-threads", str(granted),
+                *_hls_args(output_dir, file_id, rung),
+            ]
+            run_ffmpeg(command, os.path.join(output_dir, f"{file_id}_{rung['name']}_ffmpeg.log"), info.get("duration"), board.reporter(i))
+        tasks.append((threads, encode))
+
+    scheduler.run(tasks, on_tick=board.tick)
+
+
+def _encode_per_segment(scheduler: CpuScheduler, input_path, output_dir, file_id, ladder, info, on_progress):
+    has_audio = info.get("has_audio", True)
+    duration = info["duration"]
+    #chunks are a whole number of HLS segments so every chunk starts on a segment boundary
+    chunk_seconds = max(HLS_TIME, settings.TRANSCODE_SEGMENT_SECONDS // HLS_TIME * HLS_TIME)
+    chunk_count = math.ceil(duration / chunk_seconds)
+    work_dir = os.path.join(output_dir, f"{file_id}_chunks")
+    os.makedirs(work_dir, exist_ok=True)
+
+    chunk_threads = max(1, min(4, scheduler.cores // len(ladder)))
+    tasks, weights = [], []
+
+    for rung in ladder:
+        for k in range(chunk_count):
+            start = k * chunk_seconds
+            length = min(chunk_seconds, duration - start)
+            index = len(tasks)
+            def encode(granted, rung=rung, k=k, start=start, length=length, index=index):
+                command = [
+                    ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+                    "-threads", str(granted), "-ss", f"{start:.3f}", "-t", f"{length:.3f}", "-i", input_path,
+                    "-map", "0:v:0", "-an",
+                    *_video_args(info, rung, granted),
+                    "-threads", str(granted),
+                    os.path.join(work_dir, f"{rung['name']}_{k:05d}.mp4"),
+                ]
+                run_ffmpeg(command, os.path.join(work_dir, f"{rung['name']}_{k:05d}.log"), length, board.reporter(index))
+            tasks.append((chunk_threads, encode))
+            weights.append(rung["height"] ** 2 * length)
+
+    #audio is cheap, encode it once per bitrate in one go so chunk boundaries don't click
+    audio_bitrates = sorted({rung["audio_kbps"] for rung in ladder}) if has_audio else []
+    for kbps in audio_bitrates:
+        index = len(tasks)
+        def encode_audio(granted, kbps=kbps, index=index):
+            command = [
+                ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+                "-i", input_path, "-map", "0:a:0", "-vn",
+                "-c:a", "aac", "-b:a", f"{kbps}k",
+                os.path.join(work_dir, f"audio_{kbps}k.m4a"),
+            ]
+            run_ffmpeg(command, os.path.join(work_dir, f"audio_{kbps}k.log"), duration, board.reporter(index))
+        tasks.append((1, encode_audio))
+        weights.append(1.0)
+
+    board = _ProgressBoard(weights, on_progress)
+    scheduler.run(tasks, on_tick=board.tick)
+
+    #stitch: concat the chunks without re-encoding and package straight into HLS
+    for rung in ladder:
+        list_path = os.path.join(work_dir, f"{rung['name']}.txt")
+        with open(list_path, "w") as f:
+            for k in range(chunk_count):
+                f.write(f"file '{rung['name']}_{k:05d}.mp4'\n")
+        command = [
+            ffmpeg_bin(), "-y", "-nostats", "-loglevel", "error", "-progress", "pipe:1",
+            "-f", "concat", "-safe", "0", "-i", list_path,
+            *(["-i", os.path.join(work_dir, f"audio_{rung['audio_kbps']}k.m4a")] if has_audio else []),
+            "-map", "0:v:0", *(["-map", "1:a:0"] if has_audio else []),
+            "-c", "copy",
+            *_hls_args(output_dir, file_id, rung),
+        ]
+        run_ffmpeg(command, os.path.join(output_dir, f"{file_id}_{rung['name']}_ffmpeg.log"))
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def write_master_playlist(path: str, file_id: str, ladder: list[dict], info: dict):
+    has_audio = info.get("has_audio", True)
+    lines = ["#EXTM3U", "#EXT-X-VERSION:3"]
+    for rung in ladder:
+        bandwidth = (rung["video_kbps"] + (rung["audio_kbps"] if has_audio else 0)) * 1000
+        width, height = _output_size(info, rung)
+        resolution = f",RESOLUTION={width}x{height}" if width else ""
+        lines.append(f"#EXT-X-STREAM-INF:BANDWIDTH={bandwidth}{resolution}")
+        lines.append(f"{file_id}_{rung['name']}.m3u8")
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def rendition_playlist(master_playlist: str, name: str) -> str:
+    #{file_id}_master.m3u8 -> {file_id}_{name}.m3u8, next to each other
+    return master_playlist.replace("_master.m3u8", f"_{name}.m3u8")
+
+def movie_renditions(movie: models.Movie) -> list[dict]:
+    return json.loads(movie.renditions) if movie.renditions else []
+
+
+def run_transcode_job(db: Session, job: models.MediaJob, on_progress) -> str:
+    """media_jobs handler: probe, build the per-title ladder, encode, point the movie at it."""
+    file_id = os.path.splitext(os.path.basename(job.input_path))[0]
+    os.makedirs(job.output_dir, exist_ok=True)
+
+    info = media.probe(job.input_path)
+    ladder = build_ladder(info)
+    master_playlist = compress_video_multires(job.input_path, job.output_dir, file_id, on_progress, ladder=ladder, info=info)
+
+    movie = db.get(models.Movie, job.movie_id)
+    if movie:
+        movie.url = master_playlist
+        #only recorded once the renditions really exist on disk
+        movie.renditions = json.dumps(ladder)
+    return master_playlist
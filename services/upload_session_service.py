@@ -0,0 +1,196 @@
+import os, json, time, uuid, fcntl, shutil, hashlib
+from utils.hash_file import CHUNK_SIZE
+
+#every session lives in its own folder:
+#  meta.json      -> who/what/how big, written once at creation
+#  data.part      -> preallocated to the final size, chunks are pwrite()n at index * chunk_size
+#  chunks.bitmap  -> one bit per chunk, set only after that chunk's bytes are fsync'd
+#  finalizing     -> exists while one finalize call owns the session (O_EXCL, so only one can)
+#Chunk writes hold a shared flock on chunks.bitmap and claim() an exclusive one, so a
+#finalize never starts under a write in flight and no chunk lands once it has started.
+SESSION_DIR = os.path.join("uploads", "sessions")
+DEFAULT_CHUNK_SIZE = 8 * 1024 * 1024
+MAX_CHUNK_SIZE = 64 * 1024 * 1024
+SESSION_TTL_SECONDS = 48 * 60 * 60
+
+os.makedirs(SESSION_DIR, exist_ok=True)
+
+
+class UploadSessionError(ValueError):
+    pass
+
+class UploadSessionBusy(UploadSessionError):
+    """The session is being finalized, it takes no more chunks."""
+
+
+def _session_path(session_id: str, name: str = "") -> str:
+    #session ids are uuids we hand out, never trust the path segment blindly
+    uuid.UUID(session_id)
+    return os.path.join(SESSION_DIR, session_id, name)
+
+def load_session(session_id: str) -> dict:
+    try:
+        with open(_session_path(session_id, "meta.json")) as f:
+            return json.load(f)
+    except (ValueError, FileNotFoundError):
+        raise UploadSessionError("Upload session not found")
+
+def purge_expired_sessions(now: float | None = None):
+    now = now or time.time()
+    for session_id in os.listdir(SESSION_DIR):
+        try:
+            meta = load_session(session_id)
+        except UploadSessionError:
+            continue
+        if now - meta["created_at"] > SESSION_TTL_SECONDS:
+            delete_session(session_id)
+
+def create_session(user_id: int, title: str, description: str, genre: str, filename: str, total_size: int, chunk_size: int = DEFAULT_CHUNK_SIZE) -> dict:
+    if total_size <= 0:
+        raise UploadSessionError("total_size must be positive")
+    if chunk_size <= 0 or chunk_size > MAX_CHUNK_SIZE:
+        raise UploadSessionError(f"chunk_size must be between 1 and {MAX_CHUNK_SIZE}")
+
+    purge_expired_sessions()
+
+    session_id = str(uuid.uuid4())
+    chunk_count = (total_size + chunk_size - 1) // chunk_size
+    meta = {
+        "session_id": session_id,
+        "user_id": user_id,
+        "title": title,
+        "description": description,
+        "genre": genre,
+        "file_ext": os.path.splitext(filename)[1],
+        "total_size": total_size,
+        "chunk_size": chunk_size,
+        "chunk_count": chunk_count,
+        "created_at": time.time(),
+    }
+
+    os.makedirs(_session_path(session_id))
+    with open(_session_path(session_id, "data.part"), "wb") as f:
+        f.truncate(total_size)
+    with open(_session_path(session_id, "chunks.bitmap"), "wb") as f:
+        f.write(bytes((chunk_count + 7) // 8))
+    #meta.json goes last, a folder without it is an aborted create
+    tmp = _session_path(session_id, "meta.json.tmp")
+    with open(tmp, "w") as f:
+        json.dump(meta, f)
+    os.replace(tmp, _session_path(session_id, "meta.json"))
+    return meta
+
+def expected_chunk_length(meta: dict, index: int) -> int:
+    if index < 0 or index >= meta["chunk_count"]:
+        raise UploadSessionError(f"Chunk index must be between 0 and {meta['chunk_count'] - 1}")
+    start = index * meta["chunk_size"]
+    return min(meta["chunk_size"], meta["total_size"] - start)
+
+def write_chunk(meta: dict, index: int, data: bytes):
+    expected = expected_chunk_length(meta, index)
+    if len(data) != expected:
+        raise UploadSessionError(f"Chunk {index} must be exactly {expected} bytes, got {len(data)}")
+
+    session_id = meta["session_id"]
+    try:
+        bitmap = open(_session_path(session_id, "chunks.bitmap"), "r+b")
+    except FileNotFoundError:
+        raise UploadSessionError("Upload session not found")
+    with bitmap as f:
+        #shared: chunks still go in parallel, but claim() waits for them and they see its marker
+        fcntl.flock(f, fcntl.LOCK_SH)
+        try:
+            if os.path.exists(_session_path(session_id, "finalizing")):
+                raise UploadSessionBusy("Upload is being finalized")
+            fd = os.open(_session_path(session_id, "data.part"), os.O_WRONLY)
+            try:
+                os.pwrite(fd, data, index * meta["chunk_size"])
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+            #chunks can arrive in parallel (and on different workers), so flip the bit exclusively
+            fcntl.flock(f, fcntl.LOCK_EX)
+            f.seek(index // 8)
+            byte = f.read(1)[0]
+            f.seek(index // 8)
+            f.write(bytes([byte | (1 << (index % 8))]))
+            f.flush()
+            os.fsync(f.fileno())
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+def received_chunks(meta: dict) -> list[int]:
+    with open(_session_path(meta["session_id"], "chunks.bitmap"), "rb") as f:
+        bitmap = f.read()
+    return [i for i in range(meta["chunk_count"]) if bitmap[i // 8] & (1 << (i % 8))]
+
+def session_status(meta: dict) -> dict:
+    received = received_chunks(meta)
+    received_set = set(received)
+    return {
+        "session_id": meta["session_id"],
+        "total_size": meta["total_size"],
+        "chunk_size": meta["chunk_size"],
+        "chunk_count": meta["chunk_count"],
+        "received": received,
+        "missing": [i for i in range(meta["chunk_count"]) if i not in received_set],
+        "complete": len(received) == meta["chunk_count"],
+    }
+
+def assemble(meta: dict, dest_path: str) -> str:
+    """
+    Hash the completed data file in order and move it to dest_path.
+    Returns the sha256 hex digest.
+    """
+    if len(received_chunks(meta)) != meta["chunk_count"]:
+        raise UploadSessionError("Upload is not complete yet")
+
+    data_path = _session_path(meta["session_id"], "data.part")
+    sha256 = hashlib.sha256()
+    with open(data_path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                break
+            sha256.update(chunk)
+    try:
+        os.replace(data_path, dest_path)
+    except FileNotFoundError:
+        raise UploadSessionError("Upload session not found")
+    return sha256.hexdigest()
+
+def claim(session_id: str):
+    """Take the session for finalizing. Exactly one caller wins, the rest get UploadSessionError."""
+    try:
+        bitmap = open(_session_path(session_id, "chunks.bitmap"), "rb")
+    except FileNotFoundError:
+        raise UploadSessionError("Upload session not found")
+    with bitmap as f:
+        #waits out chunk writes in flight; the ones after it see the marker
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            fd = os.open(_session_path(session_id, "finalizing"), os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            raise UploadSessionError("Upload is already being finalized")
+        except FileNotFoundError:
+            raise UploadSessionError("Upload session not found")
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+    os.close(fd)
+
+def release(meta: dict, assembled_path: str | None = None):
+    """
+    Undo claim() after a failed finalize. If the file was already moved out,
+    it goes back into the session so the client can simply call finalize again.
+    """
+    session_id = meta["session_id"]
+    if assembled_path and os.path.exists(assembled_path):
+        os.replace(assembled_path, _session_path(session_id, "data.part"))
+    try:
+        os.remove(_session_path(session_id, "finalizing"))
+    except FileNotFoundError:
+        pass
+
+def delete_session(session_id: str):
+    shutil.rmtree(_session_path(session_id), ignore_errors=True)
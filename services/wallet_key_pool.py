@@ -0,0 +1,149 @@
+"""
+Blockchain keypairs generated ahead of time so signup doesn't pay for
+Account.create. A background task keeps WALLET_POOL_TARGET unclaimed keys
+in wallet_keys, private keys Fernet-encrypted with WALLET_POOL_ENCRYPTION_KEY
+(its own key: leaking SECRET_KEY shouldn't also unlock the pool). Signup
+takes one by deleting its row inside its own transaction, so a claimed key
+lives on only in the user's record, and falls back to generating inline if
+the pool ran dry or its key can't be decrypted. Every worker runs the
+refill loop, but only the holder of the leader lock tops the pool up, so
+workers don't all see the same shortfall and overshoot the target together.
+"""
+import time
+import random
+import threading
+from datetime import datetime, timezone
+from cryptography.fernet import Fernet, InvalidToken
+from sqlalchemy import delete, func
+from sqlalchemy.orm import Session
+
+import models
+from config import settings
+from db.session import SessionLocal
+from utils.background import PeriodicTask
+from utils.create_b_wallet import create_b_wallet
+from utils.leader_lock import LeaderLock
+
+#how many times claim() retries when another signup takes the same row first
+CLAIM_ATTEMPTS = 5
+#without SKIP LOCKED, signups pick at random among this many of the oldest keys instead of all racing for the first
+CLAIM_SPREAD = 32
+
+_fernet = Fernet(settings.WALLET_POOL_ENCRYPTION_KEY) if settings.WALLET_POOL_ENCRYPTION_KEY else None
+
+
+def encrypt_key(private_key: str) -> str:
+    return _fernet.encrypt(private_key.encode()).decode()
+
+def decrypt_key(encrypted_key: str) -> str:
+    return _fernet.decrypt(encrypted_key.encode()).decode()
+
+
+def pool_depth(db: Session) -> int:
+    return db.query(func.count(models.WalletKey.id)).filter(models.WalletKey.claimed_by.is_(None)).scalar()
+
+def _candidate(db: Session):
+    query = db.query(models.WalletKey.id, models.WalletKey.address, models.WalletKey.encrypted_key).filter(
+        models.WalletKey.claimed_by.is_(None)
+    ).order_by(models.WalletKey.id)
+    if db.get_bind().dialect.name in ("postgresql", "mysql"):
+        #rows another signup has locked are skipped rather than waited on or fought over
+        return query.with_for_update(skip_locked=True).first()
+    rows = query.limit(CLAIM_SPREAD).all()
+    return random.choice(rows) if rows else None
+
+def generate_keys(db: Session, count: int) -> int:
+    for _ in range(count):
+        address, private_key = create_b_wallet()
+        db.add(models.WalletKey(address=address, encrypted_key=encrypt_key(private_key)))
+    db.commit()
+    return count
+
+
+class WalletKeyPool:
+    def __init__(self, target: int, batch: int, interval: float):
+        self.target = target
+        self.batch = max(1, batch)
+        self.claimed = 0
+        self.fallbacks = 0  #signups that found the pool empty and generated inline
+        self.generated = 0
+        self.last_refill = None  #{"keys", "seconds", "keys_per_second", "at"}
+        self._lock = threading.Lock()
+        self._leader = LeaderLock("wallet-key-pool")
+        self._task = PeriodicTask("wallet-key-pool", interval, self.refill)
+
+    def start(self):
+        if _fernet is None:
+            print("WALLET_POOL_ENCRYPTION_KEY is not set, signups will generate their keys inline")
+            return
+        self._task.start()
+
+    def stop(self):
+        self._task.stop()
+        self._leader.release()
+
+    def refill(self):
+        if not self._leader.try_acquire():
+            return
+        db = SessionLocal()
+        try:
+            missing = self.target - pool_depth(db)
+            while missing > 0:
+                started = time.perf_counter()
+                made = generate_keys(db, min(self.batch, missing))
+                elapsed = time.perf_counter() - started
+                missing -= made
+                with self._lock:
+                    self.generated += made
+                    self.last_refill = {
+                        "keys": made,
+                        "seconds": round(elapsed, 4),
+                        "keys_per_second": round(made / elapsed, 1) if elapsed else None,
+                        "at": datetime.now(timezone.utc).isoformat(),
+                    }
+        finally:
+            db.close()
+
+    def claim(self, db: Session, user_id: int) -> tuple[str, str]:
+        """
+        (address, private_key) for user_id. The claim is part of the caller's
+        transaction, so the row comes back if their signup rolls back.
+        """
+        for _ in range(CLAIM_ATTEMPTS if _fernet is not None else 0):
+            candidate = _candidate(db)
+            if not candidate:
+                break
+            claimed = db.execute(
+                delete(models.WalletKey)
+                .where(models.WalletKey.id == candidate.id, models.WalletKey.claimed_by.is_(None))
+                .execution_options(synchronize_session=False)
+            ).rowcount
+            if not claimed:
+                continue
+            try:
+                private_key = decrypt_key(candidate.encrypted_key)
+            except InvalidToken:
+                #encrypted under an older WALLET_POOL_ENCRYPTION_KEY; the row is useless, leave it deleted
+                print(f"Wallet key {candidate.id} can't be decrypted, generating one inline")
+                break
+            with self._lock:
+                self.claimed += 1
+            return candidate.address, private_key
+
+        with self._lock:
+            self.fallbacks += 1
+        return create_b_wallet()
+
+    def stats(self, db: Session) -> dict:
+        with self._lock:
+            return {
+                "depth": pool_depth(db),
+                "target": self.target,
+                "claimed": self.claimed,
+                "fallbacks": self.fallbacks,
+                "generated": self.generated,
+                "last_refill": self.last_refill,
+            }
+
+
+wallet_key_pool = WalletKeyPool(settings.WALLET_POOL_TARGET, settings.WALLET_POOL_BATCH, settings.WALLET_POOL_REFILL_SECONDS)
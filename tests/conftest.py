@@ -0,0 +1,116 @@
+"""
+Shared fixtures. The chain tests run against a real EVM: eth-tester
+(pip install "web3[tester]") for the in-process cases, and anvil (foundry)
+for the ones that need a mempool, i.e. stuck and replaced transactions.
+Either one missing skips those tests rather than failing them.
+"""
+import os
+import sys
+import json
+import time
+import socket
+import shutil
+import subprocess
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+#config.Settings refuses to load without these; the tests never use the real values
+os.environ.setdefault("DATABASE_URL", "sqlite:///:memory:")
+os.environ.setdefault("SECRET_KEY", "test-secret")
+os.environ.setdefault("DEPLOYER_PRIVATE_KEY", "0x" + "11" * 32)
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import models
+
+#the first of anvil's well-known dev accounts
+ANVIL_KEY = "0xac0974bec39a17e36ba4a6b4d238ff944bacb478cbed5efcae784d7bf4f2ff80"
+
+
+@pytest.fixture
+def db():
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    models.Base.metadata.create_all(engine)
+    session = sessionmaker(autocommit=False, autoflush=False, bind=engine)()
+    try:
+        yield session
+    finally:
+        session.close()
+        engine.dispose()
+
+
+def deploy_registry(w3, private_key: str):
+    with open(os.path.join(ROOT, "compiled.json")) as f:
+        compiled = json.load(f)["contracts"]["ContentRegistry.sol"]["ContentRegistry"]
+    factory = w3.eth.contract(abi=compiled["abi"], bytecode=compiled["evm"]["bytecode"]["object"])
+    account = w3.eth.account.from_key(private_key)
+    tx = factory.constructor().build_transaction({
+        "from": account.address,
+        "nonce": w3.eth.get_transaction_count(account.address),
+        "gas": 3_000_000,
+        "gasPrice": w3.to_wei(35, "gwei"),
+        "chainId": w3.eth.chain_id,
+    })
+    tx_hash = w3.eth.send_raw_transaction(w3.eth.account.sign_transaction(tx, private_key).raw_transaction)
+    receipt = w3.eth.wait_for_transaction_receipt(tx_hash)
+    return w3.eth.contract(address=receipt["contractAddress"], abi=compiled["abi"])
+
+
+@pytest.fixture
+def eth_chain():
+    pytest.importorskip("eth_tester")
+    from web3 import Web3, EthereumTesterProvider
+
+    provider = EthereumTesterProvider()
+    w3 = Web3(provider)
+    private_key = provider.ethereum_tester.backend.account_keys[0].to_hex()
+    return SimpleNamespace(w3=w3, tester=provider.ethereum_tester, private_key=private_key,
+                           contract=deploy_registry(w3, private_key))
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+@pytest.fixture
+def anvil_chain():
+    anvil = shutil.which("anvil")
+    if not anvil:
+        pytest.skip("anvil (foundry) is not installed")
+    from web3 import Web3
+
+    port = _free_port()
+    process = subprocess.Popen([anvil, "--port", str(port), "--silent"], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    w3 = Web3(Web3.HTTPProvider(f"http://127.0.0.1:{port}"))
+    try:
+        deadline = time.monotonic() + 10
+        while not w3.is_connected():
+            if time.monotonic() > deadline:
+                pytest.fail("anvil did not start")
+            time.sleep(0.1)
+        contract = deploy_registry(w3, ANVIL_KEY)
+        yield SimpleNamespace(w3=w3, private_key=ANVIL_KEY, contract=contract,
+                              rpc=lambda method, *params: w3.provider.make_request(method, list(params)))
+    finally:
+        process.terminate()
+        process.wait(10)
+
+
+def add_movies(db, count: int, creator_address: str, status: str = "pending") -> list:
+    movies = []
+    for i in range(count):
+        movie = models.Movie(
+            title=f"movie {i}", genre="test", url=f"uploads/{i}.mp4",
+            hash=os.urandom(32).hex(), creator_address=creator_address, anchor_status=status,
+        )
+        db.add(movie)
+        movies.append(movie)
+    db.commit()
+    return movies
@@ -0,0 +1,171 @@
+import json
+from sqlalchemy import update
+from sqlalchemy.sql.dml import Update
+
+import models
+from services import anchor_service
+from utils import merkle
+from conftest import add_movies
+
+CREATOR = "0x" + "ab" * 20
+
+
+def test_build_batch_claims_each_movie_once(db):
+    movies = add_movies(db, 5, CREATOR)
+
+    first = anchor_service.build_batch(db, 3)
+    second = anchor_service.build_batch(db, 10)
+    assert anchor_service.build_batch(db, 10) is None
+
+    assert (first.leaf_count, second.leaf_count) == (3, 2)
+    for movie in movies:
+        db.refresh(movie)
+        assert movie.anchor_status == "batched"
+        assert movie.anchor_batch_id in (first.id, second.id)
+    assert sum(1 for m in movies if m.anchor_batch_id == first.id) == 3
+
+
+def test_build_batch_leaves_rows_claimed_elsewhere(db):
+    movies = add_movies(db, 3, CREATOR)
+    raced_id = movies[0].id
+    #another builder takes one of them between our select and our claim
+    original_execute = db.execute
+
+    def racing_execute(statement, *args, **kwargs):
+        if isinstance(statement, Update) and not raced:
+            raced.append(raced_id)
+            original_execute(update(models.Movie).where(models.Movie.id == raced_id).values(anchor_status="batched"))
+        return original_execute(statement, *args, **kwargs)
+
+    raced = []
+    db.execute = racing_execute
+    try:
+        batch = anchor_service.build_batch(db, 10)
+    finally:
+        db.execute = original_execute
+
+    assert raced and batch.leaf_count == 2
+    assert db.get(models.Movie, raced_id).anchor_batch_id is None
+
+
+def test_recover_interrupted_releases_unsigned_and_keeps_signed(db):
+    add_movies(db, 4, CREATOR)
+    unsigned = anchor_service.build_batch(db, 2)
+    signed = anchor_service.build_batch(db, 2)
+    signed.tx_hash = "0x" + "00" * 32
+    db.commit()
+
+    assert anchor_service.recover_interrupted(db) == 2
+
+    assert unsigned.status == "failed"
+    assert db.query(models.Movie).filter(models.Movie.anchor_status == "pending").count() == 2
+    assert signed.status == "submitted"
+
+
+def test_anchor_send_and_confirm_on_dev_chain(db, eth_chain):
+    from blockchain.tx_pipeline import TxPipeline
+
+    w3 = eth_chain.w3
+    sender = w3.eth.account.from_key(eth_chain.private_key).address
+    movies = add_movies(db, 5, sender)
+    pipeline = TxPipeline(w3, w3.eth.chain_id)
+
+    batch = anchor_service.anchor_pending(db, pipeline, eth_chain.contract, eth_chain.private_key)
+    assert batch.status == "submitted" and batch.tx_hash
+
+    assert anchor_service.poll_receipts(db, pipeline, eth_chain.contract, eth_chain.private_key, 900) == 1
+    db.refresh(batch)
+    assert batch.status == "confirmed" and batch.block_number
+    creator, registered_hash, timestamp = eth_chain.contract.functions.getContent(batch.root).call()
+    assert (creator, registered_hash) == (sender, batch.root) and timestamp > 0
+    for movie in movies:
+        db.refresh(movie)
+        assert movie.anchor_status == "anchored"
+
+
+def test_proofs_verify_against_the_anchored_root(db, eth_chain):
+    from blockchain.tx_pipeline import TxPipeline
+
+    w3 = eth_chain.w3
+    sender = w3.eth.account.from_key(eth_chain.private_key).address
+    movies = add_movies(db, 7, sender)  #odd count: one node is carried up unpaired
+    pipeline = TxPipeline(w3, w3.eth.chain_id)
+    batch = anchor_service.anchor_pending(db, pipeline, eth_chain.contract, eth_chain.private_key)
+    anchor_service.poll_receipts(db, pipeline, eth_chain.contract, eth_chain.private_key, 900)
+
+    onchain_root = eth_chain.contract.functions.getContent(batch.root).call()[1]
+    for movie in movies:
+        db.refresh(movie)
+        proof = anchor_service.movie_proof(movie)
+        assert proof["valid"] and proof["root"] == onchain_root
+        assert merkle.verify(bytes.fromhex(proof["leaf"]), proof["proof"], onchain_root)
+        #the same proof must not vouch for a different file
+        forged = merkle.leaf_hash(movie.creator_address, "00" * 32)
+        assert not merkle.verify(forged, json.loads(movie.merkle_proof), onchain_root)
+
+
+# -------------------- Stuck transactions (anvil, automine off) -------------------- #
+
+def _anchor_without_mining(db, chain, count: int = 3):
+    from blockchain.tx_pipeline import TxPipeline
+
+    w3 = chain.w3
+    sender = w3.eth.account.from_key(chain.private_key).address
+    chain.rpc("evm_setAutomine", False)
+    movies = add_movies(db, count, sender)
+    pipeline = TxPipeline(w3, w3.eth.chain_id)
+    batch = anchor_service.anchor_pending(db, pipeline, chain.contract, chain.private_key)
+    return pipeline, batch, movies, sender
+
+
+def test_pending_transaction_is_left_alone_before_the_timeout(db, anvil_chain):
+    pipeline, batch, movies, _ = _anchor_without_mining(db, anvil_chain)
+    first_hash = batch.tx_hash
+
+    assert anchor_service.poll_receipts(db, pipeline, anvil_chain.contract, anvil_chain.private_key, 900) == 0
+    db.refresh(batch)
+    assert (batch.status, batch.tx_hash) == ("submitted", first_hash)
+
+
+def test_stuck_transaction_is_replaced_at_the_same_nonce(db, anvil_chain):
+    pipeline, batch, movies, sender = _anchor_without_mining(db, anvil_chain)
+    first_hash, nonce, first_price = batch.tx_hash, batch.nonce, batch.gas_price
+
+    #timed out: re-sent at the same nonce, higher fee, hashes stay in the batch
+    assert anchor_service.poll_receipts(db, pipeline, anvil_chain.contract, anvil_chain.private_key, 0) == 0
+    db.refresh(batch)
+    assert batch.status == "submitted" and batch.tx_hash != first_hash
+    assert batch.nonce == nonce and batch.gas_price > first_price
+    assert first_hash in json.loads(batch.previous_tx_hashes)
+    assert all(m.anchor_status == "batched" for m in batch.movies)
+
+    anvil_chain.rpc("evm_mine")
+    assert anchor_service.poll_receipts(db, pipeline, anvil_chain.contract, anvil_chain.private_key, 900) == 1
+    db.refresh(batch)
+    assert batch.status == "confirmed"
+    assert anvil_chain.w3.eth.get_transaction_count(sender, "latest") == nonce + 1
+    assert anvil_chain.contract.functions.getContent(batch.root).call()[0] == sender
+    for movie in movies:
+        db.refresh(movie)
+        assert movie.anchor_status == "anchored"
+
+
+def test_nonce_taken_by_another_transaction_puts_hashes_back(db, anvil_chain):
+    pipeline, batch, movies, sender = _anchor_without_mining(db, anvil_chain)
+    w3 = anvil_chain.w3
+
+    #the batch's transaction is dropped and something else is mined at its nonce
+    anvil_chain.rpc("anvil_dropTransaction", batch.tx_hash)
+    other = w3.eth.account.sign_transaction({
+        "to": sender, "value": 0, "nonce": batch.nonce, "gas": 21000,
+        "gasPrice": batch.gas_price * 2, "chainId": w3.eth.chain_id,
+    }, anvil_chain.private_key)
+    w3.eth.send_raw_transaction(other.raw_transaction)
+    anvil_chain.rpc("evm_mine")
+
+    assert anchor_service.poll_receipts(db, pipeline, anvil_chain.contract, anvil_chain.private_key, 900) == 1
+    db.refresh(batch)
+    assert batch.status == "failed"
+    for movie in movies:
+        db.refresh(movie)
+        assert (movie.anchor_status, movie.anchor_batch_id) == ("pending", None)
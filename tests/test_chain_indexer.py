@@ -0,0 +1,67 @@
+import models
+from services import chain_indexer
+
+
+def _register(chain, content_hash: str):
+    sender = chain.w3.eth.accounts[0]
+    tx_hash = chain.contract.functions.registerContent(content_hash).transact({"from": sender})
+    chain.w3.eth.wait_for_transaction_receipt(tx_hash)
+
+
+def _sync(db, chain, confirmations: int = 0) -> int:
+    return chain_indexer.sync(db, chain.w3, chain.contract, start_block=0, confirmations=confirmations, chunk_size=5, reorg_depth=64)
+
+
+def test_sync_indexes_registrations_behind_the_confirmation_depth(db, eth_chain):
+    _register(eth_chain, "aa" * 32)
+    _register(eth_chain, "bb" * 32)
+
+    #the second registration is in the head block, one confirmation leaves it out for now
+    assert _sync(db, eth_chain, confirmations=1) == 1
+    eth_chain.tester.mine_blocks(1)
+    assert _sync(db, eth_chain, confirmations=1) == 1
+
+    registration = chain_indexer.lookup(db, "bb" * 32)
+    assert registration and registration.creator == eth_chain.w3.eth.accounts[0]
+    checkpoint = db.get(models.IndexerCheckpoint, chain_indexer.CHECKPOINT_NAME)
+    assert checkpoint.block_number == eth_chain.w3.eth.block_number - 1
+
+
+def test_reorg_drops_orphaned_registrations_and_reindexes(db, eth_chain):
+    snapshot = eth_chain.tester.take_snapshot()
+    _register(eth_chain, "aa" * 32)
+    eth_chain.tester.mine_blocks(2)
+    assert _sync(db, eth_chain) == 1
+    orphaned_head = eth_chain.w3.eth.block_number
+
+    #the fork: same heights, different blocks, "aa" never happened
+    eth_chain.tester.revert_to_snapshot(snapshot)
+    _register(eth_chain, "cc" * 32)
+    eth_chain.tester.mine_blocks(3)
+    assert eth_chain.w3.eth.block_number > orphaned_head
+
+    assert _sync(db, eth_chain) == 1
+    assert chain_indexer.lookup(db, "aa" * 32) is None
+    assert chain_indexer.lookup(db, "cc" * 32) is not None
+    for block in db.query(models.IndexedBlock).all():
+        assert chain_indexer._hex(eth_chain.w3.eth.get_block(block.block_number)["hash"]) == block.block_hash
+
+
+def test_reorg_with_no_events_in_it_is_still_noticed(db, eth_chain):
+    _register(eth_chain, "aa" * 32)
+    assert _sync(db, eth_chain) == 1
+    snapshot = eth_chain.tester.take_snapshot()
+    eth_chain.tester.mine_blocks(2)
+    assert _sync(db, eth_chain) == 0
+
+    #replace the two empty blocks with a fork that carries a registration
+    eth_chain.tester.revert_to_snapshot(snapshot)
+    _register(eth_chain, "dd" * 32)
+    eth_chain.tester.mine_blocks(2)
+
+    checkpoint = db.get(models.IndexerCheckpoint, chain_indexer.CHECKPOINT_NAME)
+    fork = chain_indexer.rewind_reorged(db, eth_chain.w3, checkpoint)
+    assert fork is not None and fork < eth_chain.w3.eth.block_number
+    assert _sync(db, eth_chain) == 1
+    assert chain_indexer.lookup(db, "aa" * 32) is not None
+    assert chain_indexer.lookup(db, "dd" * 32) is not None
@@ -0,0 +1,33 @@
+import threading
+
+class PeriodicTask:
+    """
+    Calls fn every `interval` seconds on a daemon thread until stop() is called.
+    Exceptions are printed and swallowed so one bad tick doesn't kill the loop.
+    """
+    def __init__(self, name: str, interval: float, fn):
+        self.name = name
+        self.interval = interval
+        self.fn = fn
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float | None = 5):
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.fn()
+            except Exception as e:
+                print(f"{self.name} failed: {e}")
+            self._stop.wait(self.interval)
@@ -0,0 +1,83 @@
+import os
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor, CancelledError, wait, FIRST_EXCEPTION
+
+def available_cores() -> int:
+    #respect taskset/cgroup pinning when the platform tells us about it
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+class CpuScheduler:
+    """
+    A fixed budget of cores handed out as thread counts. Every encode
+    reserves the threads it is told to use (and ffmpeg is pinned to that
+    number), so running several at once never asks for more cores than
+    the budget has.
+    """
+    def __init__(self, cores: int):
+        self.cores = max(1, cores)
+        self._free = self.cores
+        self._cond = threading.Condition()
+
+    @contextmanager
+    def reserve(self, threads: int, cancelled: threading.Event | None = None):
+        threads = max(1, min(threads, self.cores))
+        with self._cond:
+            while self._free < threads:
+                if cancelled is not None and cancelled.is_set():
+                    raise CancelledError()
+                self._cond.wait()
+            self._free -= threads
+        try:
+            yield threads
+        finally:
+            with self._cond:
+                self._free += threads
+                self._cond.notify_all()
+
+    def _cancel(self, cancelled: threading.Event):
+        cancelled.set()
+        #wake anyone waiting in reserve() so they see the flag
+        with self._cond:
+            self._cond.notify_all()
+
+    def split(self, weights: list[float]) -> list[int]:
+        """Thread counts proportional to weights, at least one each, summing to at most the budget where possible."""
+        total = sum(weights) or 1
+        return [max(1, int(self.cores * w / total)) for w in weights]
+
+    def run(self, tasks: list[tuple[int, object]], on_tick=None, tick_seconds: float = 1.0) -> list:
+        """
+        Run (threads, fn) tasks concurrently, each fn(threads) inside its reservation.
+        on_tick is called from this thread while waiting, handy for progress reporting.
+        Results come back in task order; the first failure is raised.
+        """
+        cancelled = threading.Event()
+
+        def runner(threads, fn):
+            if cancelled.is_set():
+                raise CancelledError()
+            with self.reserve(threads, cancelled) as granted:
+                if cancelled.is_set():
+                    raise CancelledError()
+                return fn(granted)
+
+        #every task holds at least one core, so more threads than cores would only sit in reserve()
+        with ThreadPoolExecutor(max_workers=max(1, min(len(tasks), self.cores))) as pool:
+            futures = [pool.submit(runner, threads, fn) for threads, fn in tasks]
+            pending = set(futures)
+            while pending:
+                done, pending = wait(pending, timeout=tick_seconds, return_when=FIRST_EXCEPTION)
+                if on_tick:
+                    on_tick()
+                for future in done:
+                    if future.exception():
+                        #queued tasks never start; leaving the with block only waits for the ones already encoding
+                        self._cancel(cancelled)
+                        for other in pending:
+                            other.cancel()
+                        raise future.exception()
+            return [f.result() for f in futures]
@@ -0,0 +1,124 @@
+import os
+import shutil
+import threading
+
+#misses on different keys rarely share a stripe, and the set doesn't grow with the keys
+LOCK_STRIPES = 64
+#eviction frees down to this share of max_bytes, so the next few misses don't each rescan the tree
+LOW_WATER = 0.9
+
+
+class DiskSegmentCache:
+    """
+    Files under `root` bounded by total size. Reads touch the file's mtime,
+    and when a write pushes the total past max_bytes the least recently
+    used files go first, down to LOW_WATER of the limit. Writes land in a
+    temp file and are renamed into place, so a reader (or another worker
+    process) never sees half a file.
+    """
+    def __init__(self, root: str, max_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._locks = [threading.Lock() for _ in range(LOCK_STRIPES)]
+        self._guard = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.size = sum(size for _, _, size in self._scan())
+
+    def _scan(self):
+        for folder, _, files in os.walk(self.root):
+            for name in files:
+                path = os.path.join(folder, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield stat.st_mtime, path, stat.st_size
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def _lock(self, key: str) -> threading.Lock:
+        return self._locks[hash(key) % LOCK_STRIPES]
+
+    def get_or_create(self, key: str, produce) -> str:
+        """
+        Path of the cached file for key, calling produce(tmp_path) to write it on a miss.
+        Concurrent misses on the same key in this process produce it once.
+        """
+        path = self.path(key)
+        if self._touch(path):
+            self.hits += 1
+            return path
+
+        with self._lock(key):
+            if self._touch(path):
+                self.hits += 1
+                return path
+            self.misses += 1
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                produce(tmp_path)
+                os.replace(tmp_path, path)
+            finally:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+
+        with self._guard:
+            self.size += os.path.getsize(path)
+        self.evict()
+        return path
+
+    def _touch(self, path: str) -> bool:
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def evict(self):
+        with self._guard:
+            if self.size <= self.max_bytes:
+                return
+            #several workers share the directory, so trust the disk over our running total
+            entries = sorted(entry for entry in self._scan() if not entry[1].endswith(".tmp"))
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * LOW_WATER
+            for _, path, size in entries:
+                if total <= target:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                self.evictions += 1
+            self.size = total
+
+    def invalidate(self, prefix: str):
+        """Drop everything under root/prefix, keeping the running total in step."""
+        folder = self.path(prefix)
+        removed = 0
+        for dirpath, _, files in os.walk(folder):
+            for name in files:
+                try:
+                    removed += os.path.getsize(os.path.join(dirpath, name))
+                except FileNotFoundError:
+                    pass
+        shutil.rmtree(folder, ignore_errors=True)
+        with self._guard:
+            self.size = max(0, self.size - removed)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+        }
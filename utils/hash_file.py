@@ -1,4 +1,22 @@
 import hashlib
 
+#1 MiB keeps peak memory flat no matter how big the upload is
+CHUNK_SIZE = 1024 * 1024
+
 def hash_file(file_bytes: bytes) -> str:
     return hashlib.sha256(file_bytes).hexdigest()
+
+def copy_and_hash(src, dest_path: str, chunk_size: int = CHUNK_SIZE) -> str:
+    """
+    Stream a file-like object to dest_path in fixed-size chunks,
+    updating the sha256 on every chunk. Returns the hex digest.
+    """
+    sha256 = hashlib.sha256()
+    with open(dest_path, "wb") as out:
+        while True:
+            chunk = src.read(chunk_size)
+            if not chunk:
+                break
+            sha256.update(chunk)
+            out.write(chunk)
+    return sha256.hexdigest()
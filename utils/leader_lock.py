@@ -0,0 +1,48 @@
+"""
+One runner per host for background loops that must not run twice (the
+anchor key's nonces, the indexer's unique rows). Every uvicorn worker starts
+the loop, but each tick first takes a non-blocking flock on a shared file;
+only the holder does any work. The OS drops the lock when that process
+dies, so another worker picks it up on its next tick. Across several hosts
+enable the loop on one host only.
+"""
+import os
+import fcntl
+import threading
+
+from config import settings
+
+
+class LeaderLock:
+    def __init__(self, name: str, lock_dir: str | None = None):
+        self.path = os.path.join(lock_dir or settings.LOCK_DIR, f"{name}.lock")
+        self._fd = None
+        self._guard = threading.Lock()
+
+    @property
+    def held(self) -> bool:
+        return self._fd is not None
+
+    def try_acquire(self) -> bool:
+        """True if this process holds the lock (now or already)."""
+        with self._guard:
+            if self._fd is not None:
+                return True
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd = os.open(self.path, os.O_CREAT | os.O_RDWR, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                os.close(fd)
+                return False
+            os.ftruncate(fd, 0)
+            os.write(fd, str(os.getpid()).encode())
+            self._fd = fd
+            return True
+
+    def release(self):
+        with self._guard:
+            if self._fd is not None:
+                fcntl.flock(self._fd, fcntl.LOCK_UN)
+                os.close(self._fd)
+                self._fd = None
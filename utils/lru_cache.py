@@ -0,0 +1,146 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+class ByteLRUCache:
+    """
+    A thread-safe LRU bounded by total bytes rather than entry count.
+    get_or_load() is single-flight: when a thousand viewers miss on the same
+    key at once, one of them loads it and the rest wait for that result.
+    """
+    def __init__(self, max_bytes: int, max_item_bytes: int | None = None):
+        self.max_bytes = max(0, max_bytes)
+        #one huge file shouldn't be able to flush everything else
+        self.max_item_bytes = max_item_bytes if max_item_bytes is not None else self.max_bytes // 8
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._items = OrderedDict()
+        self._loading = {}  #key -> threading.Event
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            value = self._items.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._items.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def __contains__(self, key) -> bool:
+        with self._lock:
+            return key in self._items
+
+    def put(self, key, value: bytes):
+        if len(value) > self.max_item_bytes:
+            return
+        with self._lock:
+            old = self._items.pop(key, None)
+            if old is not None:
+                self.size -= len(old)
+            self._items[key] = value
+            self.size += len(value)
+            while self.size > self.max_bytes and self._items:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+                self.evictions += 1
+
+    def get_or_load(self, key, loader, count: bool = True) -> bytes:
+        while True:
+            with self._lock:
+                value = self._items.get(key)
+                if value is not None:
+                    self._items.move_to_end(key)
+                    if count:
+                        self.hits += 1
+                    return value
+                event = self._loading.get(key)
+                if event is None:
+                    if count:
+                        self.misses += 1
+                    event = self._loading[key] = threading.Event()
+                    break
+            #someone else is loading it, wait and look again
+            event.wait()
+
+        try:
+            value = loader()
+            self.put(key, value)
+            return value
+        finally:
+            with self._lock:
+                self._loading.pop(key, None)
+            event.set()
+
+    def invalidate(self, prefix=None):
+        with self._lock:
+            for key in [k for k in self._items if prefix is None or k[0] == prefix]:
+                self.size -= len(self._items.pop(key))
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._items),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+def path_mtime(path: str) -> int | None:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class StatLRUCache:
+    """
+    Small LRU bounded by entry count, for values derived from something on
+    disk (a directory listing, a parsed playlist). Each entry remembers a path
+    and its mtime when it was stored; a lookup stats the path and treats a
+    changed mtime, or a path that is gone, as a miss.
+    """
+    def __init__(self, max_entries: int):
+        self.max_entries = max(1, max_entries)
+        self._items = OrderedDict()  #key -> (path, mtime_ns, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            item = self._items.get(key)
+        if item is None:
+            return None
+        path, mtime, value = item
+        if path_mtime(path) != mtime:
+            with self._lock:
+                if self._items.get(key) is item:
+                    del self._items[key]
+            return None
+        with self._lock:
+            if key in self._items:
+                self._items.move_to_end(key)
+        return value
+
+    def put(self, key, path: str, value, mtime: int | None = None):
+        """Store `value` as valid for `path` at `mtime` (stat it before computing the value to avoid racing a writer)."""
+        mtime = path_mtime(path) if mtime is None else mtime
+        if mtime is None:
+            return
+        with self._lock:
+            self._items.pop(key, None)
+            self._items[key] = (path, mtime, value)
+            while len(self._items) > self.max_entries:
+                self._items.popitem(last=False)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._items)
@@ -0,0 +1,160 @@
+import os
+import re
+import json
+import shutil
+import subprocess
+from functools import cache
+
+@cache
+def ffmpeg_bin() -> str:
+    #looked up on first use, not at import: get_ffmpeg_exe may go searching or downloading, and
+    #importing the job service (e.g. from the app's router list) shouldn't pay for that
+    import imageio_ffmpeg
+    return imageio_ffmpeg.get_ffmpeg_exe()
+
+_DURATION_RE = re.compile(r"Duration:\s*(\d+):(\d+):(\d+(?:\.\d+)?)")
+
+def probe_duration(path: str) -> float | None:
+    """
+    Duration in seconds, read from the header ffmpeg prints for `-i`.
+    Nothing is decoded so this is cheap even for long movies.
+    """
+    result = subprocess.run([ffmpeg_bin(), "-hide_banner", "-i", path], capture_output=True, text=True)
+    match = _DURATION_RE.search(result.stderr)
+    if not match:
+        return None
+    hours, minutes, seconds = match.groups()
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+def iter_ffmpeg_progress(stream):
+    """
+    Parse the key=value blocks ffmpeg writes with `-progress pipe:1`.
+    Yields one dict per block, the last one has progress == "end".
+    """
+    block = {}
+    for line in stream:
+        key, sep, value = line.strip().partition("=")
+        if not sep:
+            continue
+        block[key] = value
+        if key == "progress":
+            yield block
+            block = {}
+
+def progress_seconds(block: dict) -> float | None:
+    #out_time_ms is actually microseconds, out_time_us only exists on newer builds
+    raw = block.get("out_time_us") or block.get("out_time_ms")
+    if not raw or raw == "N/A":
+        return None
+    try:
+        return max(int(raw), 0) / 1_000_000
+    except ValueError:
+        return None
+
+def run_ffmpeg(command: list[str], log_path: str, duration: float | None = None, on_progress=None):
+    """
+    Run an ffmpeg command that has `-progress pipe:1`, reporting progress
+    as it goes. stderr goes to log_path so a chatty encoder can't fill the pipe.
+    """
+    with open(log_path, "w") as log:
+        proc = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=log, text=True)
+        for block in iter_ffmpeg_progress(proc.stdout):
+            if not on_progress:
+                continue
+            if block.get("progress") == "end":
+                on_progress(1.0)
+                continue
+            seconds = progress_seconds(block)
+            if duration and seconds is not None:
+                on_progress(min(seconds / duration, 0.99))
+        returncode = proc.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
+
+@cache
+def ffprobe_bin() -> str | None:
+    #imageio_ffmpeg only ships ffmpeg, so look beside it first, then on PATH (apt's ffmpeg brings ffprobe)
+    folder, name = os.path.split(ffmpeg_bin())
+    sibling = os.path.join(folder, name.replace("ffmpeg", "ffprobe"))
+    if sibling != ffmpeg_bin() and os.path.exists(sibling):
+        return sibling
+    return shutil.which("ffprobe")
+
+def _parse_rate(rate: str | None) -> float | None:
+    if not rate or rate in ("0/0", "N/A"):
+        return None
+    num, _, den = rate.partition("/")
+    try:
+        return float(num) / float(den or 1)
+    except (ValueError, ZeroDivisionError):
+        return None
+
+def _to_int(value) -> int | None:
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+def probe(path: str) -> dict:
+    """
+    Source properties the encoder cares about:
+    width, height, fps, video_bitrate / bitrate (bits per second), duration, has_audio.
+    Anything the container doesn't say is None.
+    """
+    if not ffprobe_bin():
+        return _probe_with_ffmpeg(path)
+
+    result = subprocess.run([
+        ffprobe_bin(), "-v", "error",
+        "-show_entries", "format=duration,bit_rate:stream=codec_type,width,height,avg_frame_rate,r_frame_rate,bit_rate",
+        "-of", "json", path,
+    ], capture_output=True, text=True, check=True)
+    data = json.loads(result.stdout or "{}")
+    streams = data.get("streams", [])
+    video = next((s for s in streams if s.get("codec_type") == "video"), {})
+    fmt = data.get("format", {})
+    duration = fmt.get("duration")
+
+    return {
+        "width": _to_int(video.get("width")),
+        "height": _to_int(video.get("height")),
+        "fps": _parse_rate(video.get("avg_frame_rate")) or _parse_rate(video.get("r_frame_rate")),
+        "video_bitrate": _to_int(video.get("bit_rate")),
+        "bitrate": _to_int(fmt.get("bit_rate")),
+        "duration": float(duration) if duration not in (None, "N/A") else None,
+        "has_audio": any(s.get("codec_type") == "audio" for s in streams),
+    }
+
+_VIDEO_STREAM_RE = re.compile(r"Stream #\d+:\d+.*?: Video: (.*)")
+_SIZE_RE = re.compile(r"\b(\d{2,5})x(\d{2,5})\b")
+_FPS_RE = re.compile(r"([\d.]+) fps")
+_KBPS_RE = re.compile(r"(\d+) kb/s")
+_TOTAL_BITRATE_RE = re.compile(r"bitrate:\s*(\d+) kb/s")
+
+def _probe_with_ffmpeg(path: str) -> dict:
+    #no ffprobe around: same fields scraped from the `ffmpeg -i` banner
+    stderr = subprocess.run([ffmpeg_bin(), "-hide_banner", "-i", path], capture_output=True, text=True).stderr
+    info = {"width": None, "height": None, "fps": None, "video_bitrate": None, "bitrate": None,
+            "duration": None, "has_audio": ": Audio:" in stderr}
+
+    duration = _DURATION_RE.search(stderr)
+    if duration:
+        hours, minutes, seconds = duration.groups()
+        info["duration"] = int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+    total = _TOTAL_BITRATE_RE.search(stderr)
+    if total:
+        info["bitrate"] = int(total.group(1)) * 1000
+
+    video = _VIDEO_STREAM_RE.search(stderr)
+    if video:
+        details = video.group(1)
+        size = _SIZE_RE.search(details)
+        if size:
+            info["width"], info["height"] = int(size.group(1)), int(size.group(2))
+        fps = _FPS_RE.search(details)
+        if fps:
+            info["fps"] = float(fps.group(1))
+        kbps = _KBPS_RE.search(details)
+        if kbps:
+            info["video_bitrate"] = int(kbps.group(1)) * 1000
+    return info
@@ -0,0 +1,47 @@
+import hashlib
+
+#domain-separate leaves from inner nodes so a node can never be passed off as a leaf
+LEAF_PREFIX = b"\x00"
+NODE_PREFIX = b"\x01"
+ZERO_ADDRESS = "0x" + "00" * 20
+
+
+def leaf_hash(creator_address: str, file_hash: str) -> bytes:
+    """A leaf binds the content hash to the creator's address."""
+    address = bytes.fromhex((creator_address or ZERO_ADDRESS).lower().removeprefix("0x"))
+    return hashlib.sha256(LEAF_PREFIX + address + bytes.fromhex(file_hash)).digest()
+
+def node_hash(a: bytes, b: bytes) -> bytes:
+    #sorted pair, so a proof is just the list of siblings, no left/right flags
+    return hashlib.sha256(NODE_PREFIX + min(a, b) + max(a, b)).digest()
+
+def build_tree(leaves: list[bytes]) -> list[list[bytes]]:
+    """All levels, leaves first, root last. An odd node out is carried up unchanged."""
+    if not leaves:
+        raise ValueError("Cannot build a Merkle tree with no leaves")
+    levels = [list(leaves)]
+    while len(levels[-1]) > 1:
+        level = levels[-1]
+        parents = [node_hash(level[i], level[i + 1]) for i in range(0, len(level) - 1, 2)]
+        if len(level) % 2:
+            parents.append(level[-1])
+        levels.append(parents)
+    return levels
+
+def root(levels: list[list[bytes]]) -> bytes:
+    return levels[-1][0]
+
+def proof(levels: list[list[bytes]], index: int) -> list[str]:
+    siblings = []
+    for level in levels[:-1]:
+        sibling = index ^ 1
+        if sibling < len(level):
+            siblings.append(level[sibling].hex())
+        index //= 2
+    return siblings
+
+def verify(leaf: bytes, siblings: list[str], expected_root: str) -> bool:
+    node = leaf
+    for sibling in siblings:
+        node = node_hash(node, bytes.fromhex(sibling))
+    return node.hex() == expected_root.lower().removeprefix("0x")
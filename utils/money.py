@@ -0,0 +1,26 @@
+"""
+Money is integer kobo everywhere below the API: columns, arithmetic,
+Paystack amounts. Naira strings and Decimals exist only at the edge, where
+these two functions convert, so no float ever touches a balance.
+"""
+from decimal import Decimal, InvalidOperation
+
+KOBO_PER_NAIRA = 100
+
+
+def to_kobo(naira) -> int:
+    """Naira (Decimal, str or int) as integer kobo. Rejects fractions of a kobo and floats."""
+    if isinstance(naira, float):
+        #a float has already lost the exact amount the client sent
+        raise ValueError("Amounts must be sent as decimal strings, not floats")
+    try:
+        kobo = Decimal(naira) * KOBO_PER_NAIRA
+    except (InvalidOperation, TypeError):
+        raise ValueError("Invalid amount")
+    if not kobo.is_finite() or kobo != kobo.to_integral_value():
+        raise ValueError("Amounts have at most two decimal places")
+    return int(kobo)
+
+def from_kobo(kobo: int) -> str:
+    """Integer kobo as the naira string the API has always returned, e.g. 20000 -> "200.00"."""
+    return str(Decimal(int(kobo)).scaleb(-2))
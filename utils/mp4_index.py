@@ -0,0 +1,300 @@
+"""
+Keyframe index for MP4 files, read straight from the moov/stbl sample
+tables through mmap (nothing is decoded, and only the boxes we need are
+touched, wherever moov sits in the file). The result is two flat arrays,
+keyframe presentation time and byte offset, persisted next to the file
+as {file}.kfidx so later lookups are a small read plus a bisect.
+"""
+import os
+import sys
+import mmap
+import struct
+from array import array
+from bisect import bisect_right
+
+INDEX_SUFFIX = ".kfidx"
+_MAGIC = b"KFX1"
+#magic, source size, source mtime_ns, keyframe count, duration
+_HEADER = struct.Struct(">4sQQId")
+
+
+class Mp4IndexError(ValueError):
+    pass
+
+
+def _u32_array(buf, offset: int, count: int) -> array:
+    values = array("I", buf[offset:offset + 4 * count])
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+def _u64_array(buf, offset: int, count: int) -> array:
+    values = array("Q", buf[offset:offset + 8 * count])
+    if sys.byteorder == "little":
+        values.byteswap()
+    return values
+
+
+def _boxes(buf, start: int, end: int):
+    """(type, payload_start, box_end) for each box between start and end."""
+    pos = start
+    while pos + 8 <= end:
+        size, kind = struct.unpack_from(">I4s", buf, pos)
+        header = 8
+        if size == 1:
+            size = struct.unpack_from(">Q", buf, pos + 8)[0]
+            header = 16
+        elif size == 0:
+            size = end - pos
+        if size < header or pos + size > end:
+            raise Mp4IndexError(f"corrupt {kind!r} box at {pos}")
+        yield kind, pos + header, pos + size
+        pos += size
+
+def _children(buf, start: int, end: int) -> dict:
+    found = {}
+    for kind, payload, box_end in _boxes(buf, start, end):
+        found.setdefault(kind, []).append((payload, box_end))
+    return found
+
+
+def _video_track(buf, moov: tuple[int, int]) -> dict:
+    for trak_start, trak_end in _children(buf, *moov).get(b"trak", []):
+        trak = _children(buf, trak_start, trak_end)
+        if b"mdia" not in trak:
+            continue
+        mdia = _children(buf, *trak[b"mdia"][0])
+        hdlr = mdia.get(b"hdlr")
+        if not hdlr or buf[hdlr[0][0] + 8:hdlr[0][0] + 12] != b"vide":
+            continue
+        minf = _children(buf, *mdia[b"minf"][0])
+        stbl = _children(buf, *minf[b"stbl"][0])
+        tables = {kind: boxes[0] for kind, boxes in stbl.items()}
+        tables[b"mdhd"] = mdia[b"mdhd"][0]
+        if b"edts" in trak:
+            elst = _children(buf, *trak[b"edts"][0]).get(b"elst")
+            if elst:
+                tables[b"elst"] = elst[0]
+        return tables
+    raise Mp4IndexError("no video track")
+
+
+def _timescale(buf, mdhd: tuple[int, int]) -> int:
+    start = mdhd[0]
+    version = buf[start]
+    return struct.unpack_from(">I", buf, start + (20 if version == 1 else 12))[0]
+
+def _media_start(buf, elst: tuple[int, int] | None) -> int:
+    #first non-empty edit's media_time: the decode timestamp that plays at t=0
+    if not elst:
+        return 0
+    start = elst[0]
+    version = buf[start]
+    count = struct.unpack_from(">I", buf, start + 4)[0]
+    pos = start + 8
+    for _ in range(count):
+        if version == 1:
+            _, media_time = struct.unpack_from(">Qq", buf, pos)
+            pos += 20
+        else:
+            _, media_time = struct.unpack_from(">Ii", buf, pos)
+            pos += 12
+        if media_time != -1:
+            return media_time
+    return 0
+
+def _sample_sizes(buf, tables: dict) -> array:
+    if b"stsz" in tables:
+        start = tables[b"stsz"][0]
+        uniform, count = struct.unpack_from(">II", buf, start + 4)
+        if uniform:
+            return array("I", [uniform]) * count
+        return _u32_array(buf, start + 12, count)
+    if b"stz2" in tables:
+        start = tables[b"stz2"][0]
+        field_size = buf[start + 7]
+        count = struct.unpack_from(">I", buf, start + 8)[0]
+        data = start + 12
+        if field_size == 16:
+            return array("I", struct.unpack_from(f">{count}H", buf, data))
+        if field_size == 8:
+            return array("I", buf[data:data + count])
+        packed = buf[data:data + (count + 1) // 2]
+        return array("I", [(packed[i // 2] >> (0 if i % 2 else 4)) & 0xF for i in range(count)])
+    raise Mp4IndexError("no sample size table")
+
+def _chunk_offsets(buf, tables: dict) -> array:
+    if b"stco" in tables:
+        start = tables[b"stco"][0]
+        return _u32_array(buf, start + 8, struct.unpack_from(">I", buf, start + 4)[0])
+    if b"co64" in tables:
+        start = tables[b"co64"][0]
+        return _u64_array(buf, start + 8, struct.unpack_from(">I", buf, start + 4)[0])
+    raise Mp4IndexError("no chunk offset table")
+
+def _sample_offsets(buf, tables: dict, sizes: array) -> array:
+    chunk_offsets = _chunk_offsets(buf, tables)
+    start = tables[b"stsc"][0]
+    runs = _u32_array(buf, start + 8, 3 * struct.unpack_from(">I", buf, start + 4)[0])
+
+    offsets = array("Q", bytes(8 * len(sizes)))
+    sample = 0
+    for run in range(0, len(runs), 3):
+        first_chunk, per_chunk = runs[run], runs[run + 1]
+        last_chunk = runs[run + 3] - 1 if run + 3 < len(runs) else len(chunk_offsets)
+        for chunk in range(first_chunk - 1, last_chunk):
+            offset = chunk_offsets[chunk]
+            for _ in range(per_chunk):
+                if sample >= len(sizes):
+                    return offsets
+                offsets[sample] = offset
+                offset += sizes[sample]
+                sample += 1
+    return offsets
+
+def _decode_times(buf, tables: dict, count: int) -> array:
+    start = tables[b"stts"][0]
+    entries = _u32_array(buf, start + 8, 2 * struct.unpack_from(">I", buf, start + 4)[0])
+    times = array("q", bytes(8 * count))
+    sample, dts = 0, 0
+    for i in range(0, len(entries), 2):
+        for _ in range(entries[i]):
+            if sample >= count:
+                return times
+            times[sample] = dts
+            dts += entries[i + 1]
+            sample += 1
+    return times
+
+def _composition_offsets(buf, tables: dict, count: int) -> array | None:
+    if b"ctts" not in tables:
+        return None
+    start = tables[b"ctts"][0]
+    entries = _u32_array(buf, start + 8, 2 * struct.unpack_from(">I", buf, start + 4)[0])
+    offsets = array("q", bytes(8 * count))
+    sample = 0
+    for i in range(0, len(entries), 2):
+        #signed in version 1, and in practice in version 0 too
+        value = entries[i + 1] - (1 << 32) if entries[i + 1] & 0x80000000 else entries[i + 1]
+        for _ in range(entries[i]):
+            if sample >= count:
+                return offsets
+            offsets[sample] = value
+            sample += 1
+    return offsets
+
+
+class KeyframeIndex:
+    def __init__(self, times: array, offsets: array, duration: float):
+        self.times = times  #seconds, ascending
+        self.offsets = offsets  #byte offset of each keyframe's first byte
+        self.duration = duration
+
+    def __len__(self) -> int:
+        return len(self.times)
+
+    def keyframe_before(self, seconds: float) -> tuple[float, int]:
+        """(time, byte offset) of the last keyframe at or before `seconds`, O(log n)."""
+        i = max(bisect_right(self.times, seconds) - 1, 0)
+        return self.times[i], self.offsets[i]
+
+    def keyframe_after(self, seconds: float) -> float | None:
+        """Time of the first keyframe at or after `seconds`, None past the last one."""
+        i = bisect_right(self.times, seconds - 1e-6)
+        return self.times[i] if i < len(self.times) else None
+
+    def to_bytes(self, source_size: int, source_mtime_ns: int) -> bytes:
+        times, offsets = array("d", self.times), array("Q", self.offsets)
+        if sys.byteorder == "little":
+            times.byteswap()
+            offsets.byteswap()
+        return _HEADER.pack(_MAGIC, source_size, source_mtime_ns, len(self.times), self.duration) + times.tobytes() + offsets.tobytes()
+
+    @classmethod
+    def from_bytes(cls, data: bytes, source_size: int, source_mtime_ns: int):
+        """None when the bytes are for some other version of the file."""
+        if len(data) < _HEADER.size:
+            return None
+        magic, size, mtime_ns, count, duration = _HEADER.unpack_from(data)
+        if magic != _MAGIC or size != source_size or mtime_ns != source_mtime_ns:
+            return None
+        body = _HEADER.size
+        if len(data) != body + 16 * count:
+            return None
+        times = array("d", data[body:body + 8 * count])
+        offsets = array("Q", data[body + 8 * count:])
+        if sys.byteorder == "little":
+            times.byteswap()
+            offsets.byteswap()
+        return cls(times, offsets, duration)
+
+
+def parse(path: str) -> KeyframeIndex:
+    """Build the keyframe index from the file's sample tables. Mp4IndexError if it isn't a plain (non-fragmented) MP4."""
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        top = _children(buf, 0, len(buf))
+        if b"moov" not in top:
+            raise Mp4IndexError("no moov box")
+        tables = _video_track(buf, top[b"moov"][0])
+        if b"stsc" not in tables or b"stts" not in tables:
+            raise Mp4IndexError("fragmented or empty video track")
+
+        timescale = _timescale(buf, tables[b"mdhd"]) or 1
+        sizes = _sample_sizes(buf, tables)
+        count = len(sizes)
+        offsets = _sample_offsets(buf, tables, sizes)
+        dts = _decode_times(buf, tables, count)
+        cts = _composition_offsets(buf, tables, count)
+        media_start = _media_start(buf, tables.get(b"elst"))
+
+        if b"stss" in tables:
+            start = tables[b"stss"][0]
+            sync = [n - 1 for n in _u32_array(buf, start + 8, struct.unpack_from(">I", buf, start + 4)[0]) if 0 < n <= count]
+        else:
+            #no sync sample table means every sample is a keyframe
+            sync = range(count)
+
+        times, key_offsets = array("d"), array("Q")
+        for sample in sync:
+            pts = dts[sample] + (cts[sample] if cts is not None else 0) - media_start
+            times.append(max(pts, 0) / timescale)
+            key_offsets.append(offsets[sample])
+
+        end = max((dts[i] + (cts[i] if cts is not None else 0) for i in range(count)), default=0)
+        #the last sample lasts as long as the last stts run says; the first run is often a different length (e.g. edit-list priming)
+        stts = tables[b"stts"][0]
+        entry_count = struct.unpack_from(">I", buf, stts + 4)[0]
+        last_delta = struct.unpack_from(">I", buf, stts + 8 + 8 * (entry_count - 1) + 4)[0] if count and entry_count else 0
+        duration = max(end + last_delta - media_start, 0) / timescale
+
+    order = sorted(range(len(times)), key=times.__getitem__)
+    return KeyframeIndex(array("d", (times[i] for i in order)), array("Q", (key_offsets[i] for i in order)), duration)
+
+
+def index_path(path: str) -> str:
+    return path + INDEX_SUFFIX
+
+def load_or_build(path: str) -> KeyframeIndex:
+    """The persisted index for `path`, (re)building it when it is missing or the file changed."""
+    stat = os.stat(path)
+    try:
+        with open(index_path(path), "rb") as f:
+            index = KeyframeIndex.from_bytes(f.read(), stat.st_size, stat.st_mtime_ns)
+        if index is not None:
+            return index
+    except FileNotFoundError:
+        pass
+
+    index = parse(path)
+    tmp_path = f"{index_path(path)}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(index.to_bytes(stat.st_size, stat.st_mtime_ns))
+    os.replace(tmp_path, index_path(path))
+    return index
+
+def try_load(path: str) -> KeyframeIndex | None:
+    #callers that have another way to get keyframes (ffprobe) just fall back
+    try:
+        return load_or_build(path)
+    except (Mp4IndexError, OSError, ValueError, struct.error):
+        return None
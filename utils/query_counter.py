@@ -0,0 +1,29 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+#set while a count_queries() block is active in this context (request handler thread)
+_counter: ContextVar[list | None] = ContextVar("query_counter", default=None)
+
+
+@event.listens_for(Engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    counter = _counter.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+@contextmanager
+def count_queries():
+    """
+    with count_queries() as counter: ...; counter[0] is the number of SQL
+    statements this context sent to any engine. Other requests running at
+    the same time aren't counted, each has its own context.
+    """
+    counter = [0]
+    token = _counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _counter.reset(token)
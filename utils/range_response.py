@@ -0,0 +1,186 @@
+import os
+import uuid
+import mimetypes
+from email.utils import formatdate, parsedate_to_datetime
+import anyio
+from starlette.responses import Response
+
+CHUNK_SIZE = 1024 * 1024
+#a player never needs more than a handful, anything past this is abuse
+MAX_RANGES = 16
+
+
+class RangeNotSatisfiable(ValueError):
+    pass
+
+
+def parse_range(header: str, size: int) -> list[tuple[int, int]] | None:
+    """
+    "bytes=0-499, 1000-, -500" -> sorted, coalesced, inclusive (start, end) pairs.
+    None means the header isn't a bytes range we understand, so serve the whole file.
+    """
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if first == "":
+                #suffix range: the last N bytes
+                length = int(last)
+                if length <= 0:
+                    continue
+                start, end = max(size - length, 0), size - 1
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+        except ValueError:
+            return None
+        if start > end:
+            return None
+        if start >= size:
+            continue
+        ranges.append((start, min(end, size - 1)))
+
+    if not ranges:
+        raise RangeNotSatisfiable(header)
+    if len(ranges) > MAX_RANGES:
+        raise RangeNotSatisfiable(header)
+
+    ranges.sort()
+    merged = [ranges[0]]
+    for start, end in ranges[1:]:
+        if start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+
+class RangeFileResponse(Response):
+    """
+    A file response that honours Range (single and multi-range), If-Range,
+    If-None-Match and HEAD. Each range is read with pread off the event
+    loop, starting at its own offset, so serving minute 90 of a movie never
+    reads minutes 1-89. (No sendfile: that needs the ASGI zerocopysend
+    extension, which uvicorn doesn't offer.)
+    """
+    def __init__(self, path: str, request_headers, media_type: str | None = None, start_at: int | None = None, headers: dict | None = None):
+        stat = os.stat(path)
+        self.path = path
+        self.size = stat.st_size
+        self.media_type = media_type or mimetypes.guess_type(path)[0] or "application/octet-stream"
+        self.background = None
+        self.etag = f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+        self.last_modified = formatdate(stat.st_mtime, usegmt=True)
+        self.boundary = None
+        self.ranges = [(0, self.size - 1)] if self.size else []
+
+        headers = {"accept-ranges": "bytes", "etag": self.etag, "last-modified": self.last_modified, **(headers or {})}
+
+        if self._etag_matches(request_headers.get("if-none-match")):
+            self.status_code = 304
+            self.ranges = []
+            self._set_headers(headers)
+            return
+
+        try:
+            ranges = None
+            range_header = request_headers.get("range")
+            if start_at is not None:
+                #the caller already resolved a seek (e.g. ?t=) to a byte offset, same as "bytes=N-"
+                ranges = parse_range(f"bytes={start_at}-", self.size)
+            elif range_header and self._if_range_ok(request_headers.get("if-range")):
+                ranges = parse_range(range_header, self.size)
+        except RangeNotSatisfiable:
+            self.status_code = 416
+            self.ranges = []
+            headers["content-range"] = f"bytes */{self.size}"
+            headers["content-length"] = "0"
+            self._set_headers(headers)
+            return
+
+        if not ranges:
+            self.status_code = 200
+            headers["content-type"] = self.media_type
+            headers["content-length"] = str(self.size)
+        elif len(ranges) == 1:
+            self.status_code = 206
+            self.ranges = ranges
+            start, end = ranges[0]
+            headers["content-type"] = self.media_type
+            headers["content-range"] = f"bytes {start}-{end}/{self.size}"
+            headers["content-length"] = str(end - start + 1)
+        else:
+            self.status_code = 206
+            self.ranges = ranges
+            self.boundary = uuid.uuid4().hex
+            headers["content-type"] = f"multipart/byteranges; boundary={self.boundary}"
+            headers["content-length"] = str(sum(len(prefix) + (end - start + 1) for prefix, start, end in self._parts()) + len(self._closing()))
+        self._set_headers(headers)
+
+    def _set_headers(self, headers: dict):
+        self.raw_headers = [(k.encode("latin-1"), v.encode("latin-1")) for k, v in headers.items()]
+
+    def _etag_matches(self, header: str | None) -> bool:
+        if not header:
+            return False
+        if header.strip() == "*":
+            return True
+        return self.etag in [tag.strip().removeprefix("W/") for tag in header.split(",")]
+
+    def _if_range_ok(self, header: str | None) -> bool:
+        #If-Range: only honour Range if the client's copy is still this exact file
+        if not header:
+            return True
+        header = header.strip()
+        if header.startswith('"') or header.startswith("W/"):
+            return header == self.etag
+        try:
+            return parsedate_to_datetime(header) >= parsedate_to_datetime(self.last_modified)
+        except (TypeError, ValueError):
+            return False
+
+    def _parts(self):
+        for index, (start, end) in enumerate(self.ranges):
+            prefix = b""
+            if self.boundary:
+                prefix = (
+                    ("\r\n" if index else "") +
+                    f"--{self.boundary}\r\n"
+                    f"Content-Type: {self.media_type}\r\n"
+                    f"Content-Range: bytes {start}-{end}/{self.size}\r\n\r\n"
+                ).encode("latin-1")
+            yield prefix, start, end
+
+    def _closing(self) -> bytes:
+        return f"\r\n--{self.boundary}--\r\n".encode("latin-1") if self.boundary else b""
+
+    async def __call__(self, scope, receive, send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if scope.get("method") == "HEAD" or not self.ranges:
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+            return
+
+        with open(self.path, "rb", buffering=0) as f:
+            fd = f.fileno()
+            for prefix, start, end in self._parts():
+                if prefix:
+                    await send({"type": "http.response.body", "body": prefix, "more_body": True})
+                count = end - start + 1
+                if hasattr(os, "posix_fadvise"):
+                    os.posix_fadvise(fd, start, count, os.POSIX_FADV_SEQUENTIAL)
+
+                offset = start
+                while offset <= end:
+                    chunk = await anyio.to_thread.run_sync(os.pread, fd, min(CHUNK_SIZE, end - offset + 1), offset)
+                    if not chunk:
+                        break
+                    offset += len(chunk)
+                    await send({"type": "http.response.body", "body": chunk, "more_body": True})
+
+        await send({"type": "http.response.body", "body": self._closing(), "more_body": False})
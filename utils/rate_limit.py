@@ -0,0 +1,144 @@
+"""
+Sliding-window rate limits, approximated the usual way: keep the count for
+the current fixed window and the one before it, and weight the previous
+count by how much of it still overlaps the sliding window. That's two ints
+and a window number per key, instead of a timestamp per request.
+"""
+import math
+import time
+import threading
+from collections import OrderedDict
+
+
+class SlidingWindowLimiter:
+    """
+    In-process limiter: at most `limit` hits per `window` seconds per key.
+    Idle keys are swept out every window, and max_keys caps memory if
+    someone sprays random keys at us: past it the least recently seen key
+    is forgotten, so a flood of new keys can't lock out everyone else.
+    """
+    def __init__(self, name: str, limit: int, window: float, max_keys: int = 100_000):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.max_keys = max_keys
+        self.rejected = 0
+        self.evicted = 0
+        self._counts = OrderedDict()  #key -> [window_index, previous, current], least recently hit first
+        self._last_sweep = 0
+        self._lock = threading.Lock()
+
+    def _sweep(self, index: int):
+        #anything not touched in the last two windows counts zero anyway
+        stale = [key for key, entry in self._counts.items() if entry[0] < index - 1]
+        for key in stale:
+            del self._counts[key]
+        self._last_sweep = index
+
+    async def hit(self, key: str) -> tuple[bool, int]:
+        return self.record(key)
+
+    def record(self, key: str) -> tuple[bool, int]:
+        """Record one attempt. (allowed, retry_after_seconds); rejected attempts aren't counted."""
+        now = time.time()
+        index = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+
+        with self._lock:
+            if index > self._last_sweep:
+                self._sweep(index)
+
+            entry = self._counts.get(key)
+            if entry is None:
+                while len(self._counts) >= self.max_keys:
+                    self._counts.popitem(last=False)
+                    self.evicted += 1
+                entry = self._counts[key] = [index, 0, 0]
+            else:
+                self._counts.move_to_end(key)
+            if entry[0] != index:
+                #roll forward: the old current becomes previous, unless we skipped a whole window
+                entry[1] = entry[2] if entry[0] == index - 1 else 0
+                entry[2] = 0
+                entry[0] = index
+
+            if entry[1] * overlap + entry[2] + 1 > self.limit:
+                self.rejected += 1
+                return False, self._retry_after(entry[1], entry[2], now)
+            entry[2] += 1
+            return True, 0
+
+    def _retry_after(self, previous: int, current: int, now: float) -> int:
+        #current-window hits alone already fill the limit: wait for the window to roll
+        elapsed = now % self.window
+        if current + 1 > self.limit:
+            return max(1, math.ceil(self.window - elapsed))
+        #otherwise wait until enough of the previous window has slid out
+        needed = (previous - (self.limit - current - 1)) / previous if previous else 0
+        return max(1, math.ceil(needed * self.window - elapsed))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"name": self.name, "limit": self.limit, "window_seconds": self.window, "keys": len(self._counts),
+                    "rejected": self.rejected, "evicted": self.evicted}
+
+
+class RedisSlidingWindowLimiter:
+    """
+    Same approximation with the two window counters in Redis, so every worker
+    shares one budget per key. One round trip per hit, on the event loop
+    through redis.asyncio. If Redis is down or slow the worker falls back to
+    its own in-process counters: each worker then enforces the limit on its
+    own (looser, but still a limit), and logins keep working instead of
+    failing with a 500.
+    """
+    def __init__(self, name: str, limit: int, window: float, url: str, timeout: float = 0.5):
+        import redis.asyncio  #optional dependency, only needed for shared limits
+
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.rejected = 0
+        self.fallbacks = 0
+        self._errors = (redis.exceptions.RedisError, OSError)
+        self._redis = redis.asyncio.Redis.from_url(url, socket_timeout=timeout, socket_connect_timeout=timeout)
+        self._local = SlidingWindowLimiter(name, limit, window)
+
+    async def hit(self, key: str) -> tuple[bool, int]:
+        try:
+            return await self._hit(key)
+        except self._errors as e:
+            if self.fallbacks == 0:
+                print(f"Rate limiter {self.name}: redis unavailable ({e!r}), using per-worker limits")
+            self.fallbacks += 1
+            return self._local.record(key)
+
+    async def _hit(self, key: str) -> tuple[bool, int]:
+        now = time.time()
+        index = int(now // self.window)
+        overlap = 1 - (now % self.window) / self.window
+        current_key = f"rl:{self.name}:{key}:{index}"
+
+        pipe = self._redis.pipeline()
+        pipe.get(f"rl:{self.name}:{key}:{index - 1}")
+        pipe.incr(current_key)
+        pipe.expire(current_key, int(self.window * 2) + 1)
+        previous, current, _ = await pipe.execute()
+        previous = int(previous or 0)
+
+        if previous * overlap + current > self.limit:
+            #over: take our increment back so rejected attempts don't extend the lockout
+            await self._redis.decr(current_key)
+            self.rejected += 1
+            return False, max(1, math.ceil(self.window - now % self.window))
+        return True, 0
+
+    def stats(self) -> dict:
+        return {"name": self.name, "limit": self.limit, "window_seconds": self.window, "backend": "redis",
+                "rejected": self.rejected + self._local.rejected, "redis_fallbacks": self.fallbacks}
+
+
+def limiter(name: str, limit: int, window: float, redis_url: str | None = None):
+    if redis_url:
+        return RedisSlidingWindowLimiter(name, limit, window, redis_url)
+    return SlidingWindowLimiter(name, limit, window)
@@ -0,0 +1,61 @@
+import threading
+import time
+
+class LazyResource:
+    """
+    Something expensive (a model, a client, a contract handle) built the
+    first time it is asked for, exactly once even under concurrent first use.
+    """
+    def __init__(self, name: str, factory):
+        self.name = name
+        self.factory = factory
+        self.load_seconds = None
+        self._value = None
+        self._loaded = False
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self) -> bool:
+        return self._loaded
+
+    def get(self):
+        if self._loaded:
+            return self._value
+        with self._lock:
+            if not self._loaded:
+                started = time.perf_counter()
+                self._value = self.factory()
+                self.load_seconds = time.perf_counter() - started
+                self._loaded = True
+        return self._value
+
+
+_registry: dict[str, LazyResource] = {}
+
+def register(name: str, factory) -> LazyResource:
+    resource = _registry.get(name)
+    if resource is None:
+        resource = _registry[name] = LazyResource(name, factory)
+    return resource
+
+def get(name: str):
+    return _registry[name].get()
+
+def status() -> dict:
+    return {name: {"loaded": r.loaded, "load_seconds": r.load_seconds} for name, r in _registry.items()}
+
+def warm_up(names: list[str] | None = None) -> threading.Thread:
+    """Load resources on a background thread so the first real request doesn't pay for them."""
+    def run():
+        for name in names if names is not None else list(_registry):
+            if name not in _registry:
+                print(f"warm-up: unknown resource {name}")
+                continue
+            try:
+                _registry[name].get()
+                print(f"warm-up: {name} loaded in {_registry[name].load_seconds:.2f}s")
+            except Exception as e:
+                print(f"warm-up: {name} failed: {e}")
+    thread = threading.Thread(target=run, name="resource-warm-up", daemon=True)
+    thread.start()
+    return thread
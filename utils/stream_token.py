@@ -0,0 +1,69 @@
+"""
+Short-lived signed stream URLs. The token travels as a path segment
+(/hls/s/{token}/...) so relative URIs inside HLS playlists inherit it,
+and checking one is an HMAC over its payload, no database involved.
+The payload is readable by whoever holds the URL, so it only names the
+movie and rendition; the server maps those to files itself.
+"""
+import hmac
+import json
+import time
+import base64
+import hashlib
+
+from config import settings
+
+#its own key, so a stream token can never be replayed as anything else signed with SECRET_KEY
+_KEY = hashlib.sha256(b"stream-url:" + settings.SECRET_KEY.encode()).digest()
+ALL_RENDITIONS = "*"
+
+
+class StreamTokenError(ValueError):
+    pass
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def _signature(body: str) -> str:
+    return _b64encode(hmac.new(_KEY, body.encode(), hashlib.sha256).digest())
+
+
+def issue(movie_id: str, user_id: str, rendition: str = ALL_RENDITIONS, expires_at: int | None = None) -> tuple[str, int]:
+    """
+    (token, expiry) for one viewer and one title. The expiry is the earlier of
+    STREAM_URL_TTL_SECONDS from now and expires_at (when their access ends).
+    """
+    expiry = int(time.time()) + settings.STREAM_URL_TTL_SECONDS
+    if expires_at is not None:
+        expiry = min(expiry, int(expires_at))
+    payload = {"m": movie_id, "u": user_id, "exp": expiry, "r": rendition}
+    body = _b64encode(json.dumps(payload, separators=(",", ":")).encode())
+    return f"{body}.{_signature(body)}", expiry
+
+def verify(token: str) -> dict:
+    """The payload of a valid, unexpired token. StreamTokenError otherwise."""
+    body, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _signature(body)):
+        raise StreamTokenError("bad signature")
+    try:
+        payload = json.loads(_b64decode(body))
+    except ValueError:
+        raise StreamTokenError("bad payload")
+    if payload.get("exp", 0) < time.time():
+        raise StreamTokenError("expired")
+    return payload
+
+def allows_rendition(payload: dict, name: str) -> bool:
+    """
+    Whether an HLS file name is covered by the token's rendition. Master playlists
+    are {file_id}_master.m3u8, variants {file_id}_{rendition}.m3u8, segments {file_id}_{rendition}{n}.ts.
+    """
+    rendition = payload.get("r", ALL_RENDITIONS)
+    if rendition == ALL_RENDITIONS:
+        return True
+    stem = name.rsplit(".", 1)[0]
+    return stem.endswith(f"_{rendition}") or stem.rstrip("0123456789").endswith(f"_{rendition}")